@@ -1,26 +1,139 @@
+import hashlib
 import os
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime
 from glob import glob
 from fastapi.logger import logger
 from shutil import rmtree
 from tempfile import gettempdir
-from typing import List
+from typing import Any, Collection, Dict, Hashable, List, Optional
+
+from dspreview.index import CacheIndex
 
 CACHE_PATH = os.environ.get('CACHE_PATH', gettempdir())
 DOCUMENTS_PATH = os.path.join(CACHE_PATH, 'documents')
 THUMBNAILS_PATH = os.path.join(CACHE_PATH, 'thumbnails')
+LOCKS_PATH = os.path.join(CACHE_PATH, 'locks')
+INDEX_PATH = os.path.join(CACHE_PATH, 'index.sqlite3')
+
+
+def get_shards(id: str, depth: int) -> List[str]:
+    """
+    Get the names of the shard directories of an id, derived from its hash.
+
+    Args:
+        id (str): The id to shard.
+        depth (int): The number of shard levels.
+
+    Returns:
+        List[str]: The name of each shard directory, from the top one.
+    """
+    digest = hashlib.sha1(id.encode('utf-8')).hexdigest()
+    return [digest[level * 2:level * 2 + 2] for level in range(depth)]
+
+
+def is_shard_name(name: str) -> bool:
+    """
+    Check if a directory name is the name of a shard directory.
+
+    Args:
+        name (str): The directory name.
+
+    Returns:
+        bool: True if it's a shard name, False otherwise.
+    """
+    return len(name) == 2 and all(char in '0123456789abcdef' for char in name)
+
+
+def get_cache_directory(path: str, index: str, id: str, depth: int = 0) -> str:
+    """
+    Get the directory where a document is cached.
+
+    With a depth of 0, every document of an index is in the same directory. Otherwise,
+    documents are spread in `depth` levels of shard directories, e.g. `<index>/<ab>/<cd>/<id>`,
+    to keep directories small. A directory created with the flat layout is still used
+    if it exists, so existing caches are read until they expire.
+
+    Args:
+        path (str): The root of the cache (for documents or thumbnails).
+        index (str): The index of the document.
+        id (str): The id of the document.
+        depth (int, optional): The number of shard levels. Default is 0.
+
+    Returns:
+        str: The path to the cache directory of the document.
+    """
+    flat = os.path.join(path, index, id)
+    if depth <= 0:
+        return flat
+    sharded = os.path.join(path, index, *get_shards(id, depth), id)
+    if not os.path.isdir(sharded) and os.path.isdir(flat):
+        return flat
+    return sharded
+
+
+def get_cached_directories(path: str, depth: int = 0) -> List[str]:
+    """
+    Get every cached directory, with either the flat or the sharded layout.
+
+    Args:
+        path (str): The root of the cache (for documents or thumbnails).
+        depth (int, optional): The number of shard levels. Default is 0.
+
+    Returns:
+        List[str]: The list of cached directory paths.
+    """
+    flat = glob(os.path.join(path, '*', '*', ''))
+    directories = [directory for directory in flat if not is_shard_name(os.path.basename(os.path.dirname(directory)))]
+    if depth > 0:
+        directories += glob(os.path.join(path, '*', *(['??'] * depth), '*', ''))
+    return [os.path.normpath(directory) for directory in directories]
+
+
+def get_directory_size(directory: str) -> int:
+    """
+    Get the total size of the files in a directory.
+
+    Args:
+        directory (str): The path to the directory.
+
+    Returns:
+        int: The size (in bytes) of the directory.
+    """
+    size = 0
+    for root, _, files in os.walk(directory):
+        for name in files:
+            try:
+                size += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return size
 
 
 class DocumentCache:
 
-    def __init__(self, max_age: int = 1) -> None:
+    def __init__(self, max_age: int = 1, high_watermark: int = 0, low_watermark: int = 0,
+                 index: Optional[CacheIndex] = None, shard_depth: int = 0) -> None:
         """
         Initialize the DocumentCache with a maximum age for cached items.
 
         Args:
             max_age (int, optional): The maximum age (in seconds) for cached items. Default is 1 second.
+            high_watermark (int, optional): The disk usage (in bytes) above which cached items are
+                evicted, 0 for no limit. Default is 0.
+            low_watermark (int, optional): The disk usage (in bytes) to get back to when evicting
+                cached items. Default is 0, meaning the high watermark.
+            index (CacheIndex, optional): The index of cached items. Default is the shared cache index.
+            shard_depth (int, optional): The number of shard levels of cached items. Default is 0.
         """
         self.max_age = max_age
+        self.high_watermark = high_watermark
+        self.low_watermark = low_watermark or high_watermark
+        self.index = index or cache_index
+        self.shard_depth = shard_depth
+        self.eviction_lock = threading.Lock()
 
     def is_directory_expired(self, directory: str) -> bool:
         """
@@ -41,17 +154,371 @@ class DocumentCache:
         Returns:
             List[str]: A list of expired document directory paths.
         """
-        documents = glob(os.path.join(DOCUMENTS_PATH, '*/*/'))
-        thumbnails = glob(os.path.join(THUMBNAILS_PATH, '*/*/'))
-        directories = documents + thumbnails
-        return [dir for dir in directories if self.is_directory_expired(dir)]
+        return self.index.get_accessed_before(datetime.now().timestamp() - self.max_age)
+
+    def get_expired_locks(self) -> List[str]:
+        """
+        Get a list of expired lock files.
+
+        Returns:
+            List[str]: A list of expired lock file paths.
+        """
+        locks = glob(os.path.join(LOCKS_PATH, '*.lock'))
+        return [lock for lock in locks if self.is_directory_expired(lock)]
+
+    def reindex(self) -> None:
+        """
+        Add every cached directory to the index, using its modification time as last access.
+
+        This is only needed once, to index a cache created before the index existed.
+        """
+        for kind, path in (('document', DOCUMENTS_PATH), ('thumbnail', THUMBNAILS_PATH)):
+            for directory in get_cached_directories(path, self.shard_depth):
+                try:
+                    accessed_at = os.path.getmtime(directory)
+                except OSError:
+                    continue
+                self.index.record(directory, kind, get_directory_size(directory), accessed_at)
+
+    def delete_directory(self, directory: str) -> None:
+        """
+        Delete a cached directory and its entry in the index.
+
+        Args:
+            directory (str): The path to the directory.
+        """
+        self.index.mark_deleting(directory)
+        rmtree(directory, ignore_errors=True)
+        self.index.delete(directory)
 
     def purge(self) -> None:
         """
         Purge expired cached directories.
 
-        This method deletes expired cached directories from the cache.
+        This method deletes expired cached directories and lock files from the cache.
         """
+        self.index.flush()
+        if self.index.is_empty():
+            self.reindex()
         for directory in self.get_expired_documents():
             logger.info('Deleting cached directory %s' % directory)
-            rmtree(directory)
+            self.delete_directory(directory)
+        # Locks are removed once released, so only those left by a crashed worker remain
+        for lock in self.get_expired_locks():
+            try:
+                os.remove(lock)
+            except FileNotFoundError:
+                pass
+        self.evict()
+
+    def evict(self, keep: Collection[str] = ()) -> None:
+        """
+        Evict cached directories until the disk usage is below the low watermark,
+        if it exceeds the high watermark.
+
+        Raw documents are evicted before thumbnails since they are bigger and only
+        needed to render new thumbnails. Within each kind, the least recently
+        accessed directories come first.
+
+        Args:
+            keep (Collection[str], optional): The directories to never evict, e.g. those being written.
+        """
+        if self.high_watermark <= 0:
+            return
+        usage = self.index.get_total_size()
+        if usage <= self.high_watermark:
+            return
+        for directory, size in self.index.iter_eviction_candidates():
+            if usage <= self.low_watermark:
+                break
+            if directory in keep:
+                continue
+            logger.info('Evicting cached directory %s' % directory)
+            self.delete_directory(directory)
+            usage -= size
+
+    def evict_if_needed(self, *keep: str) -> None:
+        """
+        Evict cached directories right away when the disk usage exceeds the high watermark,
+        instead of waiting for the next purge. Does nothing if an eviction is already running.
+
+        Args:
+            *keep (str): The directories to never evict, e.g. those just written.
+        """
+        if self.high_watermark <= 0 or not self.eviction_lock.acquire(blocking=False):
+            return
+        try:
+            self.evict(keep)
+        finally:
+            self.eviction_lock.release()
+
+
+class MemoryCache:
+    """
+    An in-memory LRU cache whose entries expire after a given time.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: float = 60) -> None:
+        """
+        Initialize the MemoryCache with a size bound and a time-to-live for its entries.
+
+        Args:
+            max_size (int, optional): The maximum number of entries. Default is 1024.
+            ttl (float, optional): The time-to-live (in seconds) of an entry, 0 to disable the cache. Default is 60.
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries: OrderedDict = OrderedDict()
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.max_size > 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        Get the value of an entry, unless it is missing or expired.
+
+        Args:
+            key (Hashable): The key of the entry.
+
+        Returns:
+            Optional[Any]: The value of the entry or None.
+        """
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """
+        Set the value of an entry, evicting the least recently used entries if needed.
+
+        Args:
+            key (Hashable): The key of the entry.
+            value (Any): The value of the entry.
+        """
+        if not self.enabled:
+            return
+        self.entries[key] = (time.monotonic() + self.ttl, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        """
+        Delete an entry if it exists.
+
+        Args:
+            key (Hashable): The key of the entry.
+        """
+        self.entries.pop(key, None)
+
+    def clear(self) -> None:
+        """
+        Delete all entries.
+        """
+        self.entries.clear()
+
+
+class ThumbnailCache:
+    """
+    An in-memory LRU cache of small thumbnails, bounded by the total size of their content.
+    """
+
+    def __init__(self, max_size: int = 0, max_item_size: int = 65_536) -> None:
+        """
+        Initialize the ThumbnailCache with size bounds.
+
+        Args:
+            max_size (int, optional): The maximum total size (in bytes) of the thumbnails, 0 to disable the cache. Default is 0.
+            max_item_size (int, optional): The maximum size (in bytes) of a single thumbnail. Default is 65536.
+        """
+        self.max_size = max_size
+        self.max_item_size = max_item_size
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.entries: OrderedDict = OrderedDict()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0
+
+    def get(self, key: Hashable) -> Optional[bytes]:
+        """
+        Get the content of a thumbnail.
+
+        Args:
+            key (Hashable): The key of the thumbnail.
+
+        Returns:
+            Optional[bytes]: The content of the thumbnail or None.
+        """
+        if not self.enabled:
+            return None
+        content = self.entries.get(key)
+        if content is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return content
+
+    def set(self, key: Hashable, content: bytes) -> None:
+        """
+        Set the content of a thumbnail if it's small enough, evicting the least recently used thumbnails if needed.
+
+        Args:
+            key (Hashable): The key of the thumbnail.
+            content (bytes): The content of the thumbnail.
+        """
+        if not self.enabled or len(content) > min(self.max_item_size, self.max_size):
+            return
+        self.delete(key)
+        self.entries[key] = content
+        self.size += len(content)
+        while self.size > self.max_size:
+            _, evicted = self.entries.popitem(last=False)
+            self.size -= len(evicted)
+
+    def set_from_file(self, key: Hashable, path: str) -> None:
+        """
+        Set the content of a thumbnail from a file, if it's small enough.
+
+        Args:
+            key (Hashable): The key of the thumbnail.
+            path (str): The path to the thumbnail.
+        """
+        if not self.enabled or os.path.getsize(path) > self.max_item_size:
+            return
+        with open(path, 'rb') as file:
+            self.set(key, file.read())
+
+    def delete(self, key: Hashable) -> None:
+        """
+        Delete a thumbnail if it exists.
+
+        Args:
+            key (Hashable): The key of the thumbnail.
+        """
+        content = self.entries.pop(key, None)
+        if content is not None:
+            self.size -= len(content)
+
+    def clear(self) -> None:
+        """
+        Delete all thumbnails.
+        """
+        self.entries.clear()
+        self.size = 0
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Get the number of thumbnails, their total size, hits and misses.
+
+        Returns:
+            Dict[str, int]: The count, size, hits and misses of the cache.
+        """
+        return dict(count=len(self.entries), size=self.size, hits=self.hits, misses=self.misses)
+
+
+class FailureCache:
+    """
+    A persistent cache of documents known to fail, with the reason of the failure.
+
+    Failures are kept in the cache index so they're shared between workers,
+    survive restarts, and expire without scanning the disk. Lookups are kept
+    in memory for a short while so most requests don't query the index.
+    """
+
+    def __init__(self, ttl: int = 3600, index: Optional[CacheIndex] = None, memory_ttl: float = 60) -> None:
+        """
+        Initialize the FailureCache with a time-to-live for its entries.
+
+        Args:
+            ttl (int, optional): The time-to-live (in seconds) of a failure, 0 to disable the cache. Default is 3600.
+            index (CacheIndex, optional): The index where failures are kept. Default is the shared cache index.
+            memory_ttl (float, optional): The time-to-live (in seconds) of a lookup kept in memory,
+                during which failures recorded by other workers aren't seen. Default is 60.
+        """
+        self.ttl = ttl
+        self.index = index or cache_index
+        self.memory = MemoryCache(max_size=10_000, ttl=min(memory_ttl, ttl))
+        self.memory_lock = threading.Lock()
+
+    def get_cached(self, index: str, id: str) -> Optional[str]:
+        """
+        Get the reason why a document failed from the lookups kept in memory only.
+
+        Args:
+            index (str): The index of the document.
+            id (str): The id of the document.
+
+        Returns:
+            Optional[str]: The reason of the failure, an empty string if the document
+            isn't known to fail, or None if it must be looked up in the index.
+        """
+        if self.ttl <= 0:
+            return ''
+        with self.memory_lock:
+            return self.memory.get((index, id))
+
+    def get(self, index: str, id: str) -> Optional[str]:
+        """
+        Get the reason why a document failed, unless the failure is unknown or expired.
+
+        Args:
+            index (str): The index of the document.
+            id (str): The id of the document.
+
+        Returns:
+            Optional[str]: The reason of the failure or None.
+        """
+        reason = self.get_cached(index, id)
+        if reason is None:
+            reason = self.index.get_failure(index, id) or ''
+            with self.memory_lock:
+                self.memory.set((index, id), reason)
+        return reason or None
+
+    def add(self, index: str, id: str, reason: str) -> None:
+        """
+        Record the failure of a document, unless a failure is already known.
+
+        Args:
+            index (str): The index of the document.
+            id (str): The id of the document.
+            reason (str): The reason of the failure.
+        """
+        if self.ttl <= 0 or self.get(index, id) is not None:
+            return
+        self.index.add_failure(index, id, reason, datetime.now().timestamp() + self.ttl)
+        with self.memory_lock:
+            self.memory.set((index, id), reason)
+
+    def delete(self, index: str, id: str) -> None:
+        """
+        Forget the failure of a document if any.
+
+        Args:
+            index (str): The index of the document.
+            id (str): The id of the document.
+        """
+        self.index.delete_failure(index, id)
+        with self.memory_lock:
+            self.memory.delete((index, id))
+
+    def purge(self) -> None:
+        """
+        Purge expired failures.
+        """
+        self.index.delete_expired_failures()
+
+
+# Index of the cached directories, shared between workers
+cache_index = CacheIndex(INDEX_PATH)
@@ -0,0 +1,86 @@
+import httpx
+from fastapi.logger import logger
+from http.cookiejar import CookieJar, DefaultCookiePolicy
+from importlib.util import find_spec
+from typing import Dict, Optional
+
+from dspreview.config import settings
+from dspreview.utils import is_truthy
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def create_client() -> httpx.AsyncClient:
+    """
+    Create an HTTP client to talk with Datashare, configured from the settings.
+
+    The client never stores cookies received from Datashare: it is shared between
+    every request so session cookies must be given on each call instead.
+
+    Returns:
+        httpx.AsyncClient: A new pooled HTTP client.
+    """
+    limits = httpx.Limits(max_connections=int(settings.ds_client_max_connections),
+                          max_keepalive_connections=int(settings.ds_client_max_keepalive_connections),
+                          keepalive_expiry=float(settings.ds_client_keepalive_expiry))
+    timeout = httpx.Timeout(connect=float(settings.ds_client_connect_timeout),
+                            read=float(settings.ds_client_read_timeout),
+                            write=float(settings.ds_client_read_timeout),
+                            pool=float(settings.ds_client_connect_timeout))
+    # Reject every cookie sent by Datashare to avoid sharing sessions between users
+    cookies = CookieJar(policy=DefaultCookiePolicy(allowed_domains=[]))
+    http2 = is_truthy(settings.ds_client_http2)
+    # HTTP/2 needs the optional h2 package, which isn't a dependency
+    if http2 and find_spec('h2') is None:
+        logger.warning('HTTP/2 is disabled because the h2 package is not installed')
+        http2 = False
+    return httpx.AsyncClient(limits=limits, timeout=timeout, cookies=cookies, http2=http2)
+
+
+def open_client() -> httpx.AsyncClient:
+    """
+    Open the application-wide HTTP client, replacing any previous one.
+
+    Returns:
+        httpx.AsyncClient: The shared HTTP client.
+    """
+    global _client
+    _client = create_client()
+    return _client
+
+
+def get_client() -> httpx.AsyncClient:
+    """
+    Get the application-wide HTTP client, opening it if needed.
+
+    Returns:
+        httpx.AsyncClient: The shared HTTP client.
+    """
+    if _client is None or _client.is_closed:
+        return open_client()
+    return _client
+
+
+async def close_client() -> None:
+    """
+    Close the application-wide HTTP client and release its connections.
+    """
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def get_cookie_headers(cookies: Dict[str, str]) -> Dict[str, str]:
+    """
+    Build the headers forwarding the given cookies on a single request.
+
+    Args:
+        cookies (dict): Cookies to forward to Datashare.
+
+    Returns:
+        Dict[str, str]: A dictionary of headers with the Cookie header, if any.
+    """
+    if not cookies:
+        return {}
+    return {'Cookie': '; '.join('%s=%s' % (name, value) for name, value in cookies.items())}
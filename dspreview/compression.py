@@ -0,0 +1,130 @@
+import zlib
+from typing import Iterator, List, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Size of the chunks compressed and sent at once
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def get_available_encodings() -> List[str]:
+    """
+    Get the content encodings supported, by order of preference.
+
+    Brotli and Zstandard are only supported if their optional packages are installed.
+
+    Returns:
+        List[str]: The names of the encodings.
+    """
+    encodings = []
+    if zstandard is not None:
+        encodings.append('zstd')
+    if brotli is not None:
+        encodings.append('br')
+    encodings.append('gzip')
+    return encodings
+
+
+def parse_accept_encoding(accept_encoding: str) -> List[Tuple[str, float]]:
+    """
+    Parse the value of an Accept-Encoding header.
+
+    Args:
+        accept_encoding (str): The value of the header.
+
+    Returns:
+        List[Tuple[str, float]]: The encodings and their quality.
+    """
+    encodings = []
+    for part in accept_encoding.split(','):
+        name, *params = [value.strip() for value in part.split(';')]
+        quality = 1.0
+        for param in params:
+            if param.startswith('q='):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        if name:
+            encodings.append((name.lower(), quality))
+    return encodings
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """
+    Choose the content encoding of a response from the Accept-Encoding header of the request.
+
+    Args:
+        accept_encoding (str, optional): The value of the header.
+
+    Returns:
+        Optional[str]: The name of the encoding, or None to send the response uncompressed.
+    """
+    qualities = dict(parse_accept_encoding(accept_encoding or ''))
+    candidates = [(qualities.get(encoding, qualities.get('*', 0.0)), encoding) for encoding in get_available_encodings()]
+    # Keep our order of preference between encodings with the same quality
+    candidates = [(quality, -rank, encoding) for rank, (quality, encoding) in enumerate(candidates) if quality > 0]
+    return max(candidates)[2] if candidates else None
+
+
+def iter_chunks(parts: Iterator[bytes], chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    Group small consecutive parts of a stream in larger chunks.
+
+    Args:
+        parts (Iterator[bytes]): The parts of the stream.
+        chunk_size (int, optional): The minimum size of each chunk, except the last one. Default is 64 KB.
+
+    Yields:
+        bytes: Each chunk.
+    """
+    buffer, size = [], 0
+    for part in parts:
+        buffer.append(part)
+        size += len(part)
+        if size >= chunk_size:
+            yield b''.join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+def compress_stream(parts: Iterator[bytes], encoding: Optional[str]) -> Iterator[bytes]:
+    """
+    Compress a stream chunk by chunk, flushing the compressor after each one so
+    the client can decode the data as soon as it's received.
+
+    Args:
+        parts (Iterator[bytes]): The parts of the stream.
+        encoding (str, optional): The content encoding, one of get_available_encodings() or None.
+
+    Yields:
+        bytes: Each compressed chunk.
+    """
+    chunks = iter_chunks(parts)
+    if encoding is None:
+        yield from chunks
+    elif encoding == 'zstd':
+        compressor = zstandard.ZstdCompressor().compressobj()
+        for chunk in chunks:
+            yield compressor.compress(chunk) + compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+        yield compressor.flush()
+    elif encoding == 'br':
+        compressor = brotli.Compressor()
+        for chunk in chunks:
+            yield compressor.process(chunk) + compressor.flush()
+        yield compressor.finish()
+    else:
+        # A window of 16 + 15 bits writes a gzip header and trailer
+        compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+        for chunk in chunks:
+            yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        yield compressor.flush()
@@ -60,12 +60,53 @@ class Settings(BaseSettings):
     ds_host: str = "http://localhost:8080"
     ds_document_meta_path: str = "/api/index/search/%s/_doc/%s"
     ds_document_src_path: str = "/api/%s/documents/src/%s"
+    ds_document_search_path: str = "/api/index/search/%s/_search"
     ds_document_max_size: int = 50_000_000
     ds_document_max_age: int = 259_200
+    ds_cache_shard_depth: int = 2
+    ds_cache_high_watermark: int = 0
+    ds_cache_low_watermark: int = 0
     ds_session_cookie_enabled: bool = True
     ds_session_cookie_name: str = "_ds_session_id"
     ds_session_header_enabled: bool = True
     ds_session_header_name: str = "X-Ds-Session-Id"
+    ds_client_max_connections: int = 100
+    ds_client_max_keepalive_connections: int = 20
+    ds_client_keepalive_expiry: float = 30.0
+    ds_client_http2: bool = False
+    ds_client_connect_timeout: float = 5.0
+    ds_client_read_timeout: float = 60.0
+    ds_thumbnail_master_height: int = 960
+    ds_thumbnail_max_height: int = 2048
+    ds_thumbnail_fast_max_height: int = 310
+    ds_thumbnail_size_buckets: str = "80,160,310,540,720,960,1280,1600,2048"
+    ds_thumbnail_size_step: int = 0
+    ds_thumbnail_max_age: int = 3600
+    ds_thumbnail_memory_cache_size: int = 32_000_000
+    ds_thumbnail_memory_cache_max_item_size: int = 65_536
+    ds_meta_cache_size: int = 10_000
+    ds_meta_cache_ttl: float = 60.0
+    ds_failure_cache_ttl: int = 3600
+    ds_render_pool_kind: str = "thread"
+    ds_render_pool_size: int = 4
+    ds_render_pool_max_queue: int = 0
+    ds_spreadsheet_max_rows: int = 10_000
+    ds_converter_isolated: bool = True
+    ds_converter_default_timeout: float = 120.0
+    ds_converter_timeouts: str = "application/pdf=60,image/svg+xml=30,image/wmf=30"
+    ds_converter_cpu_limit: int = 300
+    ds_converter_memory_limit: int = 4_000_000_000
+    ds_converter_pool_size: int = 0
+    ds_converter_max_jobs: int = 200
+    ds_converter_max_memory: int = 1_000_000_000
+    ds_batch_max_size: int = 100
+    ds_sprite_max_pages: int = 100
+    ds_sprite_columns: int = 10
+    ds_tile_size: int = 254
+    ds_tile_overlap: int = 1
+    ds_tile_source_height: int = 4096
+    ds_batch_concurrency: int = 8
+    ds_disconnect_poll_interval: float = 0.25
 
     model_config = SettingsConfigDict(
         env_prefix="DS_",
@@ -23,4 +23,17 @@ SUPPORTED_CONTENT_TYPES = (
   'image/x-canon-crw',
   'image/x-portable-pixmap',
   'text/csv'
-)
\ No newline at end of file
+)
+# Extensions the preview builders register for supported content types the
+# system might not know, needed before the builders are loaded
+CONTENT_TYPE_EXTENSIONS = {
+  'application/vnd.oasis.opendocument.spreadsheet': '.ods',
+  'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet': '.xlsx',
+  'image/cgm': '.cgm',
+  'image/heic': '.heic',
+  'image/webp': '.webp',
+  'image/wmf': '.wmf',
+  'image/x-adobe-dng': '.dng',
+  'image/x-canon-cr2': '.cr2',
+  'image/x-canon-crw': '.crw',
+}
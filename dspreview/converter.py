@@ -0,0 +1,298 @@
+import atexit
+import os
+import queue
+import shutil
+import socket
+import subprocess
+import time
+from contextlib import contextmanager
+from fastapi.logger import logger
+from tempfile import mkdtemp
+from typing import Any, Dict, Iterator, List, Optional
+
+from dspreview.config import settings
+from dspreview.limits import ConverterTimeout
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# Extensions of the documents converted by LibreOffice
+OFFICE_EXTS = ('.doc', '.docx', '.dot', '.dotx', '.odt', '.ott', '.rtf', '.wpd',
+               '.xls', '.xlsx', '.ods', '.ots',
+               '.ppt', '.pptx', '.pps', '.ppsx', '.odp', '.otp', '.odg')
+
+
+class ConverterUnavailable(Exception):
+    """Exception raised when no warm converter can run a conversion."""
+
+
+def get_free_port() -> int:
+    """
+    Get a TCP port nothing listens to on the loopback interface.
+
+    Returns:
+        int: The port number.
+    """
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class ConverterServer:
+    """
+    A long-lived LibreOffice process (through unoserver) converting documents
+    without paying the LibreOffice startup for each of them.
+    """
+
+    def __init__(self, max_jobs: int = 0, max_memory: int = 0, startup_timeout: float = 30.0) -> None:
+        """
+        Initialize the ConverterServer.
+
+        Args:
+            max_jobs (int, optional): Number of conversions after which the server is restarted, 0 for no limit. Default is 0.
+            max_memory (int, optional): Memory (in bytes) above which the server is restarted, 0 for no limit. Default is 0.
+            startup_timeout (float, optional): Time (in seconds) to wait for the server to listen. Default is 30.
+        """
+        self.max_jobs = max_jobs
+        self.max_memory = max_memory
+        self.startup_timeout = startup_timeout
+        self.process: Optional[subprocess.Popen] = None
+        self.profile_directory: Optional[str] = None
+        self.port = 0
+        self.jobs = 0
+
+    @property
+    def is_running(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def is_listening(self) -> bool:
+        """
+        Check if the server accepts connections.
+
+        Returns:
+            bool: True if the server accepts connections, False otherwise.
+        """
+        try:
+            with socket.create_connection(('127.0.0.1', self.port), timeout=1):
+                return True
+        except OSError:
+            return False
+
+    def is_healthy(self) -> bool:
+        """
+        Check if the server is running and accepts connections.
+
+        Returns:
+            bool: True if the server can run conversions, False otherwise.
+        """
+        return self.is_running and self.is_listening()
+
+    def get_memory(self) -> int:
+        """
+        Get the memory used by the server and LibreOffice.
+
+        Returns:
+            int: The resident memory in bytes, or 0 if psutil isn't installed.
+        """
+        if psutil is None or not self.is_running:
+            return 0
+        try:
+            process = psutil.Process(self.process.pid)
+            processes = [process] + process.children(recursive=True)
+            return sum(child.memory_info().rss for child in processes)
+        except psutil.Error:
+            return 0
+
+    def should_recycle(self) -> bool:
+        """
+        Check if the server ran too many conversions or uses too much memory.
+
+        Returns:
+            bool: True if the server should be restarted, False otherwise.
+        """
+        if self.max_jobs > 0 and self.jobs >= self.max_jobs:
+            return True
+        return self.max_memory > 0 and self.get_memory() > self.max_memory
+
+    def start(self) -> None:
+        """
+        Start the server with its own LibreOffice profile and wait for it to listen.
+
+        Raises:
+            ConverterUnavailable: If the server can't be started.
+        """
+        self.port = get_free_port()
+        self.profile_directory = mkdtemp(prefix='unoserver-')
+        command = ['unoserver', '--interface', '127.0.0.1', '--port', str(self.port),
+                   '--uno-port', str(get_free_port()),
+                   '--user-installation', 'file://%s' % self.profile_directory]
+        try:
+            # A session of its own so LibreOffice is stopped along with it
+            self.process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                                            start_new_session=True)
+        except OSError as error:
+            raise ConverterUnavailable(error)
+        self.jobs = 0
+        deadline = time.monotonic() + self.startup_timeout
+        while time.monotonic() < deadline:
+            if not self.is_running:
+                break
+            if self.is_listening():
+                return
+            time.sleep(0.2)
+        self.stop()
+        raise ConverterUnavailable('unoserver did not start')
+
+    def stop(self) -> None:
+        """
+        Stop the server and LibreOffice, and delete its profile.
+        """
+        if self.process is not None:
+            try:
+                os.killpg(self.process.pid, 15)
+                self.process.wait(timeout=10)
+            except (OSError, subprocess.TimeoutExpired):
+                try:
+                    os.killpg(self.process.pid, 9)
+                except OSError:
+                    pass
+            self.process = None
+        if self.profile_directory is not None:
+            shutil.rmtree(self.profile_directory, ignore_errors=True)
+            self.profile_directory = None
+
+    def convert(self, source_path: str, target_path: str, convert_to: str, timeout: float) -> str:
+        """
+        Convert a document with the server.
+
+        Args:
+            source_path (str): The path to the document.
+            target_path (str): The path to the converted document.
+            convert_to (str): The format of the converted document (ie. pdf).
+            timeout (float): Time (in seconds) after which the conversion is abandoned, 0 for no timeout.
+
+        Returns:
+            str: Path to the converted document.
+
+        Raises:
+            subprocess.SubprocessError: If the conversion failed.
+        """
+        self.jobs += 1
+        temporary_path = '%s.%s.tmp' % (target_path, os.getpid())
+        subprocess.run(['unoconvert', '--host', '127.0.0.1', '--port', str(self.port),
+                        '--convert-to', convert_to, source_path, temporary_path],
+                       check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, timeout=timeout or None)
+        os.replace(temporary_path, target_path)
+        return target_path
+
+
+class ConverterPool:
+    """
+    A pool of warm converter servers, restarted when they are unhealthy,
+    ran too many conversions or use too much memory.
+    """
+
+    def __init__(self, size: int = 0, max_jobs: int = 0, max_memory: int = 0, timeout: float = 120.0) -> None:
+        """
+        Initialize the ConverterPool.
+
+        Args:
+            size (int, optional): The number of servers, 0 to disable the pool. Default is 0.
+            max_jobs (int, optional): Number of conversions after which a server is restarted. Default is 0 (no limit).
+            max_memory (int, optional): Memory (in bytes) above which a server is restarted. Default is 0 (no limit).
+            timeout (float, optional): Time (in seconds) after which a conversion is abandoned, 0 for no timeout. Default is 120.
+        """
+        self.size = size
+        self.timeout = timeout
+        self.servers: List[ConverterServer] = [ConverterServer(max_jobs, max_memory) for _ in range(size)]
+        self.idle_servers: queue.Queue = queue.Queue()
+        for server in self.servers:
+            self.idle_servers.put(server)
+        atexit.register(self.shutdown)
+
+    @property
+    def enabled(self) -> bool:
+        return self.size > 0 and shutil.which('unoserver') is not None and shutil.which('unoconvert') is not None
+
+    @contextmanager
+    def acquire(self) -> Iterator[ConverterServer]:
+        """
+        Wait for an idle server, (re)starting it if needed.
+
+        Yields:
+            ConverterServer: A healthy server, put back in the pool afterwards.
+
+        Raises:
+            ConverterUnavailable: If the pool is disabled or no server can be started.
+        """
+        if not self.enabled:
+            raise ConverterUnavailable('the converter pool is disabled')
+        try:
+            server = self.idle_servers.get(timeout=self.timeout or None)
+        except queue.Empty:
+            raise ConverterUnavailable('no converter is idle')
+        try:
+            if not server.is_healthy() or server.should_recycle():
+                server.stop()
+                server.start()
+            yield server
+        finally:
+            self.idle_servers.put(server)
+
+    def convert(self, source_path: str, target_path: str, convert_to: str = 'pdf', timeout: Optional[float] = None) -> Optional[str]:
+        """
+        Convert a document with a warm server.
+
+        Args:
+            source_path (str): The path to the document.
+            target_path (str): The path to the converted document.
+            convert_to (str, optional): The format of the converted document. Default is pdf.
+            timeout (float, optional): Time (in seconds) after which the conversion is abandoned. Default is the pool's.
+
+        Returns:
+            Optional[str]: Path to the converted document, or None if it must be converted the usual way.
+
+        Raises:
+            ConverterTimeout: If the conversion runs past its timeout, since converting
+                the document the usual way would most likely time out too.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        try:
+            with self.acquire() as server:
+                try:
+                    return server.convert(source_path, target_path, convert_to, timeout)
+                except subprocess.TimeoutExpired:
+                    server.stop()
+                    raise ConverterTimeout(timeout)
+                except subprocess.SubprocessError as error:
+                    # The server might be stuck, start a fresh one next time
+                    server.stop()
+                    logger.warning('Unable to convert %s with a warm converter: %s' % (source_path, error))
+        except ConverterUnavailable as error:
+            logger.debug('No warm converter for %s: %s' % (source_path, error))
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get the current state of the pool.
+
+        Returns:
+            Dict[str, Any]: Whether the pool is enabled, its size, and the number of running and idle servers.
+        """
+        running = sum(1 for server in self.servers if server.is_running)
+        return dict(enabled=self.enabled, size=self.size, running=running, idle=self.idle_servers.qsize())
+
+    def shutdown(self) -> None:
+        """
+        Stop every server.
+        """
+        for server in self.servers:
+            server.stop()
+
+
+converter_pool = ConverterPool(size=int(settings.ds_converter_pool_size),
+                               max_jobs=int(settings.ds_converter_max_jobs),
+                               max_memory=int(settings.ds_converter_max_memory),
+                               timeout=float(settings.ds_converter_default_timeout))
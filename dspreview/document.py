@@ -1,16 +1,41 @@
+import aiofiles
+import asyncio
+import hashlib
 import os
 import httpx
+from contextlib import contextmanager
 from pathlib import Path
 from shutil import rmtree
-from typing import Optional, Dict, Any
+from tempfile import mkstemp
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
 
 from dspreview.content_types import SUPPORTED_CONTENT_TYPES
-from dspreview.cache import THUMBNAILS_PATH, DOCUMENTS_PATH
+from dspreview.cache import THUMBNAILS_PATH, DOCUMENTS_PATH, DocumentCache, FailureCache, MemoryCache, cache_index, get_cache_directory, get_directory_size
+from dspreview.client import get_client, get_cookie_headers
 from dspreview.config import settings
-from dspreview.spreadsheet import is_content_type_spreadsheet, get_spreadsheet_preview
-from preview_generator.manager import PreviewManager
+from dspreview.converter import converter_pool
+from dspreview.flight import flights
+from dspreview.limits import get_converter_timeout, run_limited
+from dspreview.render import conversion_pool, render_pool, render_jpeg_preview, render_page_nb, render_json_preview, render_sheet_cache, render_sprite
+from dspreview.render import convert_office_source, is_office_document
+from dspreview.render import get_cached_jpeg_preview, get_cached_page_nb, get_cached_sheet_cache, get_cached_sprite
+from dspreview.spreadsheet import SheetCache, is_content_type_spreadsheet
+from dspreview.tiles import get_cached_dzi_descriptor, get_cached_tile, get_tile_source_path, render_dzi_descriptor, render_tile
+from preview_generator.extension import mimetypes_storage
 from urllib.parse import urljoin
 
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+T = TypeVar('T')
+
+# Metadata and authorization outcome of documents, per session
+meta_cache = MemoryCache(max_size=int(settings.ds_meta_cache_size), ttl=float(settings.ds_meta_cache_ttl))
+# Documents known to fail, shared between workers
+failure_cache = FailureCache(ttl=int(settings.ds_failure_cache_ttl))
+# Cached directories, evicted as soon as they exceed the high watermark
+document_cache = DocumentCache(int(settings.ds_document_max_age), int(settings.ds_cache_high_watermark),
+                               int(settings.ds_cache_low_watermark), shard_depth=int(settings.ds_cache_shard_depth))
+
 
 class Document:
     """
@@ -31,8 +56,10 @@ class Document:
         self.id = id
         self.routing = routing
         self.source: Dict[str, Any] = {}
-        self.setup_target_directory()
-        self.manager = PreviewManager(self.thumbnail_directory, create_folder=True)
+        self.authorized = False
+        shard_depth = int(settings.ds_cache_shard_depth)
+        self.target_directory = get_cache_directory(DOCUMENTS_PATH, index, id, shard_depth)
+        self.thumbnail_directory = get_cache_directory(THUMBNAILS_PATH, index, id, shard_depth)
         self.root: Optional[Document] = Document(index=index, id=self.routing) if self.is_embedded else None
 
 
@@ -67,17 +94,12 @@ class Document:
             return os.path.join(self.target_directory, 'raw' + self.target_ext)
 
 
-    @property
-    def target_directory(self) -> str:
-        return os.path.join(DOCUMENTS_PATH, self.index, self.id)
-
-
     @property
     def target_ext(self) -> str:
         if self.target_path_ext == '':
             if self.target_content_type is None:
                 return ''
-            return self.manager.get_file_extension()
+            return mimetypes_storage.guess_extension(self.target_content_type, strict=False) or ''
         return self.target_path_ext
 
 
@@ -96,11 +118,6 @@ class Document:
         return self.source.get('contentType', None)
 
 
-    @property
-    def thumbnail_directory(self) -> str:
-        return os.path.join(THUMBNAILS_PATH, self.index, self.id)
-
-
     @property
     def is_embedded(self) -> bool:
         return self.routing and self.routing != self.id
@@ -154,28 +171,74 @@ class Document:
         """
         Asynchronously downloads the document using a streaming approach.
 
+        The body is written chunk by chunk into a temporary file which is only
+        moved to the target path once complete.
+
         Args:
             cookies (dict): Cookies for the HTTP request.
 
         Returns:
             str: Path to the downloaded document.
+
+        Raises:
+            DocumentTooBig: As soon as the downloaded body exceeds the allowable limit.
+            DocumentUnavailable: If Datashare fails to return the document.
+            DocumentTimeout: If Datashare doesn't answer in time.
+            DocumentUnreachable: If Datashare can't be reached.
         """
         # Download meta if none
         if not self.source:
             await self.download_meta(cookies)
-        async with httpx.AsyncClient(cookies=cookies, timeout=None) as client:
-            response = await client.get(self.src_url)
-            if response.status_code == httpx.codes.OK:
-                with open(self.target_path, "wb") as file:
-                    file.write(response.content)
-            elif 400 <= response.status_code < 500:
-                raise DocumentUnauthorized()
-            else:
-                raise DocumentNotPreviewable()
+        max_size = int(settings.ds_document_max_size)
+        headers = get_cookie_headers(cookies)
+        # Mid-stream failures must be handled as well
+        with handle_transport_errors():
+            async with get_client().stream('GET', self.src_url, headers=headers) as response:
+                if 400 <= response.status_code < 500:
+                    raise DocumentUnauthorized()
+                elif response.status_code != httpx.codes.OK:
+                    raise DocumentUnavailable()
+                # Don't even start the download if the announced length is too big
+                if int(response.headers.get('Content-Length', 0)) > max_size:
+                    raise DocumentTooBig()
+                # Only created now so documents never downloaded leave nothing to purge
+                self.setup_target_directory()
+                fd, temporary_path = mkstemp(dir=self.target_directory, prefix='.raw-', suffix='.part')
+                os.close(fd)
+                try:
+                    downloaded = 0
+                    async with aiofiles.open(temporary_path, 'wb') as file:
+                        async for chunk in response.aiter_bytes(DOWNLOAD_CHUNK_SIZE):
+                            downloaded += len(chunk)
+                            if downloaded > max_size:
+                                raise DocumentTooBig()
+                            await file.write(chunk)
+                    os.replace(temporary_path, self.target_path)
+                finally:
+                    if os.path.exists(temporary_path):
+                        os.remove(temporary_path)
         return self.target_path
 
 
     async def download_document(self, cookies: Dict[str, str]) -> str:
+        """
+        Asynchronously downloads the document if it doesn't exist locally,
+        sharing any download of the same document already in flight.
+
+        Args:
+            cookies (dict): Cookies for the HTTP request.
+
+        Returns:
+            str: Path to the downloaded document.
+        """
+        # Downloads are atomic so an existing target is always complete
+        if self.target_exists:
+            return await self.download_missing_document(cookies)
+        key = ('download', self.index, self.id)
+        return await flights.run(key, lambda: self.download_missing_document(cookies))
+
+
+    async def download_missing_document(self, cookies: Dict[str, str]) -> str:
         """
         Asynchronously downloads the document if it doesn't exist locally.
 
@@ -187,8 +250,16 @@ class Document:
         """
         # Ensure the file doesn't exist locally
         if not self.target_exists:
-            # Download the document using streaming
-            await self.download_document_with_steam(cookies)
+            try:
+                # Download the document using streaming
+                await self.download_document_with_steam(cookies)
+            except DocumentTooBig:
+                self.delete_target_dir()
+                raise
+            finally:
+                # Interrupted downloads leave an empty directory which must be purged too
+                if os.path.isdir(self.target_directory):
+                    await asyncio.to_thread(self.record_target_dir)
         # Ensure the downloaded file doesn't eceed
         if self.is_target_too_big:
             # Delete the target to ensure we don't keep
@@ -208,22 +279,51 @@ class Document:
 
         Raises:
             DocumentUnauthorized: If the document request is unauthorized.
-            DocumentNotPreviewable: If the document is not previewable.
+            DocumentUnavailable: If Datashare fails to return the metadata.
+            DocumentTimeout: If Datashare doesn't answer in time.
+            DocumentUnreachable: If Datashare can't be reached.
         """
-        async with httpx.AsyncClient(cookies=cookies, timeout=None) as client:
-            response = await client.get(self.meta_url)
+        key = self.meta_cache_key(cookies)
+        cached = meta_cache.get(key)
+        if cached is None:
+            with handle_transport_errors():
+                response = await get_client().get(self.meta_url, headers=get_cookie_headers(cookies))
             # Raise exception if the document request didn't succeed
             if response.status_code >= 400 and response.status_code < 500:
+                # Remember this session can't access the document
+                meta_cache.set(key, (False, None))
                 raise DocumentUnauthorized()
             # Any other error
             elif response.status_code != httpx.codes.OK:
-                raise DocumentNotPreviewable()
+                raise DocumentUnavailable()
             data = response.json()
-            # Save the source meta
-            self.source = data.get('_source', {})
-            # Download root meta as well if embedded
-            if self.is_embedded:
-                await self.root.download_meta(cookies)
+            cached = (True, data.get('_source', {}))
+            meta_cache.set(key, cached)
+        authorized, source = cached
+        if not authorized:
+            raise DocumentUnauthorized()
+        # Save the source meta
+        self.source = source
+        # Download root meta as well if embedded
+        if self.is_embedded:
+            await self.root.download_meta(cookies)
+
+
+    def meta_cache_key(self, cookies: Dict[str, str]) -> Tuple[str, str, str, Optional[str]]:
+        """
+        Build the key of the document's metadata in the cache, specific to the user session.
+
+        Every forwarded cookie is part of the session since Datashare might
+        authenticate users with other cookies than the session one.
+
+        Args:
+            cookies (dict): Cookies for the HTTP request.
+
+        Returns:
+            tuple: A digest of the cookies, and the index, id and routing of the document.
+        """
+        session = hashlib.sha256(repr(sorted(cookies.items())).encode('utf-8')).hexdigest()
+        return (session, self.index, self.id, self.routing)
 
 
     async def check_user_authorization(self, cookies: Dict[str, str]) -> None:
@@ -246,6 +346,76 @@ class Document:
             raise DocumentTooBig()
         if self.is_embedded and self.root.is_too_big:
             raise DocumentRootTooBig()
+        self.authorized = True
+
+
+    async def check_known_failure(self) -> None:
+        """
+        Checks if the document is already known to fail, looking it up
+        in the cache index away from the event loop when it isn't in memory.
+
+        Raises:
+            DocumentNotPreviewable: If the document previously failed to be converted.
+            DocumentTooBig: If the document previously turned out to be too big.
+            DocumentRootTooBig: If the embedded document's root previously turned out to be too big.
+        """
+        reason = failure_cache.get_cached(self.index, self.id)
+        if reason is None:
+            reason = await asyncio.to_thread(failure_cache.get, self.index, self.id)
+        if reason:
+            raise FAILURE_EXCEPTIONS.get(reason, DocumentNotPreviewable)()
+
+
+    async def record_failure(self, reason: str) -> None:
+        """
+        Record why the document failed, so the next requests don't try again.
+
+        Only failures happening after the user authorization was checked are
+        recorded since the others are found from the metadata alone.
+
+        Args:
+            reason (str): The reason of the failure, one of FAILURE_EXCEPTIONS keys.
+        """
+        if self.authorized:
+            await asyncio.to_thread(failure_cache.add, self.index, self.id, reason)
+
+
+    def touch(self) -> None:
+        """
+        Record an access to the document's cached directories, written
+        to the cache index with the next accesses.
+        """
+        cache_index.touch_later(self.target_directory, self.thumbnail_directory)
+
+
+    def record_target_dir(self) -> None:
+        """
+        Record the document's cached source in the cache index.
+        """
+        cache_index.record(self.target_directory, 'document', get_directory_size(self.target_directory))
+        document_cache.evict_if_needed(self.target_directory, self.thumbnail_directory)
+
+
+    def record_thumbnail_dir(self) -> None:
+        """
+        Record the document's cached thumbnails in the cache index.
+        """
+        cache_index.record(self.thumbnail_directory, 'thumbnail', get_directory_size(self.thumbnail_directory))
+        document_cache.evict_if_needed(self.target_directory, self.thumbnail_directory)
+
+
+    def record_thumbnail_file(self, path: str) -> None:
+        """
+        Add the size of a file written to the document's cached thumbnails
+        in the cache index, without walking the whole directory.
+
+        Args:
+            path (str): The path to the new file.
+        """
+        if cache_index.grow(self.thumbnail_directory, os.path.getsize(path)):
+            document_cache.evict_if_needed(self.target_directory, self.thumbnail_directory)
+        else:
+            self.record_thumbnail_dir()
 
 
     def delete_target_dir(self) -> None:
@@ -255,6 +425,53 @@ class Document:
         return rmtree(self.target_directory, ignore_errors=True)
 
 
+    async def run_converter(self, func: Callable[..., T], *args: Any, record: bool = True) -> T:
+        """
+        Run a conversion of the document in the render pool, in a child process
+        with limited resources and a timeout depending on the document's content type,
+        then record the size of the document's thumbnails in the cache index.
+
+        Args:
+            func (Callable): The function to run. It must be picklable.
+            *args: Arguments given to the function.
+            record (bool, optional): Record the size of the thumbnails once done. Default is True.
+
+        Returns:
+            T: The value returned by the function.
+
+        Raises:
+            ConverterTimeout: If the conversion runs past its timeout.
+            ConverterKilled: If the conversion exceeds its CPU or memory limit.
+        """
+        timeout = get_converter_timeout(self.target_content_type)
+        try:
+            return await render_pool.run(run_limited, timeout, func, *args)
+        finally:
+            # Partial output of failed conversions is recorded too, so it's purged
+            if record and os.path.isdir(self.thumbnail_directory):
+                await asyncio.to_thread(self.record_thumbnail_dir)
+
+
+    async def convert_source(self) -> None:
+        """
+        Convert the document to PDF with a warm converter if it's an office document,
+        sharing any conversion already in flight.
+
+        The warm converters belong to this process, so the conversion runs in one
+        of its threads dedicated to them instead of in a converter process which
+        would start its own.
+
+        Raises:
+            ConverterTimeout: If the conversion runs past its timeout.
+            RenderPoolFull: If too many conversions are already waiting for a warm converter.
+        """
+        if not converter_pool.enabled or not is_office_document(self.target_path, self.target_ext):
+            return
+        timeout = get_converter_timeout(self.target_content_type)
+        await flights.run(('converted', self.index, self.id), lambda: conversion_pool.run(
+            convert_office_source, self.thumbnail_directory, self.target_path, self.target_ext, timeout))
+
+
     def get_jpeg_preview(self, params: Dict[str, Any]) -> str:
         """
         Generate a JPEG preview of the document.
@@ -266,22 +483,163 @@ class Document:
             str: Path to the generated JPEG preview.
         """
         params = {**params, **dict(file_path=self.target_path)}
-        return self.manager.get_jpeg_preview(**params)
+        return render_jpeg_preview(self.thumbnail_directory, params, self.target_content_type)
 
 
-    def get_json_preview(self) -> Any:
+    async def render_jpeg_preview(self, params: Dict[str, Any]) -> str:
+        """
+        Generate a JPEG preview of the document in the render pool, sharing
+        any generation of the same preview already in flight.
+
+        Args:
+            params (dict): Additional parameters for generating the preview.
+
+        Returns:
+            str: Path to the generated JPEG preview.
+        """
+        params = {**params, **dict(file_path=self.target_path)}
+        path = get_cached_jpeg_preview(self.thumbnail_directory, params, self.target_content_type)
+        if path is not None:
+            return path
+        async def render() -> str:
+            await self.convert_source()
+            return await self.run_converter(render_jpeg_preview, self.thumbnail_directory, params, self.target_content_type)
+        key = ('jpeg', self.index, self.id, params.get('height'), params.get('page'))
+        return await flights.run(key, render)
+
+
+    async def render_sprite(self, params: Dict[str, Any]) -> Tuple[str, str]:
+        """
+        Generate a JPEG sprite of a range of pages of the document in the render
+        pool, sharing any generation of the same sprite already in flight.
+
+        Args:
+            params (dict): Additional parameters for generating the sprite.
+
+        Returns:
+            Tuple[str, str]: Paths to the JPEG sprite and to its JSON map.
+        """
+        params = {**params, **dict(file_path=self.target_path)}
+        paths = get_cached_sprite(self.thumbnail_directory, params)
+        if paths is not None:
+            return paths
+        async def render() -> Tuple[str, str]:
+            await self.convert_source()
+            return await self.run_converter(render_sprite, self.thumbnail_directory, params, self.target_content_type)
+        key = ('sprite', self.index, self.id, params.get('height'), params.get('first'), params.get('last'))
+        return await flights.run(key, render)
+
+
+    async def render_dzi_descriptor(self, params: Dict[str, Any]) -> str:
+        """
+        Generate the Deep Zoom descriptor of a page of the document in the render pool.
+
+        Args:
+            params (dict): Additional parameters for generating the tiles.
+
+        Returns:
+            str: The XML descriptor.
+        """
+        params = {**params, **dict(file_path=self.target_path)}
+        descriptor = get_cached_dzi_descriptor(self.thumbnail_directory, params)
+        if descriptor is not None:
+            return descriptor
+        async def render() -> str:
+            await self.convert_source()
+            return await self.run_converter(render_dzi_descriptor, self.thumbnail_directory, params)
+        return await flights.run(('dzi', self.index, self.id, params.get('page')), render)
+
+
+    async def render_tile(self, params: Dict[str, Any], level: int, column: int, row: int) -> str:
+        """
+        Generate a Deep Zoom tile of a page of the document in the render pool,
+        sharing any generation of the same tile already in flight.
+
+        Args:
+            params (dict): Additional parameters for generating the tiles.
+            level (int): The level in the pyramid.
+            column (int): The column of the tile.
+            row (int): The row of the tile.
+
+        Returns:
+            str: Path to the JPEG tile.
+        """
+        params = {**params, **dict(file_path=self.target_path)}
+        path = get_cached_tile(self.thumbnail_directory, params, level, column, row)
+        if path is not None:
+            return path
+        async def render() -> str:
+            # Another worker might have rendered it while this one waited
+            path = get_cached_tile(self.thumbnail_directory, params, level, column, row)
+            if path is not None:
+                return path
+            await self.convert_source()
+            # Once the raster exists, only the new tile is added to the recorded size
+            # instead of walking every tile cached before
+            has_source = os.path.exists(get_tile_source_path(self.thumbnail_directory, params))
+            path = await self.run_converter(render_tile, self.thumbnail_directory, params, level, column, row,
+                                            record=not has_source)
+            if has_source:
+                await asyncio.to_thread(self.record_thumbnail_file, path)
+            return path
+        key = ('tile', self.index, self.id, params.get('page'), level, column, row)
+        return await flights.run(key, render)
+
+
+    def get_json_preview(self, window: Optional[Dict[str, Any]] = None, sheets_only: bool = False) -> Any:
         """
         Generate a JSON preview of the document if supported (currently for spreadsheets).
 
+        Args:
+            window (dict, optional): The sheet, rows and columns to preview. Default is everything.
+            sheets_only (bool, optional): Only list the sheets and their dimensions. Default is False.
+
         Returns:
             Any: The JSON preview data, or None if unsupported.
         """
-        if is_content_type_spreadsheet(self.target_content_type):
-            return get_spreadsheet_preview(self.target_path)
-        else:
+        return render_json_preview(self.thumbnail_directory, self.target_path, self.target_content_type, window, sheets_only)
+
+
+    async def render_json_preview(self, window: Optional[Dict[str, Any]] = None, sheets_only: bool = False) -> Any:
+        """
+        Generate a JSON preview of the document in the render pool.
+
+        Args:
+            window (dict, optional): The sheet, rows and columns to preview. Default is everything.
+            sheets_only (bool, optional): Only list the sheets and their dimensions. Default is False.
+
+        Returns:
+            Any: The JSON preview data, or None if unsupported.
+        """
+        if not is_content_type_spreadsheet(self.target_content_type):
             return None
-        
-        
+        if get_cached_sheet_cache(self.thumbnail_directory, self.target_path, self.target_content_type) is not None:
+            # Reading sheets converted before doesn't start any converter
+            return await render_pool.run(render_json_preview, self.thumbnail_directory, self.target_path,
+                                         self.target_content_type, window, sheets_only)
+        return await self.run_converter(render_json_preview, self.thumbnail_directory, self.target_path,
+                                        self.target_content_type, window, sheets_only)
+
+
+    async def render_sheet_cache(self) -> Optional[SheetCache]:
+        """
+        Convert the document once and cache its sheets in the render pool, if
+        it's a spreadsheet, sharing any conversion already in flight.
+
+        Returns:
+            Optional[SheetCache]: The cached sheets, or None if the document isn't a spreadsheet.
+        """
+        if not is_content_type_spreadsheet(self.target_content_type):
+            return None
+        sheet_cache = get_cached_sheet_cache(self.thumbnail_directory, self.target_path, self.target_content_type)
+        if sheet_cache is not None:
+            return sheet_cache
+        async def render() -> Optional[SheetCache]:
+            return await self.run_converter(render_sheet_cache, self.thumbnail_directory,
+                                            self.target_path, self.target_content_type)
+        return await flights.run(('sheets', self.index, self.id), render)
+
+
     def get_manager_page_nb(self) -> int:
         """
         Get the number of pages in the document managed by the PreviewManager.
@@ -289,8 +647,94 @@ class Document:
         Returns:
             int: The number of pages in the document.
         """
-        return self.manager.get_page_nb(self.target_path)
-    
+        return render_page_nb(self.thumbnail_directory, self.target_path)
+
+
+    async def render_page_nb(self) -> int:
+        """
+        Get the number of pages in the document in the render pool, sharing
+        any count of the same document already in flight.
+
+        Returns:
+            int: The number of pages in the document.
+        """
+        page_nb = get_cached_page_nb(self.thumbnail_directory, self.target_path)
+        if page_nb is not None:
+            return page_nb
+        async def render() -> int:
+            await self.convert_source()
+            return await self.run_converter(render_page_nb, self.thumbnail_directory, self.target_path)
+        return await flights.run(('pages', self.index, self.id), render)
+
+
+
+@contextmanager
+def handle_transport_errors() -> Iterator[None]:
+    """
+    Translate the transport errors of a request to Datashare into document exceptions.
+
+    Raises:
+        DocumentTimeout: If Datashare doesn't answer in time.
+        DocumentUnreachable: If Datashare can't be reached.
+    """
+    try:
+        yield
+    except httpx.TimeoutException as error:
+        raise DocumentTimeout() from error
+    except httpx.HTTPError as error:
+        raise DocumentUnreachable() from error
+
+
+def get_search_url(index: str) -> str:
+    """
+    Constructs and returns the URL to search documents in an index.
+
+    Args:
+        index (str): The index to search in.
+
+    Returns:
+        str: The search URL.
+    """
+    return urljoin(settings.ds_host, settings.ds_document_search_path % index)
+
+
+async def prefetch_meta(documents: List[Document], cookies: Dict[str, str]) -> None:
+    """
+    Fetch the metadata of many documents at once, with one search per index,
+    and store it in the metadata cache.
+
+    Documents the search doesn't return are left out of the cache so their
+    metadata (or the reason it can't be accessed) is fetched one by one later.
+
+    Args:
+        documents (list): The documents to fetch the metadata of.
+        cookies (dict): Cookies for the HTTP request.
+    """
+    missing: Dict[str, Dict[str, List[Document]]] = {}
+    for document in documents:
+        candidates = [document, document.root] if document.is_embedded else [document]
+        for candidate in candidates:
+            if meta_cache.get(candidate.meta_cache_key(cookies)) is None:
+                missing.setdefault(candidate.index, {}).setdefault(candidate.id, []).append(candidate)
+    for index, candidates_by_id in missing.items():
+        ids = list(candidates_by_id)
+        body = {
+            'query': {'ids': {'values': ids}},
+            'size': len(ids),
+            '_source': ['contentLength', 'contentType', 'path'],
+        }
+        try:
+            response = await get_client().post(get_search_url(index), json=body, headers=get_cookie_headers(cookies))
+            response.raise_for_status()
+            hits = response.json().get('hits', {}).get('hits', [])
+        except (httpx.HTTPError, ValueError):
+            continue
+        for hit in hits:
+            for candidate in candidates_by_id.get(hit.get('_id'), []):
+                # The same id might be used with another routing
+                if candidate.routing is not None and hit.get('_routing', candidate.routing) != candidate.routing:
+                    continue
+                meta_cache.set(candidate.meta_cache_key(cookies), (True, hit.get('_source', {})))
 
 
 class DocumentUnauthorized(Exception):
@@ -299,8 +743,28 @@ class DocumentUnauthorized(Exception):
 class DocumentNotPreviewable(Exception):
     """Exception raised when a document is not previewable."""
 
+class DocumentUnavailable(Exception):
+    """Exception raised when Datashare fails to return a document or its metadata."""
+
+class DocumentUnreachable(DocumentUnavailable):
+    """Exception raised when Datashare can't be reached."""
+
+class DocumentTimeout(DocumentUnreachable):
+    """Exception raised when Datashare doesn't answer in time."""
+
 class DocumentRootTooBig(Exception):
     """Exception raised when the root document's size exceeds the allowable limit."""
 
 class DocumentTooBig(Exception):
     """Exception raised when the document's size exceeds the allowable limit."""
+
+
+# Exceptions raised for each reason a document is known to fail
+FAILURE_EXCEPTIONS = {
+    'unsupported': DocumentNotPreviewable,
+    'not_previewable': DocumentNotPreviewable,
+    'conversion_failed': DocumentNotPreviewable,
+    'timeout': DocumentNotPreviewable,
+    'too_big': DocumentTooBig,
+    'root_too_big': DocumentRootTooBig,
+}
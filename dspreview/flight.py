@@ -0,0 +1,172 @@
+import asyncio
+import fcntl
+import hashlib
+import os
+from contextlib import asynccontextmanager
+from typing import IO, AsyncIterator, Awaitable, Callable, Dict, Hashable, TypeVar
+
+from dspreview.cache import LOCKS_PATH
+
+T = TypeVar('T')
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls sharing the same key into a single in-flight task.
+
+    Within a worker, callers with the same key await the same task. Across
+    workers, the task runs while holding an exclusive lock file so only one
+    worker does the work at a time. The task is cancelled once every caller
+    awaiting it was cancelled.
+    """
+
+    def __init__(self, lock_directory: str = LOCKS_PATH, poll_interval: float = 0.05) -> None:
+        """
+        Initialize the SingleFlight with the directory where lock files are created.
+
+        Args:
+            lock_directory (str, optional): The directory of the lock files. Default is LOCKS_PATH.
+            poll_interval (float, optional): Delay (in seconds) between two attempts to get a lock. Default is 0.05.
+        """
+        self.lock_directory = lock_directory
+        self.poll_interval = poll_interval
+        self.calls: Dict[Hashable, asyncio.Future] = {}
+        self.waiters: Dict[asyncio.Future, int] = {}
+
+    def lock_path(self, key: Hashable) -> str:
+        """
+        Get the path to the lock file of a key.
+
+        Args:
+            key (Hashable): The key of the call.
+
+        Returns:
+            str: The path to the lock file.
+        """
+        digest = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+        return os.path.join(self.lock_directory, digest + '.lock')
+
+    @asynccontextmanager
+    async def file_lock(self, key: Hashable) -> AsyncIterator[None]:
+        """
+        Hold an exclusive lock file for a key, without blocking the event loop while waiting for it.
+
+        The lock file is removed when released so the lock directory only holds
+        the locks in use.
+
+        Args:
+            key (Hashable): The key of the call.
+        """
+        os.makedirs(self.lock_directory, exist_ok=True)
+        path = self.lock_path(key)
+        while True:
+            file = open(path, 'a')
+            try:
+                await self.acquire(file)
+                # The previous holder might have removed the file while we were waiting
+                if is_same_file(file, path):
+                    break
+            except BaseException:
+                file.close()
+                raise
+            file.close()
+        try:
+            # Refresh the lock file so it's not purged while in use
+            os.utime(file.fileno())
+            yield
+        finally:
+            # Removed before being released so nobody can lock a removed file
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            fcntl.flock(file, fcntl.LOCK_UN)
+            file.close()
+
+    async def acquire(self, file: IO) -> None:
+        """
+        Wait for an exclusive lock on an open file.
+
+        Args:
+            file (IO): The open lock file.
+        """
+        while True:
+            try:
+                fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return
+            except BlockingIOError:
+                await asyncio.sleep(self.poll_interval)
+
+    async def run_locked(self, key: Hashable, func: Callable[[], Awaitable[T]]) -> T:
+        """
+        Run a coroutine function while holding the lock file of a key.
+
+        Args:
+            key (Hashable): The key of the call.
+            func (Callable): The coroutine function to run.
+
+        Returns:
+            T: The value returned by the function.
+        """
+        async with self.file_lock(key):
+            return await func()
+
+    async def run(self, key: Hashable, func: Callable[[], Awaitable[T]]) -> T:
+        """
+        Run a coroutine function unless a call with the same key is already in flight,
+        in which case its result is awaited instead.
+
+        Args:
+            key (Hashable): The key of the call.
+            func (Callable): The coroutine function to run.
+
+        Returns:
+            T: The value returned by the function.
+        """
+        call = self.calls.get(key)
+        if call is None:
+            call = asyncio.ensure_future(self.run_locked(key, func))
+            call.add_done_callback(lambda _: self.forget(key, call))
+            self.calls[key] = call
+        self.waiters[call] = self.waiters.get(call, 0) + 1
+        try:
+            return await asyncio.shield(call)
+        finally:
+            self.waiters[call] -= 1
+            if self.waiters[call] == 0:
+                del self.waiters[call]
+                # Nobody is waiting for the result anymore
+                if not call.done():
+                    self.forget(key, call)
+                    call.cancel()
+
+    def forget(self, key: Hashable, call: asyncio.Future) -> None:
+        """
+        Stop sharing a call with the next callers of the same key.
+
+        Args:
+            key (Hashable): The key of the call.
+            call (asyncio.Future): The call to forget.
+        """
+        if self.calls.get(key) is call:
+            del self.calls[key]
+
+
+def is_same_file(file: IO, path: str) -> bool:
+    """
+    Check if an open file is still the one at the given path.
+
+    Args:
+        file (IO): The open file.
+        path (str): The path to the file.
+
+    Returns:
+        bool: True if the path still leads to the open file, False otherwise.
+    """
+    try:
+        return os.path.samestat(os.fstat(file.fileno()), os.stat(path))
+    except FileNotFoundError:
+        return False
+
+
+flights = SingleFlight()
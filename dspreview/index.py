@@ -0,0 +1,275 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+INDEX_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS entries (
+    path TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    size INTEGER NOT NULL DEFAULT 0,
+    accessed_at REAL NOT NULL,
+    state TEXT NOT NULL DEFAULT 'ready'
+);
+CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at);
+CREATE INDEX IF NOT EXISTS entries_kind_accessed_at ON entries (kind, accessed_at);
+CREATE TABLE IF NOT EXISTS failures (
+    index_name TEXT NOT NULL,
+    id TEXT NOT NULL,
+    reason TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    PRIMARY KEY (index_name, id)
+);
+CREATE INDEX IF NOT EXISTS failures_expires_at ON failures (expires_at);
+'''
+
+# Kinds of entries, in the order they are evicted
+KINDS = ('document', 'thumbnail')
+# Number of entries read at once when iterating over eviction candidates
+EVICTION_PAGE_SIZE = 256
+
+
+class CacheIndex:
+    """
+    A small SQLite index of the cached directories, with their size, last access and state.
+
+    The index is shared between workers and lets the cache be purged without
+    scanning the whole cache directory. It also keeps the documents known to fail.
+
+    Accesses are buffered in memory and written at once by `flush`, so serving
+    a cached thumbnail doesn't wait for the database.
+    """
+
+    def __init__(self, path: str) -> None:
+        """
+        Initialize the CacheIndex.
+
+        Args:
+            path (str): The path to the SQLite database.
+        """
+        self.path = path
+        self.local = threading.local()
+        self.pending_touches: Dict[str, float] = {}
+        self.pending_lock = threading.Lock()
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        """The connection to the database, one per thread."""
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.executescript(INDEX_SCHEMA)
+            self.local.connection = connection
+        return connection
+
+    def is_empty(self) -> bool:
+        """
+        Check if the index has no entries.
+
+        Returns:
+            bool: True if the index is empty, False otherwise.
+        """
+        return self.connection.execute('SELECT 1 FROM entries LIMIT 1').fetchone() is None
+
+    def record(self, path: str, kind: str, size: int, accessed_at: Optional[float] = None) -> None:
+        """
+        Record a cached directory that was just written.
+
+        Args:
+            path (str): The path to the directory.
+            kind (str): The kind of the entry, one of KINDS.
+            size (int): The size (in bytes) of the directory.
+            accessed_at (float, optional): The timestamp of the last access. Default is now.
+        """
+        accessed_at = time.time() if accessed_at is None else accessed_at
+        self.connection.execute('INSERT INTO entries (path, kind, size, accessed_at, state) '
+                                'VALUES (?, ?, ?, ?, \'ready\') '
+                                'ON CONFLICT (path) DO UPDATE SET size = excluded.size, '
+                                'accessed_at = excluded.accessed_at, state = excluded.state',
+                                (path, kind, size, accessed_at))
+
+    def grow(self, path: str, size: int) -> bool:
+        """
+        Add the size of a file just written to a cached directory.
+
+        Args:
+            path (str): The path to the directory.
+            size (int): The size (in bytes) of the new file.
+
+        Returns:
+            bool: True if the directory was recorded before, False otherwise.
+        """
+        cursor = self.connection.execute('UPDATE entries SET size = size + ?, accessed_at = ? WHERE path = ?',
+                                         (size, time.time(), path))
+        return cursor.rowcount > 0
+
+    def touch(self, *paths: str) -> None:
+        """
+        Record an access to cached directories.
+
+        Args:
+            *paths (str): The paths to the directories.
+        """
+        now = time.time()
+        self.connection.executemany('UPDATE entries SET accessed_at = ? WHERE path = ?',
+                                    [(now, path) for path in paths])
+
+    def touch_later(self, *paths: str) -> None:
+        """
+        Record an access to cached directories the next time the index is flushed.
+
+        Args:
+            *paths (str): The paths to the directories.
+        """
+        now = time.time()
+        with self.pending_lock:
+            for path in paths:
+                self.pending_touches[path] = now
+
+    def flush(self) -> None:
+        """
+        Write the accesses recorded with `touch_later`.
+        """
+        with self.pending_lock:
+            touches, self.pending_touches = self.pending_touches, {}
+        if touches:
+            self.connection.executemany('UPDATE entries SET accessed_at = MAX(accessed_at, ?) WHERE path = ?',
+                                        [(accessed_at, path) for path, accessed_at in touches.items()])
+
+    def get(self, path: str) -> Optional[Dict[str, Any]]:
+        """
+        Get the entry of a cached directory.
+
+        Args:
+            path (str): The path to the directory.
+
+        Returns:
+            Optional[Dict[str, Any]]: The kind, size, last access and state of the entry, or None.
+        """
+        row = self.connection.execute('SELECT kind, size, accessed_at, state FROM entries WHERE path = ?',
+                                      (path,)).fetchone()
+        if row is None:
+            return None
+        return dict(zip(('kind', 'size', 'accessed_at', 'state'), row))
+
+    def delete(self, path: str) -> None:
+        """
+        Delete the entry of a cached directory.
+
+        Args:
+            path (str): The path to the directory.
+        """
+        self.connection.execute('DELETE FROM entries WHERE path = ?', (path,))
+
+    def mark_deleting(self, path: str) -> None:
+        """
+        Mark the entry of a cached directory as being deleted.
+
+        Args:
+            path (str): The path to the directory.
+        """
+        self.connection.execute('UPDATE entries SET state = \'deleting\' WHERE path = ?', (path,))
+
+    def get_accessed_before(self, timestamp: float) -> List[str]:
+        """
+        Get the cached directories not accessed since the given time.
+
+        Args:
+            timestamp (float): The timestamp of the oldest allowed access.
+
+        Returns:
+            List[str]: A list of directory paths.
+        """
+        rows = self.connection.execute('SELECT path FROM entries WHERE accessed_at < ?', (timestamp,))
+        return [path for path, in rows]
+
+    def get_total_size(self) -> int:
+        """
+        Get the total size of the cached directories.
+
+        Returns:
+            int: The size in bytes.
+        """
+        return self.connection.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+
+    def iter_eviction_candidates(self) -> Iterator[Tuple[str, int]]:
+        """
+        Iterate over the cached directories in the order they should be evicted:
+        raw documents before thumbnails, least recently accessed first.
+
+        Yields:
+            Tuple[str, int]: The directory path and its size.
+        """
+        for kind in KINDS:
+            # Read one page at a time, after the last entry seen, so entries can be
+            # deleted while iterating without loading the whole index in memory
+            last = (float('-inf'), '')
+            while True:
+                rows = self.connection.execute('SELECT path, size, accessed_at FROM entries WHERE kind = ? '
+                                               'AND (accessed_at, path) > (?, ?) ORDER BY accessed_at, path LIMIT ?',
+                                               (kind, *last, EVICTION_PAGE_SIZE)).fetchall()
+                for path, size, _ in rows:
+                    yield path, size
+                if len(rows) < EVICTION_PAGE_SIZE:
+                    break
+                last = (rows[-1][2], rows[-1][0])
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """
+        Get the number of entries and their total size, per kind.
+
+        Returns:
+            Dict[str, Dict[str, int]]: The count and size of entries, per kind.
+        """
+        rows = self.connection.execute('SELECT kind, COUNT(*), COALESCE(SUM(size), 0) FROM entries GROUP BY kind')
+        return {kind: dict(count=count, size=size) for kind, count, size in rows}
+
+    def get_failure(self, index: str, id: str) -> Optional[str]:
+        """
+        Get the reason why a document failed, unless the failure is unknown or expired.
+
+        Args:
+            index (str): The index of the document.
+            id (str): The id of the document.
+
+        Returns:
+            Optional[str]: The reason of the failure or None.
+        """
+        row = self.connection.execute('SELECT reason FROM failures WHERE index_name = ? AND id = ? AND expires_at >= ?',
+                                      (index, id, time.time())).fetchone()
+        return None if row is None else row[0]
+
+    def add_failure(self, index: str, id: str, reason: str, expires_at: float) -> None:
+        """
+        Record the failure of a document, unless a failure that isn't expired is already known.
+
+        Args:
+            index (str): The index of the document.
+            id (str): The id of the document.
+            reason (str): The reason of the failure.
+            expires_at (float): The timestamp after which the failure is forgotten.
+        """
+        self.connection.execute('INSERT INTO failures (index_name, id, reason, expires_at) VALUES (?, ?, ?, ?) '
+                                'ON CONFLICT (index_name, id) DO UPDATE SET reason = excluded.reason, '
+                                'expires_at = excluded.expires_at WHERE failures.expires_at < ?',
+                                (index, id, reason, expires_at, time.time()))
+
+    def delete_failure(self, index: str, id: str) -> None:
+        """
+        Forget the failure of a document if any.
+
+        Args:
+            index (str): The index of the document.
+            id (str): The id of the document.
+        """
+        self.connection.execute('DELETE FROM failures WHERE index_name = ? AND id = ?', (index, id))
+
+    def delete_expired_failures(self) -> None:
+        """
+        Forget every expired failure.
+        """
+        self.connection.execute('DELETE FROM failures WHERE expires_at < ?', (time.time(),))
@@ -0,0 +1,194 @@
+import multiprocessing
+import os
+import resource
+import signal
+import subprocess
+from multiprocessing.context import BaseContext
+from typing import Any, Callable, List, Optional, Tuple, TypeVar
+
+from dspreview.config import settings
+from dspreview.utils import is_truthy
+
+T = TypeVar('T')
+
+# Modules imported once by the fork server, so each converter process starts warm
+FORKSERVER_PRELOAD = ['dspreview.preload']
+
+
+class ConverterKilled(Exception):
+    """Exception raised when a converter is killed for exceeding its resource limits."""
+
+
+class ConverterTimeout(ConverterKilled):
+    """Exception raised when a converter runs longer than its timeout."""
+
+
+def get_forkserver_context() -> BaseContext:
+    """
+    Get the multiprocessing context starting processes from a fork server
+    where the preview builders are already loaded.
+
+    Returns:
+        BaseContext: The multiprocessing context.
+    """
+    context = multiprocessing.get_context('forkserver')
+    context.set_forkserver_preload(FORKSERVER_PRELOAD)
+    return context
+
+
+def get_converter_timeout(content_type: Optional[str] = None) -> float:
+    """
+    Get the wall-clock timeout of the conversion of a content type.
+
+    Timeouts are configured as a comma-separated list of content_type=seconds.
+
+    Args:
+        content_type (str, optional): The content type of the document. Default is None.
+
+    Returns:
+        float: The timeout in seconds, 0 for no timeout.
+    """
+    for timeout in str(settings.ds_converter_timeouts or '').split(','):
+        name, _, seconds = timeout.strip().partition('=')
+        if name and name == content_type:
+            return float(seconds)
+    return float(settings.ds_converter_default_timeout)
+
+
+def get_resource_limits() -> List[Tuple[int, int]]:
+    """
+    Get the CPU time and memory limits of converters.
+
+    Returns:
+        List[Tuple[int, int]]: Each limited resource with its limit.
+    """
+    limits = []
+    cpu_limit = int(settings.ds_converter_cpu_limit)
+    memory_limit = int(settings.ds_converter_memory_limit)
+    if cpu_limit > 0:
+        limits.append((resource.RLIMIT_CPU, cpu_limit))
+    if memory_limit > 0:
+        limits.append((resource.RLIMIT_AS, memory_limit))
+    return limits
+
+
+def limit_resources() -> None:
+    """
+    Move the current process to a new process group and limit its CPU time and
+    memory, so it can be killed along with every converter it starts.
+    """
+    os.setsid()
+    for limited_resource, limit in get_resource_limits():
+        resource.setrlimit(limited_resource, (limit, limit))
+
+
+def kill_process_group(pid: int) -> None:
+    """
+    Kill a process and every process in its group.
+
+    Args:
+        pid (int): The process id, also its group id.
+    """
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+def run_limited_target(connection: Any, func: Callable[..., T], args: tuple) -> None:
+    """
+    Run a function with limited resources and send back its result or its error.
+
+    Args:
+        connection (Connection): The pipe to the parent process.
+        func (Callable): The function to run.
+        args (tuple): Arguments given to the function.
+    """
+    limit_resources()
+    try:
+        connection.send((True, func(*args)))
+    except BaseException as error:
+        connection.send((False, error))
+    finally:
+        connection.close()
+
+
+def run_limited(timeout: float, func: Callable[..., T], *args: Any) -> T:
+    """
+    Run a blocking conversion in a child process with limited resources, in a
+    process group of its own killed entirely if it runs past its timeout.
+
+    Args:
+        timeout (float): The wall-clock timeout in seconds, 0 for no timeout.
+        func (Callable): The function to run. It must be picklable.
+        *args: Arguments given to the function.
+
+    Returns:
+        T: The value returned by the function.
+
+    Raises:
+        ConverterTimeout: If the function runs past its timeout.
+        ConverterKilled: If the child process died, ie. when exceeding its CPU or memory limit.
+    """
+    if not is_truthy(settings.ds_converter_isolated):
+        return func(*args)
+    context = get_forkserver_context()
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=run_limited_target, args=(sender, func, args), daemon=True)
+    process.start()
+    sender.close()
+    try:
+        if not receiver.poll(timeout if timeout > 0 else None):
+            raise ConverterTimeout(timeout)
+        succeeded, value = receiver.recv()
+    except EOFError:
+        # The exit code is only known once the process is reaped
+        process.join()
+        raise ConverterKilled(process.exitcode)
+    finally:
+        kill_process_group(process.pid)
+        process.join()
+        receiver.close()
+    if succeeded:
+        return value
+    raise value
+
+
+def run_command(command: List[str], timeout: float) -> subprocess.CompletedProcess:
+    """
+    Run a converter command with limited resources, killing its whole process
+    group if it runs past its timeout.
+
+    The limits are set from this process once the command started, since
+    running code between fork and exec isn't safe when called from a thread.
+
+    Args:
+        command (List[str]): The command and its arguments.
+        timeout (float): The wall-clock timeout in seconds, 0 for no timeout.
+
+    Returns:
+        subprocess.CompletedProcess: The completed process.
+
+    Raises:
+        ConverterTimeout: If the command runs past its timeout.
+        ConverterKilled: If the command was killed, ie. when exceeding its CPU or memory limit.
+        CalledProcessError: If the command failed.
+    """
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, start_new_session=True)
+    try:
+        for limited_resource, limit in get_resource_limits():
+            resource.prlimit(process.pid, limited_resource, (limit, limit))
+        _, stderr = process.communicate(timeout=timeout if timeout > 0 else None)
+    except subprocess.TimeoutExpired:
+        kill_process_group(process.pid)
+        process.wait()
+        raise ConverterTimeout(timeout)
+    except BaseException:
+        kill_process_group(process.pid)
+        process.wait()
+        raise
+    if process.returncode < 0:
+        raise ConverterKilled(process.returncode)
+    if process.returncode > 0:
+        raise subprocess.CalledProcessError(process.returncode, command, None, stderr)
+    return subprocess.CompletedProcess(command, process.returncode, None, stderr)
@@ -1,17 +1,58 @@
+import asyncio
+import json
 from contextlib import asynccontextmanager
+from itertools import chain
 from fastapi import FastAPI, HTTPException, Request
 from fastapi_utils.tasks import repeat_every
+from fastapi.logger import logger
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import PlainTextResponse, FileResponse
+from fastapi.responses import PlainTextResponse, FileResponse, Response, StreamingResponse
 from importlib.metadata import version
-from preview_generator.exception import UnsupportedMimeType
-from typing import Dict, Any, Union
+from preview_generator.exception import PreviewGeneratorException, UnsupportedMimeType
+from subprocess import CalledProcessError
+from typing import AsyncIterator, Awaitable, Dict, Any, Iterator, List, Optional, Tuple, TypeVar, Union
 
-from dspreview.cache import DocumentCache
+from dspreview.cache import MemoryCache, ThumbnailCache, cache_index
+from dspreview.client import open_client, close_client
+from dspreview.compression import compress_stream, negotiate_encoding
 from dspreview.config import settings
-from dspreview.document import Document, DocumentTooBig, DocumentRootTooBig, DocumentNotPreviewable, DocumentUnauthorized
-from dspreview.preview import get_size_height
-from dspreview.utils import is_truthy
+from dspreview.converter import converter_pool
+from dspreview.document import document_cache, failure_cache, prefetch_meta, Document, DocumentTooBig, DocumentRootTooBig, DocumentNotPreviewable, DocumentUnauthorized, DocumentUnavailable
+from dspreview.document import DocumentTimeout, DocumentUnreachable
+from dspreview.limits import ConverterKilled, ConverterTimeout
+from dspreview.models import DocumentReference
+from dspreview.preview import get_page_range, get_size_height, InvalidPageRange, InvalidSize
+from dspreview.render import conversion_pool, load_preview_builders, render_pool, RenderPoolFull
+from dspreview.spreadsheet import get_window, is_window_truncated, iter_spreadsheet_json, iter_spreadsheet_ndjson, InvalidWindow, SheetCache
+from dspreview.tiles import InvalidTile
+from dspreview.utils import get_content_etag, get_file_etag, is_etag_matching, is_truthy
+
+T = TypeVar('T')
+
+# Errors making a document not previewable
+CONVERSION_ERRORS = (DocumentNotPreviewable, PreviewGeneratorException, CalledProcessError, ConverterKilled)
+
+# Small thumbnails recently served
+thumbnail_cache = ThumbnailCache(max_size=int(settings.ds_thumbnail_memory_cache_size),
+                                 max_item_size=int(settings.ds_thumbnail_memory_cache_max_item_size))
+# ETags of thumbnails recently served, to answer conditional requests without reading them
+etag_cache = MemoryCache(max_size=100_000, ttl=int(settings.ds_document_max_age))
+# Statistics of the cache index, which scan the whole index so they're computed at most once a minute
+cache_stats = MemoryCache(max_size=1, ttl=60)
+
+
+def get_thumbnail_headers(etag: str) -> Dict[str, str]:
+    """
+    Get the HTTP caching headers of a thumbnail.
+
+    Args:
+        etag (str): The ETag of the thumbnail.
+
+    Returns:
+        Dict[str, str]: A dictionary of headers.
+    """
+    max_age = int(settings.ds_thumbnail_max_age)
+    return {'ETag': etag, 'Cache-Control': 'private, max-age=%d' % max_age}
 
 
 def has_session_cookie(request: Request) -> bool:
@@ -64,29 +105,230 @@ def get_cookies_from_forwarded_headers(request: Request) -> Dict[str, str]:
     return request.cookies
 
 
-async def get_preview_generator_params(request: Request, document: Document) -> Dict[str, Any]:
+def get_preview_size(request: Request) -> Tuple[int, int]:
     """
-    Get parameters for the preview generator.
+    Get the height and page of the preview requested.
 
     Args:
         request (Request): The incoming request.
-        document (Document): The document to generate a preview for.
 
     Returns:
-        Dict[str, Any]: A dictionary of parameters for the preview generator.
+        Tuple[int, int]: The height and page of the preview.
     """
     size = request.query_params.get('size', 'xs')
     page = int(request.query_params.get('page', 0))
-    height = get_size_height(size)
+    return get_size_height(size), page
+
+
+def get_content_window(request: Request) -> Dict[str, Any]:
+    """
+    Get the window of the content requested (sheet, rows and columns).
+
+    Args:
+        request (Request): The incoming request.
+
+    Returns:
+        Dict[str, Any]: The window of the content.
+    """
+    params = request.query_params
+    return get_window(sheet=params.get('sheet'), offset=params.get('offset', '0'), limit=params.get('limit'),
+                      column_offset=params.get('column-offset', '0'), column_limit=params.get('column-limit'))
+
+
+async def authorize_request_document(request: Request, document: Document) -> Dict[str, str]:
+    """
+    Check the user can preview the requested document.
+
+    Args:
+        request (Request): The incoming request.
+        document (Document): The document to generate a preview for.
+
+    Returns:
+        Dict[str, str]: The cookies of the request.
+    """
     cookies = get_cookies_from_forwarded_headers(request)
     await document.download_meta(cookies)
     await document.check_user_authorization(cookies)
+    await document.check_known_failure()
+    return cookies
+
+
+async def get_preview_generator_params(request: Request, document: Document) -> Dict[str, Any]:
+    """
+    Get parameters for the preview generator.
+
+    Args:
+        request (Request): The incoming request.
+        document (Document): The document to generate a preview for.
+
+    Returns:
+        Dict[str, Any]: A dictionary of parameters for the preview generator.
+    """
+    height, page = get_preview_size(request)
+    cookies = await authorize_request_document(request, document)
     await document.download_document(cookies)
+    document.touch()
     file_path = document.target_path_without_ext
     file_ext = document.target_ext
     return dict(file_path=file_path, file_ext=file_ext, height=height, page=page)
 
 
+async def get_sprite_params(request: Request, document: Document) -> Dict[str, Any]:
+    """
+    Get parameters for generating a sprite of a range of pages.
+
+    Args:
+        request (Request): The incoming request.
+        document (Document): The document to generate a sprite for.
+
+    Returns:
+        Dict[str, Any]: A dictionary of parameters for generating the sprite.
+    """
+    first, last = get_page_range(request.query_params.get('from', '0'), request.query_params.get('to'))
+    params = await get_preview_generator_params(request, document)
+    return dict(file_ext=params['file_ext'], height=params['height'], first=first, last=last)
+
+
+async def get_document_sprite(request: Request, document: Document) -> Tuple[str, str]:
+    """
+    Get a sprite of a range of pages of a document.
+
+    Args:
+        request (Request): The incoming request.
+        document (Document): The document to generate a sprite for.
+
+    Returns:
+        Tuple[str, str]: Paths to the JPEG sprite and to its JSON map.
+
+    Raises:
+        HTTPException: If the document can't be accessed or previewed.
+    """
+    async with handle_document_errors(document):
+        params = await get_sprite_params(request, document)
+        return await document.render_sprite(params)
+
+
+async def get_document_tiles(request: Request, document: Document, tile: Optional[Tuple[int, int, int]] = None) -> str:
+    """
+    Get the Deep Zoom descriptor or a tile of a page of a document.
+
+    Args:
+        request (Request): The incoming request.
+        document (Document): The document to generate tiles for.
+        tile (Tuple[int, int, int], optional): The level, column and row of the tile. Default is the descriptor.
+
+    Returns:
+        str: The XML descriptor, or the path to the JPEG tile.
+
+    Raises:
+        HTTPException: If the document can't be accessed or previewed.
+    """
+    async with handle_document_errors(document):
+        params = await get_preview_generator_params(request, document)
+        params = dict(file_ext=params['file_ext'], page=params['page'])
+        if tile is None:
+            return await document.render_dzi_descriptor(params)
+        return await document.render_tile(params, *tile)
+
+
+async def cancel_on_disconnect(request: Request, awaitable: Awaitable[T]) -> T:
+    """
+    Wait for a preview while checking that the client is still connected, and stop
+    waiting for it as soon as the client disconnects. Queued renders nobody else is
+    waiting for are then dropped, and running downloads are interrupted.
+
+    Args:
+        request (Request): The incoming request.
+        awaitable (Awaitable[T]): The work needed to answer the request.
+
+    Returns:
+        T: The result of the work.
+
+    Raises:
+        HTTPException: If the client disconnected before the work was done.
+    """
+    task = asyncio.ensure_future(awaitable)
+    interval = float(settings.ds_disconnect_poll_interval)
+    try:
+        while True:
+            done, _ = await asyncio.wait([task], timeout=interval)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                raise HTTPException(status_code=499, detail="Client closed request")
+    finally:
+        if not task.done():
+            task.cancel()
+
+
+def get_failure_reason(error: Exception) -> str:
+    """
+    Get the reason recorded when a document fails with the given error.
+
+    Args:
+        error (Exception): The error raised while processing the document.
+
+    Returns:
+        str: The reason of the failure.
+    """
+    if isinstance(error, UnsupportedMimeType):
+        return 'unsupported'
+    if isinstance(error, ConverterTimeout):
+        return 'timeout'
+    if isinstance(error, DocumentTooBig):
+        return 'too_big'
+    if isinstance(error, DocumentRootTooBig):
+        return 'root_too_big'
+    if isinstance(error, DocumentNotPreviewable):
+        return 'not_previewable'
+    return 'conversion_failed'
+
+
+@asynccontextmanager
+async def handle_document_errors(document: Document) -> AsyncIterator[None]:
+    """
+    Turn the errors raised while previewing a document into HTTP exceptions,
+    recording the failures of the document on the way.
+
+    Args:
+        document (Document): The document being previewed.
+
+    Raises:
+        HTTPException: If the document can't be accessed or previewed.
+    """
+    try:
+        yield
+    except DocumentTooBig as error:
+        await document.record_failure(get_failure_reason(error))
+        raise HTTPException(status_code=413, detail="Document too big")
+    except DocumentRootTooBig as error:
+        await document.record_failure(get_failure_reason(error))
+        raise HTTPException(status_code=413, detail="Document root too big")
+    except DocumentTimeout:
+        raise HTTPException(status_code=504, detail="Datashare timed out")
+    except DocumentUnreachable:
+        raise HTTPException(status_code=502, detail="Datashare unreachable")
+    except DocumentUnavailable:
+        # Datashare might only fail for a moment, so the failure isn't recorded
+        raise HTTPException(status_code=415, detail="Document not previewable")
+    except CONVERSION_ERRORS as error:
+        await document.record_failure(get_failure_reason(error))
+        document.delete_target_dir()
+        raise HTTPException(status_code=415, detail="Document not previewable")
+    except DocumentUnauthorized:
+        raise HTTPException(status_code=401)
+    except InvalidSize:
+        raise HTTPException(status_code=400, detail="Invalid size")
+    except InvalidPageRange:
+        raise HTTPException(status_code=400, detail="Invalid page range")
+    except InvalidWindow:
+        raise HTTPException(status_code=400, detail="Invalid content window")
+    except InvalidTile:
+        raise HTTPException(status_code=404, detail="Tile not found")
+    except RenderPoolFull:
+        raise HTTPException(status_code=503, detail="Too many previews being generated")
+
+
 def get_request_document(request: Request) -> Document:
     """
     Get the request document.
@@ -102,10 +344,38 @@ def get_request_document(request: Request) -> Document:
     routing = request.query_params.get('routing', None)
     return Document(index, id, routing)
 
+async def warm_up(_app: FastAPI) -> None:
+    """
+    Initialize the cache index and the render pool, then load the preview
+    builders ahead of the first render.
+
+    Args:
+        _app (FastAPI): The application to mark as ready.
+    """
+    await asyncio.to_thread(cache_index.is_empty)
+    render_pool.get_executor()
+    _app.state.ready = True
+    try:
+        await render_pool.run(load_preview_builders)
+    except Exception as error:
+        logger.warning('Unable to load preview builders ahead of time: %s' % error)
+
+
 @asynccontextmanager
 async def lifespan(_app: FastAPI):
+    _app.state.ready = False
+    open_client()
+    warm_up_task = asyncio.create_task(warm_up(_app))
+    # Only schedules the purge and the index flush, which run in the background
     await remove_expired_tokens_task()
+    await flush_cache_index_task()
     yield
+    warm_up_task.cancel()
+    await asyncio.to_thread(cache_index.flush)
+    await close_client()
+    render_pool.shutdown()
+    conversion_pool.shutdown()
+    converter_pool.shutdown()
 
 
 app = FastAPI(lifespan=lifespan)
@@ -119,10 +389,16 @@ app.add_middleware(
 )
 
 
+# Not a coroutine so repeat_every runs it in a thread, away from the event loop
 @repeat_every(seconds=60 * 10)
-async def remove_expired_tokens_task() -> None:
-    max_age = int(settings.ds_document_max_age)
-    DocumentCache(max_age).purge()
+def remove_expired_tokens_task() -> None:
+    document_cache.purge()
+    failure_cache.purge()
+
+
+@repeat_every(seconds=60)
+def flush_cache_index_task() -> None:
+    cache_index.flush()
 
 
 @app.get("/", response_class=PlainTextResponse, response_model=str)
@@ -139,8 +415,173 @@ async def home() -> str:
         return 'Datashare preview'
 
 
+async def get_cache_stats() -> Dict[str, Dict[str, int]]:
+    """
+    Get the number and size of cached directories, per kind, away from the event loop.
+
+    Returns:
+        Dict[str, Dict[str, int]]: The count and size of cached directories, per kind.
+    """
+    stats = cache_stats.get('index')
+    if stats is None:
+        stats = await asyncio.to_thread(cache_index.stats)
+        cache_stats.set('index', stats)
+    return stats
+
+
+@app.get("/api/v1/status", response_model=None)
+async def status() -> Dict[str, Any]:
+    """
+    Status endpoint.
+
+    Returns:
+        Dict[str, Any]: A dictionary containing the state of the render pool, the converter pool and the cache.
+    """
+    return {
+        'render_pool': render_pool.stats(),
+        'converter_pool': converter_pool.stats(),
+        'conversion_pool': conversion_pool.stats(),
+        'cache': await get_cache_stats(),
+        'thumbnail_cache': thumbnail_cache.stats(),
+    }
+
+
+@app.get("/api/v1/ready", response_model=None)
+async def ready(request: Request) -> Union[Dict[str, Any], HTTPException]:
+    """
+    Readiness endpoint.
+
+    Args:
+        request (Request): The incoming request.
+
+    Returns:
+        Union[Dict[str, Any], HTTPException]: A dictionary if the cache index and the render pool
+        are initialized or an HTTP exception.
+    """
+    if not getattr(request.app.state, 'ready', False):
+        raise HTTPException(status_code=503, detail="Not ready")
+    return {'ready': True}
+
+
+async def get_document_info(request: Request, document: Document, include_content: bool = True) -> Dict[str, Any]:
+    """
+    Get information about a document.
+
+    Args:
+        request (Request): The incoming request.
+        document (Document): The document to get information about.
+        include_content (bool, optional): Include the content if requested. Default is True.
+
+    Returns:
+        Dict[str, Any]: A dictionary containing document information.
+
+    Raises:
+        HTTPException: If the document can't be accessed or previewed.
+    """
+    try:
+        async with handle_document_errors(document):
+            await get_preview_generator_params(request, document)
+            pages = await document.render_page_nb()
+            # Disabled content preview if not requested explicitly
+            requested_content = request.query_params.get('include-content') if include_content else None
+            info = {}
+            if requested_content == 'sheets':
+                content = await document.render_json_preview(sheets_only=True)
+            elif requested_content:
+                window = get_content_window(request)
+                content = await document.render_json_preview(window)
+                if content is not None:
+                    # Rows are capped by ds.spreadsheet.max.rows so clients must know when there are more
+                    sheets = await document.render_json_preview(sheets_only=True)
+                    info['truncated'] = is_window_truncated(sheets, window)
+            else:
+                content = None
+            return {
+                'content': content,
+                'content_type': document.target_content_type,
+                'pages': pages,
+                'previewable': True,
+                **info,
+            }
+    except HTTPException as error:
+        # Documents which can't be previewed are reported as such instead of failing
+        if error.status_code == 415:
+            return {'pages': 0, 'previewable': False}
+        raise
+
+
+async def get_document_sheet_cache(document: Document) -> Optional[SheetCache]:
+    """
+    Get the cached sheets of a document, converting it first if needed.
+
+    Args:
+        document (Document): The document, already downloaded.
+
+    Returns:
+        Optional[SheetCache]: The cached sheets, or None if the document isn't a spreadsheet.
+
+    Raises:
+        HTTPException: If the document can't be converted.
+    """
+    try:
+        return await document.render_sheet_cache()
+    except (*CONVERSION_ERRORS, OSError) as error:
+        await document.record_failure(get_failure_reason(error))
+        raise HTTPException(status_code=415, detail="Document not previewable")
+    except RenderPoolFull:
+        raise HTTPException(status_code=503, detail="Too many previews being generated")
+
+
+def get_streaming_response(request: Request, parts: Iterator[bytes], media_type: str) -> StreamingResponse:
+    """
+    Stream a response, compressed with the best encoding accepted by the client.
+
+    Args:
+        request (Request): The incoming request.
+        parts (Iterator[bytes]): The parts of the response body. They are read in a thread.
+        media_type (str): The media type of the response.
+
+    Returns:
+        StreamingResponse: The streaming response.
+    """
+    encoding = negotiate_encoding(request.headers.get('accept-encoding'))
+    headers = {'Vary': 'Accept-Encoding'}
+    if encoding is not None:
+        headers['Content-Encoding'] = encoding
+    return StreamingResponse(compress_stream(parts, encoding), media_type=media_type, headers=headers)
+
+
+async def stream_document_info(request: Request, document: Document) -> Union[Response, Dict[str, Any]]:
+    """
+    Get information about a document, streaming the content of spreadsheets
+    row by row instead of building it in memory.
+
+    Args:
+        request (Request): The incoming request.
+        document (Document): The document to get information about.
+
+    Returns:
+        Union[Response, Dict[str, Any]]: A streaming response, or a dictionary
+        containing document information if there is no content to stream.
+    """
+    try:
+        window = get_content_window(request)
+    except InvalidWindow:
+        raise HTTPException(status_code=400, detail="Invalid content window")
+    document_info = await get_document_info(request, document, include_content=False)
+    sheet_cache = await get_document_sheet_cache(document) if document_info['previewable'] else None
+    if sheet_cache is None:
+        return document_info
+    # Every key but the content, which is streamed last
+    head = {key: value for key, value in document_info.items() if key != 'content'}
+    head['truncated'] = is_window_truncated(sheet_cache.get_sheets(), window)
+    head = json.dumps(head)
+    parts = chain([head[:-1].encode('utf-8') + b', "content": '], iter_spreadsheet_json(sheet_cache, **window), [b'}'])
+    return get_streaming_response(request, parts, 'application/json')
+
+
 @app.get("/api/v1/thumbnail/{index}/{id}.json", response_model=None)
-async def info(request: Request) -> Union[Dict[str, Any], HTTPException]:
+async def info(request: Request) -> Union[Dict[str, Any], Response, HTTPException]:
     """
     Get information about a document.
 
@@ -148,36 +589,117 @@ async def info(request: Request) -> Union[Dict[str, Any], HTTPException]:
         request (Request): The incoming request.
 
     Returns:
-        Union[Dict[str, Any], HTTPException]: A dictionary containing document information or an HTTP exception.
+        Union[Dict[str, Any], Response, HTTPException]: A dictionary containing document information,
+        a streaming response if requested, or an HTTP exception.
+    """
+    document = get_request_document(request)
+    if is_truthy(request.query_params.get('stream')) and request.query_params.get('include-content') not in (None, 'sheets'):
+        return await stream_document_info(request, document)
+    return await cancel_on_disconnect(request, get_document_info(request, document))
+
+
+@app.get("/api/v1/thumbnail/{index}/{id}.ndjson", response_model=None)
+async def content(request: Request) -> Union[Response, HTTPException]:
+    """
+    Stream the content of a spreadsheet as newline-delimited JSON: one object
+    with the name and dimensions of each sheet, followed by one array per row.
+
+    Args:
+        request (Request): The incoming request.
+
+    Returns:
+        Union[Response, HTTPException]: A streaming response or an HTTP exception.
     """
     try:
-        document = get_request_document(request)
-        await get_preview_generator_params(request, document)
-        pages = document.get_manager_page_nb()
-        # Disabled content preview if not requested explicitly
-        if request.query_params.get('include-content'):
-            content = document.get_json_preview()
-        else:
-            content = None
-        return {
-            'content': content,
-            'content_type': document.target_content_type,
-            'pages': pages,
-            'previewable': True,
-        }
-    except (DocumentNotPreviewable, UnsupportedMimeType):
-        document.delete_target_dir()
-        return {'pages': 0, 'previewable': False}
-    except DocumentTooBig:
-        raise HTTPException(status_code=413, detail="Document too big")
-    except DocumentRootTooBig:
-        raise HTTPException(status_code=413, detail="Document root too big")
-    except DocumentUnauthorized:
-        raise HTTPException(status_code=401)
+        window = get_content_window(request)
+    except InvalidWindow:
+        raise HTTPException(status_code=400, detail="Invalid content window")
+    document = get_request_document(request)
+    document_info = await get_document_info(request, document, include_content=False)
+    sheet_cache = await get_document_sheet_cache(document) if document_info['previewable'] else None
+    if sheet_cache is None:
+        raise HTTPException(status_code=415, detail="Document content not available")
+    return get_streaming_response(request, iter_spreadsheet_ndjson(sheet_cache, **window), 'application/x-ndjson')
+
+
+@app.post("/api/v1/thumbnails/info", response_model=None)
+async def batch_info(request: Request, references: List[DocumentReference]) -> Union[List[Dict[str, Any]], HTTPException]:
+    """
+    Get information about many documents at once.
+
+    The documents are processed concurrently, a few at a time, and errors are
+    reported for each document instead of failing the whole batch.
+
+    Args:
+        request (Request): The incoming request.
+        references (List[DocumentReference]): The documents to get information about.
+
+    Returns:
+        Union[List[Dict[str, Any]], HTTPException]: A list of dictionaries containing the
+        information of each document, in the same order, or an HTTP exception.
+    """
+    if len(references) > int(settings.ds_batch_max_size):
+        raise HTTPException(status_code=413, detail="Too many documents")
+    documents = [Document(reference.index, reference.id, reference.routing) for reference in references]
+    await prefetch_meta(documents, get_cookies_from_forwarded_headers(request))
+    semaphore = asyncio.Semaphore(int(settings.ds_batch_concurrency))
+
+    async def get_item(document: Document) -> Dict[str, Any]:
+        item = dict(index=document.index, id=document.id, routing=document.routing)
+        async with semaphore:
+            try:
+                return {**item, **await get_document_info(request, document)}
+            except HTTPException as error:
+                return {**item, 'error': {'status': error.status_code, 'detail': error.detail}}
+            except Exception as error:
+                # An unexpected error must not hide the other documents of the batch
+                logger.exception('Unable to get information about %s: %s' % (document.id, error))
+                return {**item, 'error': {'status': 500, 'detail': 'Internal Server Error'}}
+
+    return await cancel_on_disconnect(request, asyncio.gather(*[get_item(document) for document in documents]))
+
+
+async def get_document_thumbnail(request: Request, document: Document) -> Response:
+    """
+    Get the thumbnail of a document, rendering it if needed.
+
+    Args:
+        request (Request): The incoming request.
+        document (Document): The document to get a thumbnail of.
+
+    Returns:
+        Response: A Response containing the thumbnail, or an empty one if the client already has it.
+
+    Raises:
+        HTTPException: If the thumbnail cannot be rendered.
+    """
+    async with handle_document_errors(document):
+        height, page = get_preview_size(request)
+        key = (document.index, document.id, document.routing, height, page)
+        await authorize_request_document(request, document)
+        # Thumbnails served from memory or by the client's cache are still in use
+        document.touch()
+        if_none_match = request.headers.get('if-none-match')
+        etag = etag_cache.get(key)
+        if is_etag_matching(if_none_match, etag):
+            return Response(status_code=304, headers=get_thumbnail_headers(etag))
+        content = thumbnail_cache.get(key)
+        if content is not None:
+            etag = etag or get_content_etag(content)
+            etag_cache.set(key, etag)
+            return Response(content, media_type='image/jpeg', headers=get_thumbnail_headers(etag))
+        params = await get_preview_generator_params(request, document)
+        path = await document.render_jpeg_preview(params)
+        thumbnail_cache.set_from_file(key, path)
+        etag = get_file_etag(path)
+        etag_cache.set(key, etag)
+        if is_etag_matching(if_none_match, etag):
+            return Response(status_code=304, headers=get_thumbnail_headers(etag))
+        return FileResponse(path, headers=get_thumbnail_headers(etag))
 
 
 @app.get("/api/v1/thumbnail/{index}/{id}", response_model=None)
-async def thumbnail(request: Request) -> Union[FileResponse, HTTPException]:
+async def thumbnail(request: Request) -> Union[Response, HTTPException]:
     """
     Get a document thumbnail.
 
@@ -185,18 +707,67 @@ async def thumbnail(request: Request) -> Union[FileResponse, HTTPException]:
         request (Request): The incoming request.
 
     Returns:
-        Union[FileResponse, HTTPException]: A FileResponse containing the thumbnail or an HTTP exception.
+        Union[Response, HTTPException]: A Response containing the thumbnail or an HTTP exception.
     """
-    try:
-        document = get_request_document(request)
-        params = await get_preview_generator_params(request, document)
-        return FileResponse(document.get_jpeg_preview(params))
-    except DocumentTooBig:
-        raise HTTPException(status_code=413, detail="Document too big")
-    except DocumentRootTooBig:
-        raise HTTPException(status_code=413, detail="Document root too big")
-    except (DocumentNotPreviewable, UnsupportedMimeType):
-        document.delete_target_dir()
-        raise HTTPException(status_code=415, detail="Document not previewable")
-    except DocumentUnauthorized:
-        raise HTTPException(status_code=401)
+    return await cancel_on_disconnect(request, get_document_thumbnail(request, get_request_document(request)))
+
+
+@app.get("/api/v1/sprite/{index}/{id}.json", response_model=None)
+async def sprite_map(request: Request) -> Union[Response, HTTPException]:
+    """
+    Get the offsets of each page in a sprite of a range of pages.
+
+    Args:
+        request (Request): The incoming request.
+
+    Returns:
+        Union[Response, HTTPException]: A Response containing the JSON map of the sprite or an HTTP exception.
+    """
+    _, map_path = await cancel_on_disconnect(request, get_document_sprite(request, get_request_document(request)))
+    return FileResponse(map_path, media_type='application/json', headers=get_thumbnail_headers(get_file_etag(map_path)))
+
+
+@app.get("/api/v1/sprite/{index}/{id}", response_model=None)
+async def sprite(request: Request) -> Union[Response, HTTPException]:
+    """
+    Get a single image with the thumbnails of a range of pages, laid out on rows.
+
+    Args:
+        request (Request): The incoming request.
+
+    Returns:
+        Union[Response, HTTPException]: A Response containing the sprite or an HTTP exception.
+    """
+    sprite_path, _ = await cancel_on_disconnect(request, get_document_sprite(request, get_request_document(request)))
+    return FileResponse(sprite_path, headers=get_thumbnail_headers(get_file_etag(sprite_path)))
+
+
+@app.get("/api/v1/tiles/{index}/{id}.dzi", response_model=None)
+async def dzi(request: Request) -> Union[Response, HTTPException]:
+    """
+    Get the Deep Zoom descriptor of a page of a document.
+
+    Args:
+        request (Request): The incoming request.
+
+    Returns:
+        Union[Response, HTTPException]: A Response containing the XML descriptor or an HTTP exception.
+    """
+    descriptor = await cancel_on_disconnect(request, get_document_tiles(request, get_request_document(request)))
+    return Response(descriptor, media_type='application/xml')
+
+
+@app.get("/api/v1/tiles/{index}/{id}_files/{level:int}/{column:int}_{row:int}.jpg", response_model=None)
+async def tile(request: Request) -> Union[Response, HTTPException]:
+    """
+    Get a Deep Zoom tile of a page of a document.
+
+    Args:
+        request (Request): The incoming request.
+
+    Returns:
+        Union[Response, HTTPException]: A Response containing the tile or an HTTP exception.
+    """
+    level, column, row = (request.path_params[name] for name in ('level', 'column', 'row'))
+    path = await cancel_on_disconnect(request, get_document_tiles(request, get_request_document(request), (level, column, row)))
+    return FileResponse(path, headers=get_thumbnail_headers(get_file_etag(path)))
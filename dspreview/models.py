@@ -0,0 +1,11 @@
+from typing import Optional
+from pydantic import BaseModel
+
+
+class DocumentReference(BaseModel):
+    """
+    A reference to a document, as sent in batch requests.
+    """
+    index: str
+    id: str
+    routing: Optional[str] = None
@@ -0,0 +1,10 @@
+"""
+Imported by the fork server converter processes are started from, so they
+don't load the preview builders for each conversion.
+"""
+from dspreview.render import load_preview_builders
+
+try:
+    load_preview_builders()
+except Exception:
+    pass
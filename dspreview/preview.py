@@ -1,6 +1,58 @@
+from typing import List, Optional, Tuple
+
+from dspreview.config import settings
+
 SIZES = dict(xs=80, sm=310, md=540, lg=720, xl=960)
 
 
+class InvalidSize(ValueError):
+    """Exception raised when a requested size is out of the allowed range."""
+
+
+class InvalidPageRange(ValueError):
+    """Exception raised when a requested range of pages is empty or too long."""
+
+
+def get_size_buckets() -> List[int]:
+    """
+    Get the heights numeric sizes are snapped to.
+
+    Returns:
+        List[int]: The sorted list of heights, empty if numeric sizes aren't snapped to buckets.
+    """
+    buckets = str(settings.ds_thumbnail_size_buckets or '')
+    return sorted(int(bucket) for bucket in buckets.split(',') if bucket.strip())
+
+
+def snap_height(height: int) -> int:
+    """
+    Snap a numeric height to the allowed renditions, so only a bounded number
+    of previews can be generated for each page.
+
+    The height is rounded up to the closest bucket if buckets are configured, or
+    else up to the closest multiple of the step if any.
+
+    Args:
+        height (int): The requested height.
+
+    Returns:
+        int: The snapped height.
+
+    Raises:
+        InvalidSize: If the height is 0 or above the maximum height.
+    """
+    max_height = int(settings.ds_thumbnail_max_height)
+    if height <= 0 or (max_height > 0 and height > max_height):
+        raise InvalidSize(height)
+    buckets = get_size_buckets()
+    step = int(settings.ds_thumbnail_size_step)
+    if buckets:
+        return next((bucket for bucket in buckets if bucket >= height), buckets[-1])
+    if step > 0:
+        return -(-height // step) * step
+    return height
+
+
 def get_size_height(size: str) -> int:
     """
     Get the height associated with a size.
@@ -10,8 +62,36 @@ def get_size_height(size: str) -> int:
 
     Returns:
         int: The height value associated with the size.
+
+    Raises:
+        InvalidSize: If the numeric value is out of the allowed range.
     """
     if str(size).isnumeric():
-        return int(size)
+        return snap_height(int(size))
     else:
         return SIZES.get(size, SIZES.get('xs'))
+
+
+def get_page_range(first: str, last: Optional[str] = None) -> Tuple[int, int]:
+    """
+    Get the first and last pages (both included) of a range of pages.
+
+    Args:
+        first (str): The first page, starting at 0.
+        last (str, optional): The last page. Default is as many pages as allowed in a sprite.
+
+    Returns:
+        Tuple[int, int]: The first and last pages.
+
+    Raises:
+        InvalidPageRange: If the range is empty or longer than the maximum number of pages.
+    """
+    max_pages = int(settings.ds_sprite_max_pages)
+    try:
+        first_page = int(first)
+        last_page = first_page + max_pages - 1 if last is None else int(last)
+    except ValueError:
+        raise InvalidPageRange(first, last)
+    if first_page < 0 or last_page < first_page or last_page - first_page >= max_pages:
+        raise InvalidPageRange(first, last)
+    return first_page, last_page
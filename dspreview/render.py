@@ -0,0 +1,756 @@
+import asyncio
+import base64
+import hashlib
+import io
+import json
+import os
+import subprocess
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from tempfile import TemporaryDirectory
+from typing import Any, BinaryIO, Callable, Dict, List, Optional, Tuple, TypeVar, Union, TYPE_CHECKING
+
+from dspreview.config import settings
+from dspreview.content_types import CONTENT_TYPE_EXTENSIONS
+from dspreview.converter import converter_pool, OFFICE_EXTS
+from dspreview.limits import get_forkserver_context, ConverterKilled, ConverterTimeout
+from dspreview.preview import InvalidPageRange
+from dspreview.spreadsheet import is_content_type_spreadsheet, get_sheet_cache, get_sheet_cache_directory, get_spreadsheet_preview, get_spreadsheet_sheets, SheetCache
+
+if TYPE_CHECKING:
+    from preview_generator.manager import PreviewManager
+
+T = TypeVar('T')
+
+# Camera raw formats embedding a JPEG preview
+RAW_CONTENT_TYPES = ('image/x-adobe-dng', 'image/x-canon-cr2', 'image/x-canon-crw')
+# Tags of the previews embedded in camera raw files, extracted with exiftool
+EMBEDDED_PREVIEW_TAGS = ('JpgFromRaw', 'PreviewImage', 'ThumbnailImage')
+# Transpositions applied for each EXIF orientation
+ORIENTATION_TRANSPOSES = {2: 'FLIP_LEFT_RIGHT', 3: 'ROTATE_180', 4: 'FLIP_TOP_BOTTOM',
+                          5: 'TRANSPOSE', 6: 'ROTATE_270', 7: 'TRANSVERSE', 8: 'ROTATE_90'}
+
+
+def load_preview_builders() -> None:
+    """
+    Import and load every builder of the PreviewManager.
+
+    This is slow, so it's done lazily on the first render or ahead of time in the background.
+    """
+    from preview_generator.preview.builder_factory import PreviewBuilderFactory
+    PreviewBuilderFactory.get_instance()
+
+
+def register_content_type_extensions() -> None:
+    """
+    Register the extensions of the supported content types the same way
+    the preview builders do, without loading them.
+
+    Documents are saved with these extensions by the main process, which
+    doesn't load the builders.
+    """
+    from preview_generator.extension import mimetypes_storage
+    for content_type, extension in CONTENT_TYPE_EXTENSIONS.items():
+        mimetypes_storage.add_type(content_type, extension, strict=True)
+
+
+def get_preview_manager(thumbnail_directory: str) -> 'PreviewManager':
+    """
+    Get a PreviewManager caching its previews in the given directory.
+
+    The preview_generator module is imported lazily since it loads every builder.
+
+    Args:
+        thumbnail_directory (str): The directory where previews are cached.
+
+    Returns:
+        PreviewManager: The preview manager.
+    """
+    from preview_generator.manager import PreviewManager
+    return PreviewManager(thumbnail_directory, create_folder=True)
+
+
+def get_downscaled_preview_path(thumbnail_directory: str, params: Dict[str, Any]) -> str:
+    """
+    Get the path to a JPEG preview downscaled from the master preview.
+
+    Args:
+        thumbnail_directory (str): The directory where previews are cached.
+        params (dict): Parameters for generating the preview.
+
+    Returns:
+        str: Path to the downscaled JPEG preview.
+    """
+    file_hash = hashlib.md5(params['file_path'].encode('utf-8')).hexdigest()
+    height = params['height']
+    name = '%s-%sx%s-page%s-downscaled.jpeg' % (file_hash, height, height, params.get('page', 0))
+    return os.path.join(thumbnail_directory, name)
+
+
+def downscale_jpeg(source: Union[str, BinaryIO], target_path: str, height: int, orientation: int = 1) -> str:
+    """
+    Downscale a JPEG image to fit in a square of the given size.
+
+    Args:
+        source (str or file): The path to the image to downscale, or the image itself.
+        target_path (str): The path to the downscaled image.
+        height (int): The maximum width and height of the downscaled image.
+        orientation (int, optional): The EXIF orientation of the image. Default is 1 (upright).
+
+    Returns:
+        str: Path to the downscaled image.
+    """
+    from PIL import Image
+    temporary_path = '%s.%s.tmp' % (target_path, os.getpid())
+    with Image.open(source) as image:
+        # Let the JPEG decoder skip the details we don't need
+        image.draft('RGB', (height, height))
+        image.thumbnail((height, height), Image.LANCZOS)
+        image = image.convert('RGB')
+        if orientation in ORIENTATION_TRANSPOSES:
+            image = image.transpose(getattr(Image.Transpose, ORIENTATION_TRANSPOSES[orientation]))
+        image.save(temporary_path, 'JPEG', quality=85)
+    os.replace(temporary_path, target_path)
+    return target_path
+
+
+def get_fast_preview_path(thumbnail_directory: str, params: Dict[str, Any]) -> str:
+    """
+    Get the path to a JPEG preview generated without the PreviewManager.
+
+    Args:
+        thumbnail_directory (str): The directory where previews are cached.
+        params (dict): Parameters for generating the preview.
+
+    Returns:
+        str: Path to the JPEG preview.
+    """
+    file_hash = hashlib.md5(params['file_path'].encode('utf-8')).hexdigest()
+    height = params['height']
+    return os.path.join(thumbnail_directory, '%s-%sx%s-page0-fast.jpeg' % (file_hash, height, height))
+
+
+def get_embedded_preview(file_path: str, height: int) -> Tuple[Optional[bytes], int]:
+    """
+    Extract the smallest JPEG preview embedded in a camera raw file that is
+    at least as large as the given height.
+
+    Args:
+        file_path (str): The path to the camera raw file.
+        height (int): The minimum width or height of the preview.
+
+    Returns:
+        Tuple[Optional[bytes], int]: The JPEG preview, or None if none is large
+        enough, and the EXIF orientation of the raw image.
+    """
+    from PIL import Image
+    tags = ['-%s' % tag for tag in EMBEDDED_PREVIEW_TAGS]
+    try:
+        process = subprocess.run(['exiftool', '-json', '-binary', '-n', '-Orientation', *tags, file_path],
+                                 check=True, capture_output=True, timeout=10)
+        metadata = json.loads(process.stdout)[0]
+    except (OSError, ValueError, IndexError, subprocess.SubprocessError):
+        return None, 1
+    orientation = metadata.get('Orientation', 1)
+    candidates = []
+    for tag in EMBEDDED_PREVIEW_TAGS:
+        value = metadata.get(tag)
+        if not isinstance(value, str) or not value.startswith('base64:'):
+            continue
+        content = base64.b64decode(value[len('base64:'):])
+        try:
+            with Image.open(io.BytesIO(content)) as image:
+                size = max(image.size)
+        except OSError:
+            continue
+        if size >= height:
+            candidates.append((size, content))
+    if not candidates:
+        return None, orientation
+    return min(candidates, key=lambda candidate: candidate[0])[1], orientation
+
+
+def render_fast_jpeg_preview(thumbnail_directory: str, params: Dict[str, Any], content_type: Optional[str]) -> Optional[str]:
+    """
+    Generate a small JPEG preview without the PreviewManager, by decoding JPEG images
+    at a reduced scale or by using the preview embedded in camera raw files.
+
+    Args:
+        thumbnail_directory (str): The directory where previews are cached.
+        params (dict): Parameters for generating the preview.
+        content_type (str, optional): The content type of the file.
+
+    Returns:
+        Optional[str]: Path to the JPEG preview, or None if it must be generated by the PreviewManager.
+    """
+    from PIL import Image
+    height = params['height']
+    if height > int(settings.ds_thumbnail_fast_max_height) or params.get('page', 0) != 0:
+        return None
+    if content_type != 'image/jpeg' and content_type not in RAW_CONTENT_TYPES:
+        return None
+    target_path = get_fast_preview_path(thumbnail_directory, params)
+    if os.path.exists(target_path):
+        return target_path
+    os.makedirs(thumbnail_directory, exist_ok=True)
+    try:
+        if content_type == 'image/jpeg':
+            with Image.open(params['file_path']) as image:
+                orientation = image.getexif().get(0x0112, 1)
+            return downscale_jpeg(params['file_path'], target_path, height, orientation)
+        content, orientation = get_embedded_preview(params['file_path'], height)
+        if content is None:
+            return None
+        return downscale_jpeg(io.BytesIO(content), target_path, height, orientation)
+    except OSError:
+        return None
+
+
+def get_converted_path(thumbnail_directory: str, file_path: str) -> str:
+    """
+    Get the path to the PDF an office document is converted to by a warm converter.
+
+    Args:
+        thumbnail_directory (str): The directory where previews are cached.
+        file_path (str): The path to the file.
+
+    Returns:
+        str: Path to the converted PDF.
+    """
+    file_hash = hashlib.md5(file_path.encode('utf-8')).hexdigest()
+    return os.path.join(thumbnail_directory, '%s-converted.pdf' % file_hash)
+
+
+def is_office_document(file_path: str, file_ext: str = '') -> bool:
+    """
+    Check if a file is an office document converted by LibreOffice.
+
+    Args:
+        file_path (str): The path to the file.
+        file_ext (str, optional): The extension of the file. Default is the extension of the path.
+
+    Returns:
+        bool: True if the file is an office document, False otherwise.
+    """
+    return (file_ext or os.path.splitext(file_path)[1]).lower() in OFFICE_EXTS
+
+
+def convert_office_source(thumbnail_directory: str, file_path: str, file_ext: str = '',
+                          timeout: Optional[float] = None) -> Optional[str]:
+    """
+    Convert an office document to PDF once with a warm converter.
+
+    This runs in the process owning the warm converters, and never in a
+    converter process which would start its own.
+
+    Args:
+        thumbnail_directory (str): The directory where previews are cached.
+        file_path (str): The path to the file.
+        file_ext (str, optional): The extension of the file. Default is the extension of the path.
+        timeout (float, optional): Time (in seconds) after which the conversion is abandoned. Default is the pool's.
+
+    Returns:
+        Optional[str]: Path to the converted PDF, or None if the file must be converted the usual way.
+
+    Raises:
+        ConverterTimeout: If the conversion runs past its timeout.
+    """
+    if not is_office_document(file_path, file_ext) or not converter_pool.enabled:
+        return None
+    pdf_path = get_converted_path(thumbnail_directory, file_path)
+    if os.path.exists(pdf_path):
+        return pdf_path
+    os.makedirs(thumbnail_directory, exist_ok=True)
+    return converter_pool.convert(file_path, pdf_path, timeout=timeout)
+
+
+def get_converted_source(thumbnail_directory: str, file_path: str, file_ext: str = '') -> Tuple[str, str]:
+    """
+    Get the file previews are generated from: the PDF an office document was
+    converted to by a warm converter if any, or else the file itself (and the
+    PreviewManager starts LibreOffice for it).
+
+    Args:
+        thumbnail_directory (str): The directory where previews are cached.
+        file_path (str): The path to the file.
+        file_ext (str, optional): The extension of the file. Default is the extension of the path.
+
+    Returns:
+        Tuple[str, str]: The path and the extension of the file to generate previews from.
+    """
+    if is_office_document(file_path, file_ext):
+        pdf_path = get_converted_path(thumbnail_directory, file_path)
+        if os.path.exists(pdf_path):
+            return pdf_path, '.pdf'
+    return file_path, file_ext
+
+
+def get_master_preview_path(thumbnail_directory: str, params: Dict[str, Any]) -> str:
+    """
+    Get the path to a JPEG preview generated by the PreviewManager, named
+    the way the PreviewManager does, without loading its builders.
+
+    Args:
+        thumbnail_directory (str): The directory where previews are cached.
+        params (dict): Parameters for generating the preview.
+
+    Returns:
+        str: Path to the JPEG preview.
+    """
+    file_hash = hashlib.md5(params['file_path'].encode('utf-8')).hexdigest()
+    height = params['height']
+    page = params.get('page', -1)
+    page_suffix = '-page%s' % page if page is not None and page > -1 else ''
+    return os.path.join(thumbnail_directory, '%s-%sx%s%s.jpeg' % (file_hash, height, height, page_suffix))
+
+
+def get_cached_jpeg_preview(thumbnail_directory: str, params: Dict[str, Any], content_type: Optional[str] = None) -> Optional[str]:
+    """
+    Get a JPEG preview generated before, without starting any converter.
+
+    Args:
+        thumbnail_directory (str): The directory where previews are cached.
+        params (dict): Parameters for generating the preview.
+        content_type (str, optional): The content type of the file. Default is None.
+
+    Returns:
+        Optional[str]: Path to the JPEG preview, or None if it must be generated.
+    """
+    fast_path = get_fast_preview_path(thumbnail_directory, params)
+    if os.path.exists(fast_path):
+        return fast_path
+    file_path, file_ext = get_converted_source(thumbnail_directory, params['file_path'], params.get('file_ext', ''))
+    params = {**params, 'file_path': file_path, 'file_ext': file_ext}
+    master_height = int(settings.ds_thumbnail_master_height)
+    if master_height <= 0 or params['height'] >= master_height:
+        path = get_master_preview_path(thumbnail_directory, params)
+    else:
+        path = get_downscaled_preview_path(thumbnail_directory, params)
+    return path if os.path.exists(path) else None
+
+
+def render_jpeg_preview(thumbnail_directory: str, params: Dict[str, Any], content_type: Optional[str] = None) -> str:
+    """
+    Generate a JPEG preview of a file with the PreviewManager.
+
+    Small previews of JPEG images and camera raw files are generated without
+    the PreviewManager when possible. Office documents are converted to PDF by
+    a warm converter if any. Sizes smaller than the master height are
+    downscaled from a master preview rendered once, so the converter runs only
+    once per page.
+
+    Args:
+        thumbnail_directory (str): The directory where previews are cached.
+        params (dict): Parameters for generating the preview.
+        content_type (str, optional): The content type of the file. Default is None.
+
+    Returns:
+        str: Path to the generated JPEG preview.
+    """
+    fast_path = render_fast_jpeg_preview(thumbnail_directory, params, content_type)
+    if fast_path is not None:
+        return fast_path
+    file_path, file_ext = get_converted_source(thumbnail_directory, params['file_path'], params.get('file_ext', ''))
+    params = {**params, 'file_path': file_path, 'file_ext': file_ext}
+    manager = get_preview_manager(thumbnail_directory)
+    master_height = int(settings.ds_thumbnail_master_height)
+    if master_height <= 0 or params['height'] >= master_height:
+        return manager.get_jpeg_preview(**params)
+    downscaled_path = get_downscaled_preview_path(thumbnail_directory, params)
+    if not os.path.exists(downscaled_path):
+        master_path = manager.get_jpeg_preview(**{**params, 'height': master_height})
+        downscale_jpeg(master_path, downscaled_path, params['height'])
+    return downscaled_path
+
+
+def get_page_nb_path(thumbnail_directory: str, file_path: str) -> str:
+    """
+    Get the path to the file where the number of pages of a file is cached.
+
+    Args:
+        thumbnail_directory (str): The directory where previews are cached.
+        file_path (str): The path to the file.
+
+    Returns:
+        str: Path to the page count.
+    """
+    file_hash = hashlib.md5(file_path.encode('utf-8')).hexdigest()
+    return os.path.join(thumbnail_directory, '%s-page-nb.txt' % file_hash)
+
+
+def get_cached_page_nb(thumbnail_directory: str, file_path: str) -> Optional[int]:
+    """
+    Get the number of pages of a file counted before, without starting any converter.
+
+    Args:
+        thumbnail_directory (str): The directory where previews are cached.
+        file_path (str): The path to the file.
+
+    Returns:
+        Optional[int]: The number of pages, or None if they must be counted.
+    """
+    try:
+        with open(get_page_nb_path(thumbnail_directory, file_path)) as file:
+            return int(file.read())
+    except (OSError, ValueError):
+        return None
+
+
+def render_page_nb(thumbnail_directory: str, file_path: str) -> int:
+    """
+    Get the number of pages of a file with the PreviewManager, and cache it.
+
+    Args:
+        thumbnail_directory (str): The directory where previews are cached.
+        file_path (str): The path to the file.
+
+    Returns:
+        int: The number of pages in the file.
+    """
+    page_nb = get_cached_page_nb(thumbnail_directory, file_path)
+    if page_nb is not None:
+        return page_nb
+    source_path, file_ext = get_converted_source(thumbnail_directory, file_path)
+    page_nb = get_preview_manager(thumbnail_directory).get_page_nb(source_path, file_ext=file_ext)
+    page_nb_path = get_page_nb_path(thumbnail_directory, file_path)
+    temporary_path = '%s.%s.tmp' % (page_nb_path, os.getpid())
+    with open(temporary_path, 'w') as file:
+        file.write(str(page_nb))
+    os.replace(temporary_path, page_nb_path)
+    return page_nb
+
+
+def get_sprite_paths(thumbnail_directory: str, params: Dict[str, Any]) -> Tuple[str, str]:
+    """
+    Get the paths to a sprite of pages and to its map of page offsets.
+
+    Args:
+        thumbnail_directory (str): The directory where previews are cached.
+        params (dict): Parameters for generating the sprite.
+
+    Returns:
+        Tuple[str, str]: Paths to the JPEG sprite and to its JSON map.
+    """
+    file_hash = hashlib.md5(params['file_path'].encode('utf-8')).hexdigest()
+    height = params['height']
+    name = '%s-%sx%s-pages%s-%s-sprite' % (file_hash, height, height, params['first'], params['last'])
+    path = os.path.join(thumbnail_directory, name)
+    return path + '.jpeg', path + '.json'
+
+
+def get_cached_sprite(thumbnail_directory: str, params: Dict[str, Any]) -> Optional[Tuple[str, str]]:
+    """
+    Get a sprite generated before, without starting any converter.
+
+    Args:
+        thumbnail_directory (str): The directory where previews are cached.
+        params (dict): Parameters for generating the sprite.
+
+    Returns:
+        Optional[Tuple[str, str]]: Paths to the JPEG sprite and to its JSON map, or None if it must be generated.
+    """
+    sprite_path, map_path = get_sprite_paths(thumbnail_directory, params)
+    return (sprite_path, map_path) if os.path.exists(map_path) else None
+
+
+def render_pdf_pages(pdf_path: str, output_directory: str, first: int, last: int, height: int) -> List[str]:
+    """
+    Render a range of pages of a PDF to JPEG images in a single pdftocairo pass.
+
+    Args:
+        pdf_path (str): The path to the PDF.
+        output_directory (str): The directory where the images are written.
+        first (int): The first page, starting at 0.
+        last (int): The last page (included).
+        height (int): The height of the images.
+
+    Returns:
+        List[str]: Paths to the images, in page order.
+    """
+    prefix = os.path.join(output_directory, 'page')
+    subprocess.run(['pdftocairo', '-jpeg', '-f', str(first + 1), '-l', str(last + 1),
+                    '-scale-to-x', '-1', '-scale-to-y', str(height), pdf_path, prefix],
+                   check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    # pdftocairo pads the page number depending on the number of pages
+    names = [name for name in os.listdir(output_directory) if name.startswith('page-')]
+    names.sort(key=lambda name: int(name[len('page-'):].split('.')[0]))
+    return [os.path.join(output_directory, name) for name in names]
+
+
+def render_page_images(thumbnail_directory: str, params: Dict[str, Any], output_directory: str,
+                       content_type: Optional[str] = None) -> List[str]:
+    """
+    Render the pages of a sprite, in a single converter pass when the file
+    is (or can be converted to) a PDF or else page by page.
+
+    Args:
+        thumbnail_directory (str): The directory where previews are cached.
+        params (dict): Parameters for generating the sprite.
+        output_directory (str): The directory where temporary images are written.
+        content_type (str, optional): The content type of the file. Default is None.
+
+    Returns:
+        List[str]: Paths to the images, in page order.
+    """
+    manager = get_preview_manager(thumbnail_directory)
+    file_path, file_ext = get_converted_source(thumbnail_directory, params['file_path'], params.get('file_ext', ''))
+    if file_path.lower().endswith('.pdf'):
+        pdf_path = file_path
+    elif manager.has_pdf_preview(file_path, file_ext=file_ext):
+        pdf_path = manager.get_pdf_preview(file_path, file_ext=file_ext)
+    else:
+        # Images and other files without PDF preview are rendered page by page
+        page_params = {key: value for key, value in params.items() if key not in ('first', 'last')}
+        pages = range(params['first'], params['last'] + 1)
+        return [render_jpeg_preview(thumbnail_directory, {**page_params, 'page': page}, content_type) for page in pages]
+    return render_pdf_pages(pdf_path, output_directory, params['first'], params['last'], params['height'])
+
+
+def stitch_sprite(image_paths: List[str], first: int, sprite_path: str, map_path: str, columns: int) -> Dict[str, Any]:
+    """
+    Lay out page images on rows in a single JPEG sprite and write the map of their offsets.
+
+    Args:
+        image_paths (List[str]): Paths to the images, in page order.
+        first (int): The page of the first image.
+        sprite_path (str): The path to the JPEG sprite.
+        map_path (str): The path to the JSON map.
+        columns (int): The maximum number of pages on each row.
+
+    Returns:
+        Dict[str, Any]: The map with the sprite size and the offsets of each page.
+    """
+    from PIL import Image
+    sizes = []
+    for image_path in image_paths:
+        with Image.open(image_path) as image:
+            sizes.append(image.size)
+    pages, x, y, row_height = [], 0, 0, 0
+    for n, (width, height) in enumerate(sizes):
+        if n > 0 and n % columns == 0:
+            x, y, row_height = 0, y + row_height, 0
+        pages.append(dict(page=first + n, x=x, y=y, width=width, height=height))
+        x, row_height = x + width, max(row_height, height)
+    sprite_map = dict(width=max((page['x'] + page['width'] for page in pages), default=0),
+                      height=y + row_height, pages=pages)
+    sprite = Image.new('RGB', (max(sprite_map['width'], 1), max(sprite_map['height'], 1)), 'white')
+    for image_path, page in zip(image_paths, pages):
+        with Image.open(image_path) as image:
+            sprite.paste(image.convert('RGB'), (page['x'], page['y']))
+    temporary_suffix = '.%s.tmp' % os.getpid()
+    sprite.save(sprite_path + temporary_suffix, 'JPEG', quality=85)
+    with open(map_path + temporary_suffix, 'w') as file:
+        json.dump(sprite_map, file)
+    # The map is moved last since it's used to know if the sprite exists
+    os.replace(sprite_path + temporary_suffix, sprite_path)
+    os.replace(map_path + temporary_suffix, map_path)
+    return sprite_map
+
+
+def render_sprite(thumbnail_directory: str, params: Dict[str, Any], content_type: Optional[str] = None) -> Tuple[str, str]:
+    """
+    Generate a JPEG sprite of a range of pages of a file, with a JSON map of page offsets.
+
+    Args:
+        thumbnail_directory (str): The directory where previews are cached.
+        params (dict): Parameters for generating the sprite: file_path, file_ext, height, first and last.
+        content_type (str, optional): The content type of the file. Default is None.
+
+    Returns:
+        Tuple[str, str]: Paths to the JPEG sprite and to its JSON map.
+
+    Raises:
+        InvalidPageRange: If the range starts after the last page.
+    """
+    sprite_path, map_path = get_sprite_paths(thumbnail_directory, params)
+    if not os.path.exists(map_path):
+        page_nb = render_page_nb(thumbnail_directory, params['file_path'])
+        if params['first'] >= page_nb:
+            raise InvalidPageRange(params['first'], params['last'])
+        params = {**params, 'last': min(params['last'], page_nb - 1)}
+        with TemporaryDirectory(dir=thumbnail_directory) as output_directory:
+            image_paths = render_page_images(thumbnail_directory, params, output_directory, content_type)
+            stitch_sprite(image_paths, params['first'], sprite_path, map_path, int(settings.ds_sprite_columns))
+    return sprite_path, map_path
+
+
+def render_json_preview(thumbnail_directory: str, file_path: str, content_type: Optional[str],
+                        window: Optional[Dict[str, Any]] = None, sheets_only: bool = False) -> Any:
+    """
+    Generate a JSON preview of a file if supported (currently for spreadsheets).
+
+    Spreadsheets are converted once and their sheets cached with the other previews.
+
+    Args:
+        thumbnail_directory (str): The directory where previews are cached.
+        file_path (str): The path to the file.
+        content_type (str): The content type of the file.
+        window (dict, optional): The sheet, rows and columns to preview. Default is everything.
+        sheets_only (bool, optional): Only list the sheets and their dimensions. Default is False.
+
+    Returns:
+        Any: The JSON preview data, or None if unsupported.
+    """
+    if is_content_type_spreadsheet(content_type):
+        if sheets_only:
+            return get_spreadsheet_sheets(file_path, cache_directory=thumbnail_directory, content_type=content_type)
+        return get_spreadsheet_preview(file_path, **(window or {}), cache_directory=thumbnail_directory,
+                                       content_type=content_type)
+    return None
+
+
+def render_sheet_cache(thumbnail_directory: str, file_path: str, content_type: Optional[str]) -> Optional[SheetCache]:
+    """
+    Convert a spreadsheet once and cache its sheets, so they can be streamed.
+
+    Args:
+        thumbnail_directory (str): The directory where previews are cached.
+        file_path (str): The path to the file.
+        content_type (str): The content type of the file.
+
+    Returns:
+        Optional[SheetCache]: The cached sheets, or None if the file isn't a spreadsheet.
+    """
+    if is_content_type_spreadsheet(content_type):
+        return get_sheet_cache(file_path, thumbnail_directory, content_type)
+    return None
+
+
+def get_cached_sheet_cache(thumbnail_directory: str, file_path: str, content_type: Optional[str]) -> Optional[SheetCache]:
+    """
+    Get the sheets of a spreadsheet cached before, without starting any converter.
+
+    Args:
+        thumbnail_directory (str): The directory where previews are cached.
+        file_path (str): The path to the file.
+        content_type (str): The content type of the file.
+
+    Returns:
+        Optional[SheetCache]: The cached sheets, or None if the file isn't a spreadsheet or must be converted.
+    """
+    if is_content_type_spreadsheet(content_type):
+        sheet_cache = SheetCache(get_sheet_cache_directory(file_path, thumbnail_directory))
+        if sheet_cache.exists:
+            return sheet_cache
+    return None
+
+
+class RenderPoolFull(Exception):
+    """Exception raised when too many render jobs are already waiting for a worker."""
+
+
+class RenderPool:
+    """
+    A bounded pool of workers running blocking preview rendering
+    away from the event loop.
+    """
+
+    def __init__(self, kind: str = 'thread', size: int = 4, max_queue: int = 0) -> None:
+        """
+        Initialize the RenderPool.
+
+        Args:
+            kind (str, optional): Either 'thread' or 'process'. Default is 'thread'.
+            size (int, optional): The maximum number of jobs running at once. Default is 4.
+            max_queue (int, optional): The maximum number of jobs waiting for a worker, 0 for no limit. Default is 0.
+        """
+        self.kind = kind
+        self.size = size
+        self.max_queue = max_queue
+        self.pending = 0
+        self.timeouts = 0
+        self.killed = 0
+        self.cancelled = 0
+        self.executor: Optional[Executor] = None
+
+    @property
+    def active(self) -> int:
+        """Number of jobs currently running."""
+        return min(self.pending, self.size)
+
+    @property
+    def queued(self) -> int:
+        """Number of jobs waiting for a worker."""
+        return self.pending - self.active
+
+    @property
+    def is_full(self) -> bool:
+        return self.max_queue > 0 and self.queued >= self.max_queue
+
+    def get_executor(self) -> Executor:
+        """
+        Get the pool executor, creating it if needed.
+
+        Returns:
+            Executor: The executor running the jobs.
+        """
+        if self.executor is None:
+            if self.kind == 'process':
+                context = get_forkserver_context()
+                self.executor = ProcessPoolExecutor(max_workers=self.size, mp_context=context)
+            else:
+                self.executor = ThreadPoolExecutor(max_workers=self.size, thread_name_prefix='render')
+        return self.executor
+
+    async def run(self, func: Callable[..., T], *args: Any) -> T:
+        """
+        Run a blocking function in the pool and wait for its result.
+
+        Args:
+            func (Callable): The function to run. It must be picklable with the 'process' kind.
+            *args: Arguments given to the function.
+
+        Returns:
+            T: The value returned by the function.
+
+        Raises:
+            RenderPoolFull: If too many jobs are already waiting for a worker.
+        """
+        if self.is_full:
+            raise RenderPoolFull()
+        loop = asyncio.get_running_loop()
+        self.pending += 1
+        try:
+            return await loop.run_in_executor(self.get_executor(), partial(func, *args))
+        except ConverterTimeout:
+            self.timeouts += 1
+            raise
+        except ConverterKilled:
+            self.killed += 1
+            raise
+        except asyncio.CancelledError:
+            # A queued job is dropped, a running one finishes in the background
+            self.cancelled += 1
+            raise
+        finally:
+            self.pending -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get the current state of the pool.
+
+        Returns:
+            Dict[str, Any]: The pool kind, size, active and queued jobs, the number
+            of jobs killed for running past their timeout or exceeding their limits,
+            and the number of jobs cancelled because nobody was waiting for them anymore.
+        """
+        return dict(kind=self.kind, size=self.size, active=self.active, queued=self.queued,
+                    timeouts=self.timeouts, killed=self.killed, cancelled=self.cancelled)
+
+    def shutdown(self) -> None:
+        """
+        Stop the pool workers once their current jobs are done.
+        """
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+
+render_pool = RenderPool(kind=settings.ds_render_pool_kind,
+                         size=int(settings.ds_render_pool_size),
+                         max_queue=int(settings.ds_render_pool_max_queue))
+# Threads running the warm conversions, as many as warm converters so none waits for an idle one
+conversion_pool = RenderPool(kind='thread', size=max(converter_pool.size, 1),
+                             max_queue=int(settings.ds_render_pool_max_queue))
+# The main process uses these extensions before any builder is loaded
+register_content_type_extensions()
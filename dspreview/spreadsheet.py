@@ -1,9 +1,19 @@
 from os.path import splitext, basename
-from tempfile import TemporaryDirectory
+from shutil import rmtree
+from tempfile import TemporaryDirectory, mkdtemp
+import codecs
 import csv
 import glob
-import subprocess
-from typing import List, Dict
+import hashlib
+import io
+import json
+import os
+import struct
+from itertools import islice
+from typing import Any, Iterator, List, Dict, Optional, Tuple
+
+from dspreview.config import settings
+from dspreview.limits import get_converter_timeout, run_command
 
 SPREADSHEET_TYPES = (
     'application/vnd.oasis.opendocument.spreadsheet',
@@ -13,6 +23,23 @@ SPREADSHEET_TYPES = (
 
 SPREADSHEET_EXTS = ('.xls', '.xlsx', '.ods', '.csv', '.tsv')
 
+# Plain text spreadsheets, read directly instead of being converted
+DELIMITED_EXTS = ('.csv', '.tsv')
+
+# Byte order marks and the encoding they stand for, longest first
+BOMS = (
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),)
+
+# Size of the sample used to detect the encoding and the dialect
+SAMPLE_SIZE = 64 * 1024
+
+# Format of the row offsets stored in the index of each cached sheet
+OFFSET_FORMAT = struct.Struct('<Q')
+
 
 def is_content_type_spreadsheet(content_type: str) -> bool:
     """
@@ -40,25 +67,167 @@ def is_ext_spreadsheet(ext: str) -> bool:
     return ext in SPREADSHEET_EXTS
 
 
-def convert_spreadsheet_to_csv(file_path: str, output_dir: str) -> List[str]:
+def is_ext_delimited(ext: str) -> bool:
+    """
+    Check if the given file extension represents a plain text spreadsheet (CSV or TSV).
+
+    Args:
+        ext (str): The file extension to check.
+
+    Returns:
+        bool: True if it's a plain text spreadsheet file extension, False otherwise.
+    """
+    return ext.lower() in DELIMITED_EXTS
+
+
+def detect_encoding(sample: bytes) -> str:
+    """
+    Detect the encoding of a text file from its first bytes: from its byte
+    order mark if any, or else UTF-8 if it can be decoded as such, or else Latin-1.
+
+    Args:
+        sample (bytes): The first bytes of the file.
+
+    Returns:
+        str: The name of the encoding.
+    """
+    for bom, encoding in BOMS:
+        if sample.startswith(bom):
+            return encoding
+    try:
+        # The sample might end in the middle of a character
+        codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        return 'latin-1'
+
+
+def sniff_dialect(sample: str, ext: str) -> csv.Dialect:
+    """
+    Guess the dialect (delimiter, quoting...) of a plain text spreadsheet.
+
+    Args:
+        sample (str): The first characters of the file.
+        ext (str): The file extension, used when the dialect can't be guessed.
+
+    Returns:
+        csv.Dialect: The dialect of the file.
+    """
+    try:
+        return csv.Sniffer().sniff(sample, delimiters=',;\t|')
+    except csv.Error:
+        return csv.excel_tab if ext.lower() == '.tsv' else csv.excel
+
+
+def iter_delimited_rows(file_path: str) -> Iterator[List[str]]:
+    """
+    Read the rows of a plain text spreadsheet (CSV or TSV) one at a time.
+
+    Args:
+        file_path (str): The path to the file.
+
+    Yields:
+        List[str]: The cells of each row.
+    """
+    with open(file_path, 'rb') as file:
+        encoding = detect_encoding(file.read(SAMPLE_SIZE))
+    with open(file_path, encoding=encoding, errors='replace', newline='') as file:
+        dialect = sniff_dialect(file.read(SAMPLE_SIZE), splitext(file_path)[1])
+        file.seek(0)
+        yield from csv.reader(file, dialect)
+
+
+def convert_spreadsheet_to_csv(file_path: str, output_dir: str, content_type: Optional[str] = None) -> List[str]:
     """
     Convert a spreadsheet file to CSV files and save them in the specified output directory.
 
     Args:
         file_path (str): The path to the spreadsheet file.
         output_dir (str): The directory where CSV files will be saved.
+        content_type (str, optional): The content type of the file, to get its timeout. Default is None.
 
     Returns:
         List[str]: List of paths to the created CSV files.
+
+    Raises:
+        ConverterTimeout: If the conversion runs past its timeout.
+        ConverterKilled: If ssconvert exceeds its CPU or memory limit.
+        CalledProcessError: If ssconvert fails.
     """
     cmd = 'ssconvert'
     exporter = 'Gnumeric_stf:stf_csv'
     output_files = output_dir + '/%s'
-    subprocess.call([cmd, '--export-type', exporter,
-                    file_path, output_files, '-S'])
+    run_command([cmd, '--export-type', exporter,
+                file_path, output_files, '-S'], get_converter_timeout(content_type))
     return glob.glob(output_dir + '/*')
 
 
+class InvalidWindow(ValueError):
+    """Exception raised when a requested window of a spreadsheet is invalid."""
+
+
+def get_window(sheet: Optional[str] = None, offset: str = '0', limit: Optional[str] = None,
+               column_offset: str = '0', column_limit: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Get the window of rows and columns of a spreadsheet to preview.
+
+    Args:
+        sheet (str, optional): The only sheet to preview. Default is every sheet.
+        offset (str, optional): The first row. Default is 0.
+        limit (str, optional): The maximum number of rows. Default is the maximum allowed.
+        column_offset (str, optional): The first column. Default is 0.
+        column_limit (str, optional): The maximum number of columns. Default is every column.
+
+    Returns:
+        Dict[str, Any]: The window, to give to get_spreadsheet_preview.
+
+    Raises:
+        InvalidWindow: If a value isn't a positive integer.
+    """
+    max_rows = int(settings.ds_spreadsheet_max_rows)
+    try:
+        window = dict(sheet=sheet, offset=int(offset), limit=None if limit is None else int(limit),
+                      column_offset=int(column_offset), column_limit=None if column_limit is None else int(column_limit))
+    except ValueError:
+        raise InvalidWindow()
+    if any(value is not None and value < 0 for key, value in window.items() if key != 'sheet'):
+        raise InvalidWindow()
+    if max_rows > 0:
+        window['limit'] = max_rows if window['limit'] is None else min(window['limit'], max_rows)
+    return window
+
+
+def is_window_truncated(sheets: List[Dict[str, Any]], window: Dict[str, Any]) -> bool:
+    """
+    Check if rows of the selected sheets are left out after a window.
+
+    Args:
+        sheets (List[Dict[str, Any]]): The name, number of rows and number of columns of each sheet.
+        window (dict): The window, as returned by get_window.
+
+    Returns:
+        bool: True if any selected sheet has rows after the window, False otherwise.
+    """
+    if window.get('limit') is None:
+        return False
+    stop = window.get('offset', 0) + window['limit']
+    return any(sheet['rows'] > stop for sheet in sheets if window.get('sheet') in (None, sheet['name']))
+
+
+def iter_csv_rows(file_path: str) -> Iterator[List[str]]:
+    """
+    Read the rows of a CSV file converted by ssconvert one at a time.
+
+    Args:
+        file_path (str): The path to the CSV file.
+
+    Yields:
+        List[str]: The cells of each row.
+    """
+    with open(file_path, newline='') as file:
+        yield from csv.reader(file)
+
+
 def csv_to_dict(file_path: str) -> List[List[str]]:
     """
     Read a CSV file and return its content as a list of lists.
@@ -69,33 +238,373 @@ def csv_to_dict(file_path: str) -> List[List[str]]:
     Returns:
         List[List[str]]: List of lists representing the CSV data.
     """
-    data = []
-    with open(file_path) as file:
-        for row in csv.reader(file):
-            data.append(row)
-    return data
+    return list(iter_csv_rows(file_path))
 
 
-def get_spreadsheet_preview(file_path: str) -> Dict[str, List[List[str]]]:
+def iter_sheets(file_path: str, output_dir: str,
+                content_type: Optional[str] = None) -> Iterator[Tuple[str, Iterator[List[str]]]]:
     """
-    Convert a spreadsheet to CSV files and return the data as a dictionary of sheets.
+    Iterate over the sheets of a spreadsheet, converting it to CSV files first if needed.
 
     Args:
         file_path (str): The path to the spreadsheet file.
+        output_dir (str): The directory where converted CSV files are saved.
+        content_type (str, optional): The content type of the file. Default is None.
+
+    Yields:
+        Tuple[str, Iterator[List[str]]]: The name of each sheet and an iterator over its rows.
+    """
+    # Plain text spreadsheets don't need any conversion
+    if is_ext_delimited(splitext(file_path)[1]):
+        yield 'main', iter_delimited_rows(file_path)
+        return
+    # Convert the entire spreadsheet and create one file per-sheet
+    for sheet_file in sorted(convert_spreadsheet_to_csv(file_path, output_dir, content_type)):
+        # Remove any extension from the file name
+        sheet_name = basename(splitext(sheet_file)[0])
+        # Avoid using the file name as sheet name
+        sheet_name = 'main' if sheet_name == basename(
+            file_path) else sheet_name
+        yield sheet_name, iter_csv_rows(sheet_file)
+
+
+def get_rows_window(rows: Iterator[List[str]], offset: int = 0, limit: Optional[int] = None,
+                    column_offset: int = 0, column_limit: Optional[int] = None) -> List[List[str]]:
+    """
+    Read only a window of rows and columns, without reading the rows after it.
+
+    Args:
+        rows (Iterator[List[str]]): The rows of a sheet.
+        offset (int, optional): The first row. Default is 0.
+        limit (int, optional): The maximum number of rows. Default is every row.
+        column_offset (int, optional): The first column. Default is 0.
+        column_limit (int, optional): The maximum number of columns. Default is every column.
+
+    Returns:
+        List[List[str]]: The rows of the window.
+    """
+    stop = None if limit is None else offset + limit
+    column_stop = None if column_limit is None else column_offset + column_limit
+    return [row[column_offset:column_stop] for row in islice(rows, offset, stop)]
+
+
+class SheetCache:
+    """
+    The sheets of a spreadsheet, converted once to UTF-8 CSV files with an
+    index of the byte offset of each row, so any window of rows can be read
+    without converting or parsing the rest of the spreadsheet.
+    """
+
+    def __init__(self, directory: str) -> None:
+        """
+        Initialize the SheetCache.
+
+        Args:
+            directory (str): The directory where the sheets are cached.
+        """
+        self.directory = directory
+
+    @property
+    def sheets_path(self) -> str:
+        return os.path.join(self.directory, 'sheets.json')
+
+    @property
+    def exists(self) -> bool:
+        return os.path.exists(self.sheets_path)
+
+    def build(self, file_path: str, content_type: Optional[str] = None) -> None:
+        """
+        Convert a spreadsheet and cache its sheets, unless it's already cached.
+
+        The sheets are written in a temporary directory moved in place once
+        the conversion succeeded, so readers never see a partial cache and a
+        failed conversion leaves nothing behind.
+
+        Args:
+            file_path (str): The path to the spreadsheet file.
+            content_type (str, optional): The content type of the file. Default is None.
+
+        Raises:
+            ConverterTimeout: If the conversion runs past its timeout.
+            ConverterKilled: If ssconvert exceeds its CPU or memory limit.
+            CalledProcessError: If ssconvert fails.
+        """
+        if self.exists:
+            return
+        parent_directory = os.path.dirname(self.directory)
+        os.makedirs(parent_directory, exist_ok=True)
+        build_directory = mkdtemp(prefix='.sheets-', dir=parent_directory)
+        try:
+            sheets = []
+            with TemporaryDirectory(prefix='gnumeric-') as output_dir:
+                for number, (sheet_name, rows) in enumerate(iter_sheets(file_path, output_dir, content_type)):
+                    sheet = self.write_sheet(build_directory, '%d' % number, rows)
+                    sheets.append(dict(name=sheet_name, **sheet))
+            with open(os.path.join(build_directory, 'sheets.json'), 'w') as file:
+                json.dump(sheets, file)
+            try:
+                os.rename(build_directory, self.directory)
+            except OSError:
+                # Another worker cached the sheets first
+                if not self.exists:
+                    raise
+        finally:
+            rmtree(build_directory, ignore_errors=True)
+
+    def write_sheet(self, directory: str, name: str, rows: Iterator[List[str]]) -> Dict[str, Any]:
+        """
+        Write the rows of a sheet as a UTF-8 CSV file with the index of their offsets.
+
+        Args:
+            directory (str): The directory where the sheet is written.
+            name (str): The name of the files, without extension.
+            rows (Iterator[List[str]]): The rows of the sheet.
+
+        Returns:
+            Dict[str, Any]: The name of the files and the number of rows and columns of the sheet.
+        """
+        row_count, column_count, position = 0, 0, 0
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator='\n')
+        with open(os.path.join(directory, name + '.csv'), 'wb') as csv_file, \
+             open(os.path.join(directory, name + '.idx'), 'wb') as index_file:
+            for row in rows:
+                writer.writerow(row)
+                content = buffer.getvalue().encode('utf-8')
+                buffer.seek(0)
+                buffer.truncate()
+                index_file.write(OFFSET_FORMAT.pack(position))
+                csv_file.write(content)
+                position += len(content)
+                row_count += 1
+                column_count = max(column_count, len(row))
+            # The end of the last row
+            index_file.write(OFFSET_FORMAT.pack(position))
+        return dict(file=name, rows=row_count, columns=column_count)
+
+    def get_sheets(self) -> List[Dict[str, Any]]:
+        """
+        Get the cached sheets.
+
+        Returns:
+            List[Dict[str, Any]]: The name, files, number of rows and number of columns of each sheet.
+        """
+        with open(self.sheets_path) as file:
+            return json.load(file)
+
+    def read_offset(self, sheet: Dict[str, Any], row: int) -> int:
+        """
+        Read the byte offset of a row of a cached sheet from its index.
+
+        Args:
+            sheet (dict): The cached sheet.
+            row (int): The row, or the number of rows for the end of the last row.
+
+        Returns:
+            int: The offset of the row in the CSV file.
+        """
+        with open(os.path.join(self.directory, sheet['file'] + '.idx'), 'rb') as file:
+            file.seek(row * OFFSET_FORMAT.size)
+            return OFFSET_FORMAT.unpack(file.read(OFFSET_FORMAT.size))[0]
+
+    def iter_rows(self, sheet: Dict[str, Any], offset: int = 0, limit: Optional[int] = None,
+                  column_offset: int = 0, column_limit: Optional[int] = None) -> Iterator[List[str]]:
+        """
+        Read a window of rows and columns of a cached sheet one row at a time.
+
+        Args:
+            sheet (dict): The cached sheet.
+            offset (int, optional): The first row. Default is 0.
+            limit (int, optional): The maximum number of rows. Default is every row.
+            column_offset (int, optional): The first column. Default is 0.
+            column_limit (int, optional): The maximum number of columns. Default is every column.
+
+        Yields:
+            List[str]: The cells of each row of the window.
+        """
+        if offset >= sheet['rows'] or limit == 0:
+            return
+        column_stop = None if column_limit is None else column_offset + column_limit
+        with open(os.path.join(self.directory, sheet['file'] + '.csv'), 'rb') as file:
+            file.seek(self.read_offset(sheet, offset))
+            with io.TextIOWrapper(file, encoding='utf-8', newline='') as text:
+                for row in islice(csv.reader(text), limit):
+                    yield row[column_offset:column_stop]
+
+    def read_rows(self, sheet: Dict[str, Any], offset: int = 0, limit: Optional[int] = None,
+                  column_offset: int = 0, column_limit: Optional[int] = None) -> List[List[str]]:
+        """
+        Read only a window of rows and columns of a cached sheet.
+
+        Args:
+            sheet (dict): The cached sheet.
+            offset (int, optional): The first row. Default is 0.
+            limit (int, optional): The maximum number of rows. Default is every row.
+            column_offset (int, optional): The first column. Default is 0.
+            column_limit (int, optional): The maximum number of columns. Default is every column.
+
+        Returns:
+            List[List[str]]: The rows of the window.
+        """
+        return list(self.iter_rows(sheet, offset, limit, column_offset, column_limit))
+
+    def iter_selected_sheets(self, sheet: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Iterate over the cached sheets, or only over the one with the given name.
+
+        Args:
+            sheet (str, optional): The only sheet to iterate over. Default is every sheet.
+
+        Yields:
+            Dict[str, Any]: Each cached sheet.
+        """
+        for cached_sheet in self.get_sheets():
+            if sheet is None or sheet == cached_sheet['name']:
+                yield cached_sheet
+
+
+def iter_spreadsheet_ndjson(sheet_cache: SheetCache, sheet: Optional[str] = None, offset: int = 0,
+                            limit: Optional[int] = None, column_offset: int = 0,
+                            column_limit: Optional[int] = None) -> Iterator[bytes]:
+    """
+    Stream a window of the cached sheets as newline-delimited JSON: one object
+    with the name and dimensions of each sheet, followed by one array per row.
+
+    Args:
+        sheet_cache (SheetCache): The cached sheets.
+        sheet (str, optional): The only sheet to stream. Default is every sheet.
+        offset (int, optional): The first row of each sheet. Default is 0.
+        limit (int, optional): The maximum number of rows of each sheet. Default is every row.
+        column_offset (int, optional): The first column of each row. Default is 0.
+        column_limit (int, optional): The maximum number of columns of each row. Default is every column.
+
+    Yields:
+        bytes: Each line.
+    """
+    for cached_sheet in sheet_cache.iter_selected_sheets(sheet):
+        header = dict(sheet=cached_sheet['name'], rows=cached_sheet['rows'], columns=cached_sheet['columns'])
+        yield json.dumps(header).encode('utf-8') + b'\n'
+        for row in sheet_cache.iter_rows(cached_sheet, offset, limit, column_offset, column_limit):
+            yield json.dumps(row).encode('utf-8') + b'\n'
+
+
+def iter_spreadsheet_json(sheet_cache: SheetCache, sheet: Optional[str] = None, offset: int = 0,
+                          limit: Optional[int] = None, column_offset: int = 0,
+                          column_limit: Optional[int] = None) -> Iterator[bytes]:
+    """
+    Stream a window of the cached sheets as a JSON object, in the same shape as
+    get_spreadsheet_preview returns.
+
+    Args:
+        sheet_cache (SheetCache): The cached sheets.
+        sheet (str, optional): The only sheet to stream. Default is every sheet.
+        offset (int, optional): The first row of each sheet. Default is 0.
+        limit (int, optional): The maximum number of rows of each sheet. Default is every row.
+        column_offset (int, optional): The first column of each row. Default is 0.
+        column_limit (int, optional): The maximum number of columns of each row. Default is every column.
+
+    Yields:
+        bytes: Consecutive parts of the JSON object.
+    """
+    yield b'{'
+    for sheet_number, cached_sheet in enumerate(sheet_cache.iter_selected_sheets(sheet)):
+        yield (', ' if sheet_number else '').encode('utf-8') + json.dumps(cached_sheet['name']).encode('utf-8') + b': ['
+        rows = sheet_cache.iter_rows(cached_sheet, offset, limit, column_offset, column_limit)
+        for row_number, row in enumerate(rows):
+            yield (b', ' if row_number else b'') + json.dumps(row).encode('utf-8')
+        yield b']'
+    yield b'}'
+
+
+def get_sheet_cache_directory(file_path: str, cache_directory: str) -> str:
+    """
+    Get the directory where the sheets of a spreadsheet are cached.
+
+    Args:
+        file_path (str): The path to the spreadsheet file.
+        cache_directory (str): The directory where previews of the spreadsheet are cached.
+
+    Returns:
+        str: Path to the cached sheets.
+    """
+    file_hash = hashlib.md5(file_path.encode('utf-8')).hexdigest()
+    return os.path.join(cache_directory, '%s-sheets' % file_hash)
+
+
+def get_sheet_cache(file_path: str, cache_directory: str, content_type: Optional[str] = None) -> SheetCache:
+    """
+    Get the cached sheets of a spreadsheet, converting it first if needed.
+
+    Args:
+        file_path (str): The path to the spreadsheet file.
+        cache_directory (str): The directory where previews of the spreadsheet are cached.
+        content_type (str, optional): The content type of the file. Default is None.
+
+    Returns:
+        SheetCache: The cached sheets.
+    """
+    sheet_cache = SheetCache(get_sheet_cache_directory(file_path, cache_directory))
+    sheet_cache.build(file_path, content_type)
+    return sheet_cache
+
+
+def get_spreadsheet_preview(file_path: str, sheet: Optional[str] = None, offset: int = 0, limit: Optional[int] = None,
+                            column_offset: int = 0, column_limit: Optional[int] = None,
+                            cache_directory: Optional[str] = None,
+                            content_type: Optional[str] = None) -> Dict[str, List[List[str]]]:
+    """
+    Convert a spreadsheet to CSV files and return a window of the data as a dictionary of sheets.
+
+    Args:
+        file_path (str): The path to the spreadsheet file.
+        sheet (str, optional): The only sheet to return. Default is every sheet.
+        offset (int, optional): The first row of each sheet. Default is 0.
+        limit (int, optional): The maximum number of rows of each sheet. Default is every row.
+        column_offset (int, optional): The first column of each row. Default is 0.
+        column_limit (int, optional): The maximum number of columns of each row. Default is every column.
+        cache_directory (str, optional): The directory where the converted sheets are cached. Default is no cache.
+        content_type (str, optional): The content type of the file. Default is None.
 
     Returns:
         Dict[str, List[List[str]]]: A dictionary where keys are sheet names and values are CSV data as lists of lists.
     """
     sheets = {}
+    if cache_directory is not None:
+        sheet_cache = get_sheet_cache(file_path, cache_directory, content_type)
+        for cached_sheet in sheet_cache.iter_selected_sheets(sheet):
+            sheets[cached_sheet['name']] = sheet_cache.read_rows(cached_sheet, offset, limit, column_offset, column_limit)
+        return sheets
     # Work inside a temporary directory
     with TemporaryDirectory(prefix='gnumeric-') as output_dir:
-        # Convert the entire spreadsheet and create one file per-sheet
-        for sheet_file in convert_spreadsheet_to_csv(file_path, output_dir):
-            # Remove any extension from the file name
-            sheet_name = basename(splitext(sheet_file)[0])
-            # Avoid using the file name as sheet name
-            sheet_name = 'main' if sheet_name == basename(
-                file_path) else sheet_name
-            # Save the sheet data
-            sheets[sheet_name] = csv_to_dict(sheet_file)
+        for sheet_name, rows in iter_sheets(file_path, output_dir, content_type):
+            if sheet is None or sheet == sheet_name:
+                # Save the sheet data
+                sheets[sheet_name] = get_rows_window(rows, offset, limit, column_offset, column_limit)
+    return sheets
+
+
+def get_spreadsheet_sheets(file_path: str, cache_directory: Optional[str] = None,
+                           content_type: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    List the sheets of a spreadsheet with their dimensions, reading their rows one at a time.
+
+    Args:
+        file_path (str): The path to the spreadsheet file.
+        cache_directory (str, optional): The directory where the converted sheets are cached. Default is no cache.
+        content_type (str, optional): The content type of the file. Default is None.
+
+    Returns:
+        List[Dict[str, Any]]: The name, number of rows and number of columns of each sheet.
+    """
+    if cache_directory is not None:
+        sheets = get_sheet_cache(file_path, cache_directory, content_type).get_sheets()
+        return [dict(name=sheet['name'], rows=sheet['rows'], columns=sheet['columns']) for sheet in sheets]
+    sheets = []
+    with TemporaryDirectory(prefix='gnumeric-') as output_dir:
+        for sheet_name, rows in iter_sheets(file_path, output_dir, content_type):
+            row_count, column_count = 0, 0
+            for row in rows:
+                row_count += 1
+                column_count = max(column_count, len(row))
+            sheets.append(dict(name=sheet_name, rows=row_count, columns=column_count))
     return sheets
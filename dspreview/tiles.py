@@ -0,0 +1,261 @@
+import hashlib
+import math
+import os
+from typing import Any, Dict, Optional, Tuple
+
+from dspreview.config import settings
+from dspreview.render import render_jpeg_preview
+
+DZI_NAMESPACE = 'http://schemas.microsoft.com/deepzoom/2008'
+
+
+class InvalidTile(ValueError):
+    """Exception raised when a requested tile is outside of the pyramid."""
+
+
+def get_tiles_directory(thumbnail_directory: str, params: Dict[str, Any]) -> str:
+    """
+    Get the directory where the raster and the tiles of a page are cached.
+
+    Args:
+        thumbnail_directory (str): The directory where previews are cached.
+        params (dict): Parameters for generating the tiles.
+
+    Returns:
+        str: Path to the tiles directory.
+    """
+    file_hash = hashlib.md5(params['file_path'].encode('utf-8')).hexdigest()
+    return os.path.join(thumbnail_directory, '%s-page%s-tiles' % (file_hash, params.get('page', 0)))
+
+
+def get_tile_source_path(thumbnail_directory: str, params: Dict[str, Any]) -> str:
+    """
+    Get the path to the full resolution raster tiles of a page are cropped from.
+
+    Args:
+        thumbnail_directory (str): The directory where previews are cached.
+        params (dict): Parameters for generating the tiles.
+
+    Returns:
+        str: Path to the raster.
+    """
+    return os.path.join(get_tiles_directory(thumbnail_directory, params), 'source.jpg')
+
+
+def get_tile_path(thumbnail_directory: str, params: Dict[str, Any], level: int, column: int, row: int) -> str:
+    """
+    Get the path to a tile of a page.
+
+    Args:
+        thumbnail_directory (str): The directory where previews are cached.
+        params (dict): Parameters for generating the tiles.
+        level (int): The level in the pyramid.
+        column (int): The column of the tile.
+        row (int): The row of the tile.
+
+    Returns:
+        str: Path to the JPEG tile.
+    """
+    return os.path.join(get_tiles_directory(thumbnail_directory, params), str(level), '%d_%d.jpg' % (column, row))
+
+
+def get_cached_tile(thumbnail_directory: str, params: Dict[str, Any], level: int, column: int, row: int) -> Optional[str]:
+    """
+    Get a tile generated before, without starting any converter.
+
+    Args:
+        thumbnail_directory (str): The directory where previews are cached.
+        params (dict): Parameters for generating the tiles.
+        level (int): The level in the pyramid.
+        column (int): The column of the tile.
+        row (int): The row of the tile.
+
+    Returns:
+        Optional[str]: Path to the JPEG tile, or None if it must be generated.
+    """
+    tile_path = get_tile_path(thumbnail_directory, params, level, column, row)
+    return tile_path if os.path.exists(tile_path) else None
+
+
+def get_cached_dzi_descriptor(thumbnail_directory: str, params: Dict[str, Any]) -> Optional[str]:
+    """
+    Get the Deep Zoom descriptor of a page from a raster generated before,
+    without starting any converter.
+
+    Args:
+        thumbnail_directory (str): The directory where previews are cached.
+        params (dict): Parameters for generating the tiles.
+
+    Returns:
+        Optional[str]: The XML descriptor, or None if the raster must be generated.
+    """
+    from PIL import Image
+    source_path = get_tile_source_path(thumbnail_directory, params)
+    if not os.path.exists(source_path):
+        return None
+    # Only the header is read to get the size
+    with Image.open(source_path) as image:
+        width, height = image.size
+    return get_dzi_descriptor(width, height)
+
+
+def get_max_level(width: int, height: int) -> int:
+    """
+    Get the level of the pyramid where the image has its full size.
+
+    Args:
+        width (int): The width of the full image.
+        height (int): The height of the full image.
+
+    Returns:
+        int: The highest level, level 0 being a single pixel.
+    """
+    return math.ceil(math.log2(max(width, height, 1)))
+
+
+def get_level_size(width: int, height: int, level: int) -> Tuple[int, int]:
+    """
+    Get the size of the image at a level of the pyramid.
+
+    Args:
+        width (int): The width of the full image.
+        height (int): The height of the full image.
+        level (int): The level in the pyramid.
+
+    Returns:
+        Tuple[int, int]: The width and height of the image at this level.
+    """
+    scale = 2 ** (level - get_max_level(width, height))
+    return max(math.ceil(width * scale), 1), max(math.ceil(height * scale), 1)
+
+
+def get_tile_box(width: int, height: int, level: int, column: int, row: int) -> Tuple[int, int, int, int]:
+    """
+    Get the area covered by a tile, at its level, including the overlap with its neighbours.
+
+    Args:
+        width (int): The width of the full image.
+        height (int): The height of the full image.
+        level (int): The level in the pyramid.
+        column (int): The column of the tile.
+        row (int): The row of the tile.
+
+    Returns:
+        Tuple[int, int, int, int]: The left, upper, right and lower coordinates of the tile.
+
+    Raises:
+        InvalidTile: If the tile is outside of the pyramid.
+    """
+    if level < 0 or level > get_max_level(width, height):
+        raise InvalidTile(level, column, row)
+    level_width, level_height = get_level_size(width, height, level)
+    size, overlap = int(settings.ds_tile_size), int(settings.ds_tile_overlap)
+    if column < 0 or row < 0 or column * size >= level_width or row * size >= level_height:
+        raise InvalidTile(level, column, row)
+    left = column * size - (overlap if column > 0 else 0)
+    upper = row * size - (overlap if row > 0 else 0)
+    right = min((column + 1) * size + overlap, level_width)
+    lower = min((row + 1) * size + overlap, level_height)
+    return left, upper, right, lower
+
+
+def get_dzi_descriptor(width: int, height: int) -> str:
+    """
+    Get the Deep Zoom descriptor of an image.
+
+    Args:
+        width (int): The width of the full image.
+        height (int): The height of the full image.
+
+    Returns:
+        str: The XML descriptor.
+    """
+    return ('<?xml version="1.0" encoding="UTF-8"?>'
+            '<Image xmlns="%s" Format="jpg" Overlap="%d" TileSize="%d">'
+            '<Size Width="%d" Height="%d"/>'
+            '</Image>') % (DZI_NAMESPACE, int(settings.ds_tile_overlap), int(settings.ds_tile_size), width, height)
+
+
+def render_tile_source(thumbnail_directory: str, params: Dict[str, Any]) -> Tuple[str, int, int]:
+    """
+    Generate the full resolution raster tiles are cropped from.
+
+    The raster is a JPEG no taller than `ds_tile_source_height`, so it stays
+    small on disk and tiles of the lowest levels can be cropped from a
+    reduced decoding of it.
+
+    Args:
+        thumbnail_directory (str): The directory where previews are cached.
+        params (dict): Parameters for generating the tiles.
+
+    Returns:
+        Tuple[str, int, int]: Path to the raster, and its width and height.
+    """
+    from PIL import Image
+    source_path = get_tile_source_path(thumbnail_directory, params)
+    if not os.path.exists(source_path):
+        os.makedirs(os.path.dirname(source_path), exist_ok=True)
+        height = int(settings.ds_tile_source_height)
+        preview_path = render_jpeg_preview(thumbnail_directory, {**params, 'height': height})
+        temporary_path = '%s.%s.tmp' % (source_path, os.getpid())
+        with Image.open(preview_path) as image:
+            image.convert('RGB').save(temporary_path, 'JPEG', quality=95)
+        os.replace(temporary_path, source_path)
+    with Image.open(source_path) as image:
+        width, height = image.size
+    return source_path, width, height
+
+
+def render_dzi_descriptor(thumbnail_directory: str, params: Dict[str, Any]) -> str:
+    """
+    Generate the Deep Zoom descriptor of a page.
+
+    Args:
+        thumbnail_directory (str): The directory where previews are cached.
+        params (dict): Parameters for generating the tiles.
+
+    Returns:
+        str: The XML descriptor.
+    """
+    _, width, height = render_tile_source(thumbnail_directory, params)
+    return get_dzi_descriptor(width, height)
+
+
+def render_tile(thumbnail_directory: str, params: Dict[str, Any], level: int, column: int, row: int) -> str:
+    """
+    Generate a single tile of a page, from the full resolution raster.
+
+    Its size is recorded in the cache index by the caller.
+
+    Args:
+        thumbnail_directory (str): The directory where previews are cached.
+        params (dict): Parameters for generating the tiles.
+        level (int): The level in the pyramid.
+        column (int): The column of the tile.
+        row (int): The row of the tile.
+
+    Returns:
+        str: Path to the JPEG tile.
+
+    Raises:
+        InvalidTile: If the tile is outside of the pyramid.
+    """
+    from PIL import Image
+    source_path, width, height = render_tile_source(thumbnail_directory, params)
+    left, upper, right, lower = get_tile_box(width, height, level, column, row)
+    tile_path = get_tile_path(thumbnail_directory, params, level, column, row)
+    if not os.path.exists(tile_path):
+        os.makedirs(os.path.dirname(tile_path), exist_ok=True)
+        level_width, level_height = get_level_size(width, height, level)
+        temporary_path = '%s.%s.tmp' % (tile_path, os.getpid())
+        with Image.open(source_path) as image:
+            # Only decode the raster at the smallest scale still covering this level
+            image.draft('RGB', (level_width, level_height))
+            # Coordinates of the tile in the decoded raster
+            decoded_width, decoded_height = image.size
+            scale = decoded_width / level_width
+            box = (left * scale, upper * scale, min(right * scale, decoded_width), min(lower * scale, decoded_height))
+            tile = image.resize((right - left, lower - upper), Image.LANCZOS, box=box)
+            tile.save(temporary_path, 'JPEG', quality=85)
+        os.replace(temporary_path, tile_path)
+    return tile_path
@@ -1,3 +1,6 @@
+import hashlib
+import os
+
 from functools import wraps
 from typing import Any, Union
 
@@ -52,3 +55,51 @@ def hash_dict(func):
                   else v for k, v in kwargs.items()}
         return func(*args, **kwargs)
     return wrapped
+
+
+def get_content_etag(content: bytes) -> str:
+    """
+    Get a strong ETag derived from some content.
+
+    Args:
+        content (bytes): The content.
+
+    Returns:
+        str: The quoted ETag.
+    """
+    return '"%s"' % hashlib.md5(content).hexdigest()
+
+
+def get_file_etag(path: str) -> str:
+    """
+    Get an ETag derived from the modification time and size of a file, like
+    Starlette does, so the file isn't read to serve it.
+
+    Cached files are written once and replaced atomically, so any new content
+    comes with a new modification time.
+
+    Args:
+        path (str): The path to the file.
+
+    Returns:
+        str: The quoted ETag.
+    """
+    stat = os.stat(path)
+    return '"%x-%x"' % (stat.st_mtime_ns, stat.st_size)
+
+
+def is_etag_matching(if_none_match: Union[str, None], etag: Union[str, None]) -> bool:
+    """
+    Check if an ETag matches the value of an If-None-Match header.
+
+    Args:
+        if_none_match (str, optional): The value of the If-None-Match header.
+        etag (str, optional): The quoted ETag.
+
+    Returns:
+        bool: True if the ETag matches, False otherwise.
+    """
+    if not if_none_match or not etag:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(',')]
+    return '*' in tags or etag in tags or 'W/' + etag in tags
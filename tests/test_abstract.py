@@ -4,8 +4,9 @@ import unittest
 import urllib.parse
 
 from concurrent.futures import ThreadPoolExecutor
-from dspreview.main import app
+from dspreview.main import app, etag_cache, thumbnail_cache
 from dspreview.config import settings
+from dspreview.document import meta_cache
 from fastapi.testclient import TestClient
 from http.server import BaseHTTPRequestHandler, HTTPServer
 from shutil import copyfile
@@ -27,6 +28,9 @@ class AbstractTest(unittest.TestCase):
 
     def setUp(self):
         self.client = TestClient(app)
+        meta_cache.clear()
+        thumbnail_cache.clear()
+        etag_cache.clear()
 
     def datashare_url(self, path):
         return urllib.parse.urljoin(settings.ds_host, path)
@@ -2,19 +2,23 @@ import datetime
 import subprocess
 import os
 import unittest
+from unittest.mock import patch
 
-from dspreview.cache import DocumentCache, CACHE_PATH
-from tempfile import gettempdir
+from dspreview.cache import DocumentCache, FailureCache, ThumbnailCache, CACHE_PATH, cache_index, get_cache_directory, get_cached_directories
+from dspreview.document import Document
+from dspreview.index import EVICTION_PAGE_SIZE, CacheIndex
+from tempfile import gettempdir, TemporaryDirectory
 
 
 def seconds_ago(n):
     return datetime.datetime.now() - datetime.timedelta(seconds = n)
 
 
-def makedirs_seconds_ago(path, n = 0):
+def makedirs_seconds_ago(path, n = 0, kind = 'document', size = 0, index = cache_index):
     os.makedirs(path, exist_ok = True)
     n_seconds_ago = seconds_ago(n).strftime('%Y%m%d%H%M.%S')
     subprocess.run(['touch', path, '-t', n_seconds_ago])
+    index.record(os.path.normpath(path), kind, size, seconds_ago(n).timestamp())
 
 
 class CacheTest(unittest.TestCase):
@@ -25,6 +29,7 @@ class CacheTest(unittest.TestCase):
         self.assertTrue(os.path.exists(target))
         DocumentCache(999).purge()
         self.assertFalse(os.path.exists(target))
+        self.assertIsNone(cache_index.get(os.path.normpath(target)))
 
     def test_cache_is_not_purged(self):
         target = os.path.join(CACHE_PATH, 'documents/test-index/not-to-delete-id/')
@@ -32,3 +37,173 @@ class CacheTest(unittest.TestCase):
         self.assertTrue(os.path.exists(target))
         DocumentCache(999).purge()
         self.assertTrue(os.path.exists(target))
+
+    def test_buffered_access_is_written_before_purge(self):
+        target = os.path.join(CACHE_PATH, 'documents/test-index/recently-touched-id/')
+        makedirs_seconds_ago(target, 1000)
+        cache_index.touch_later(os.path.normpath(target))
+        DocumentCache(999).purge()
+        self.assertTrue(os.path.exists(target))
+
+    def test_document_directory_is_created_on_download(self):
+        document = Document('test-index', 'never-downloaded-id')
+        self.assertFalse(os.path.exists(document.target_directory))
+
+
+class CacheEvictionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.index_directory = TemporaryDirectory()
+        self.index = CacheIndex(os.path.join(self.index_directory.name, 'index.sqlite3'))
+
+    def tearDown(self):
+        self.index_directory.cleanup()
+
+    def test_raw_documents_are_evicted_first(self):
+        document = os.path.join(CACHE_PATH, 'documents/test-index/recent-raw-id/')
+        thumbnail = os.path.join(CACHE_PATH, 'thumbnails/test-index/old-thumbnail-id/')
+        makedirs_seconds_ago(document, 10, 'document', 600, self.index)
+        makedirs_seconds_ago(thumbnail, 1000, 'thumbnail', 600, self.index)
+        DocumentCache(999, 1000, 800, self.index).evict()
+        self.assertFalse(os.path.exists(document))
+        self.assertTrue(os.path.exists(thumbnail))
+
+    def test_least_recently_accessed_documents_are_evicted_first(self):
+        recent = os.path.join(CACHE_PATH, 'documents/test-index/recent-id/')
+        old = os.path.join(CACHE_PATH, 'documents/test-index/old-id/')
+        makedirs_seconds_ago(recent, 10, 'document', 600, self.index)
+        makedirs_seconds_ago(old, 500, 'document', 600, self.index)
+        DocumentCache(999, 1000, 800, self.index).evict()
+        self.assertFalse(os.path.exists(old))
+        self.assertTrue(os.path.exists(recent))
+
+    def test_cache_below_high_watermark_is_not_evicted(self):
+        target = os.path.join(CACHE_PATH, 'documents/test-index/small-id/')
+        makedirs_seconds_ago(target, 500, 'document', 600, self.index)
+        DocumentCache(999, 1000, 800, self.index).evict()
+        self.assertTrue(os.path.exists(target))
+
+    def test_eviction_candidates_are_read_page_by_page(self):
+        count = EVICTION_PAGE_SIZE * 2 + 1
+        for n in range(count):
+            self.index.record('/cache/documents/test-index/id-%d' % n, 'document', 1, n)
+        candidates = self.index.iter_eviction_candidates()
+        self.assertEqual(next(candidates), ('/cache/documents/test-index/id-0', 1))
+        # Entries deleted while iterating don't stop the next pages from being read
+        self.index.delete('/cache/documents/test-index/id-0')
+        paths = [path for path, _ in candidates]
+        self.assertEqual(paths, ['/cache/documents/test-index/id-%d' % n for n in range(1, count)])
+
+    def test_kept_directories_are_not_evicted(self):
+        old = os.path.join(CACHE_PATH, 'documents/test-index/kept-old-id/')
+        recent = os.path.join(CACHE_PATH, 'documents/test-index/evicted-recent-id/')
+        makedirs_seconds_ago(old, 500, 'document', 600, self.index)
+        makedirs_seconds_ago(recent, 10, 'document', 600, self.index)
+        DocumentCache(999, 1000, 800, self.index).evict(keep=[os.path.normpath(old)])
+        self.assertTrue(os.path.exists(old))
+        self.assertFalse(os.path.exists(recent))
+
+    def test_cache_is_evicted_when_recording_exceeds_high_watermark(self):
+        old = os.path.join(CACHE_PATH, 'documents/test-index/evicted-on-record-id/')
+        makedirs_seconds_ago(old, 500, 'document', 600, self.index)
+        document = Document('test-index', 'recorded-id')
+        os.makedirs(document.target_directory, exist_ok = True)
+        with open(os.path.join(document.target_directory, 'raw'), 'wb') as file:
+            file.write(b'x' * 600)
+        with patch('dspreview.document.cache_index', self.index), \
+             patch('dspreview.document.document_cache', DocumentCache(999, 1000, 800, self.index)):
+            document.record_target_dir()
+        self.assertFalse(os.path.exists(old))
+        self.assertTrue(os.path.exists(document.target_directory))
+
+
+class CacheLayoutTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_directory = TemporaryDirectory()
+        self.path = self.cache_directory.name
+
+    def tearDown(self):
+        self.cache_directory.cleanup()
+
+    def test_flat_directory(self):
+        directory = get_cache_directory(self.path, 'my-index', 'my-id', 0)
+        self.assertEqual(directory, os.path.join(self.path, 'my-index', 'my-id'))
+
+    def test_sharded_directory(self):
+        directory = get_cache_directory(self.path, 'my-index', 'my-id', 2)
+        # sha1('my-id') starts with 'd5f4'
+        self.assertEqual(directory, os.path.join(self.path, 'my-index', 'd5', 'f4', 'my-id'))
+
+    def test_existing_flat_directory_is_still_used(self):
+        flat = os.path.join(self.path, 'my-index', 'my-id')
+        os.makedirs(flat)
+        self.assertEqual(get_cache_directory(self.path, 'my-index', 'my-id', 2), flat)
+
+    def test_cached_directories_with_both_layouts(self):
+        flat = os.path.join(self.path, 'my-index', 'old-id')
+        sharded = get_cache_directory(self.path, 'my-index', 'new-id', 2)
+        os.makedirs(flat)
+        os.makedirs(sharded)
+        self.assertCountEqual(get_cached_directories(self.path, 2), [flat, sharded])
+
+
+class FailureCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.index_directory = TemporaryDirectory()
+        self.index = CacheIndex(os.path.join(self.index_directory.name, 'index.sqlite3'))
+
+    def tearDown(self):
+        self.index_directory.cleanup()
+
+    def test_failure_is_kept(self):
+        cache = FailureCache(60, self.index)
+        cache.add('my-index', 'my-id', 'timeout')
+        cache.add('my-index', 'my-id', 'not_previewable')
+        self.assertEqual(cache.get('my-index', 'my-id'), 'timeout')
+        cache.delete('my-index', 'my-id')
+        self.assertIsNone(cache.get('my-index', 'my-id'))
+
+    def test_failure_lookup_is_kept_in_memory(self):
+        cache = FailureCache(60, self.index)
+        self.assertIsNone(cache.get_cached('my-index', 'my-id'))
+        self.assertIsNone(cache.get('my-index', 'my-id'))
+        self.assertEqual(cache.get_cached('my-index', 'my-id'), '')
+        with patch.object(self.index, 'get_failure') as get_failure:
+            self.assertIsNone(cache.get('my-index', 'my-id'))
+        get_failure.assert_not_called()
+
+    def test_known_failure_is_not_written_again(self):
+        cache = FailureCache(60, self.index)
+        cache.add('my-index', 'my-id', 'timeout')
+        with patch.object(self.index, 'add_failure') as add_failure:
+            cache.add('my-index', 'my-id', 'timeout')
+        add_failure.assert_not_called()
+        self.assertEqual(cache.get_cached('my-index', 'my-id'), 'timeout')
+
+    def test_expired_failure_is_purged(self):
+        cache = FailureCache(60, self.index)
+        self.index.add_failure('my-index', 'my-id', 'timeout', seconds_ago(1).timestamp())
+        self.assertIsNone(self.index.get_failure('my-index', 'my-id'))
+        cache.purge()
+        self.assertEqual(self.index.connection.execute('SELECT COUNT(*) FROM failures').fetchone()[0], 0)
+
+
+class ThumbnailCacheTest(unittest.TestCase):
+
+    def test_least_recently_used_thumbnails_are_evicted(self):
+        cache = ThumbnailCache(max_size=10, max_item_size=10)
+        cache.set('foo', b'12345')
+        cache.set('bar', b'12345')
+        cache.get('foo')
+        cache.set('baz', b'12345')
+        self.assertEqual(cache.get('foo'), b'12345')
+        self.assertIsNone(cache.get('bar'))
+        self.assertEqual(cache.size, 10)
+
+    def test_big_thumbnails_are_not_cached(self):
+        cache = ThumbnailCache(max_size=100, max_item_size=4)
+        cache.set('foo', b'12345')
+        self.assertIsNone(cache.get('foo'))
+        self.assertEqual(cache.stats()['misses'], 1)
@@ -0,0 +1,28 @@
+import httpx
+import unittest
+
+from dspreview.client import create_client
+from dspreview.config import settings
+from unittest.mock import patch
+
+
+class ClientTest(unittest.TestCase):
+
+    def test_client_timeouts_come_from_settings(self):
+        with patch.object(settings, 'ds_client_connect_timeout', 2.0), patch.object(settings, 'ds_client_read_timeout', 30.0):
+            client = create_client()
+        self.assertEqual(client.timeout.connect, 2.0)
+        self.assertEqual(client.timeout.read, 30.0)
+        self.assertEqual(client.timeout.pool, 2.0)
+
+    def test_client_rejects_cookies(self):
+        client = create_client()
+        request = httpx.Request('GET', 'http://datashare.local/api/my-index/documents/id')
+        response = httpx.Response(200, headers={'Set-Cookie': 'session=secret'}, request=request)
+        client.cookies.extract_cookies(response)
+        self.assertEqual(len(client.cookies.jar), 0)
+
+    def test_client_without_h2_falls_back_to_http1(self):
+        with patch.object(settings, 'ds_client_http2', True), patch('dspreview.client.find_spec', return_value=None):
+            client = create_client()
+        self.assertFalse(client._transport._pool._http2)
@@ -0,0 +1,39 @@
+import gzip
+import unittest
+
+from dspreview import compression
+from dspreview.compression import compress_stream, iter_chunks, negotiate_encoding
+from unittest.mock import patch
+
+
+class CompressionTest(unittest.TestCase):
+
+    def test_negotiate_gzip(self):
+        with patch.object(compression, 'brotli', None), patch.object(compression, 'zstandard', None):
+            self.assertEqual(negotiate_encoding('gzip, deflate, br, zstd'), 'gzip')
+
+    def test_negotiate_preferred_encoding(self):
+        with patch.object(compression, 'brotli', object()), patch.object(compression, 'zstandard', None):
+            self.assertEqual(negotiate_encoding('gzip, deflate, br'), 'br')
+            self.assertEqual(negotiate_encoding('gzip, br;q=0.5'), 'gzip')
+
+    def test_negotiate_no_encoding(self):
+        self.assertIsNone(negotiate_encoding(None))
+        self.assertIsNone(negotiate_encoding('identity'))
+        self.assertIsNone(negotiate_encoding('gzip;q=0'))
+
+    def test_negotiate_any_encoding(self):
+        with patch.object(compression, 'brotli', None), patch.object(compression, 'zstandard', None):
+            self.assertEqual(negotiate_encoding('*'), 'gzip')
+
+    def test_iter_chunks(self):
+        chunks = list(iter_chunks(iter([b'ab', b'cd', b'e']), chunk_size=3))
+        self.assertEqual(chunks, [b'abcd', b'e'])
+
+    def test_compress_stream_gzip(self):
+        parts = [b'foo\n'] * 100_000
+        compressed = b''.join(compress_stream(iter(parts), 'gzip'))
+        self.assertEqual(gzip.decompress(compressed), b''.join(parts))
+
+    def test_compress_stream_identity(self):
+        self.assertEqual(b''.join(compress_stream(iter([b'foo', b'bar']), None)), b'foobar')
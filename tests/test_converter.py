@@ -0,0 +1,101 @@
+import asyncio
+import subprocess
+import unittest
+
+from dspreview.converter import ConverterPool, ConverterServer, ConverterUnavailable
+from dspreview.document import Document
+from dspreview.limits import ConverterTimeout
+from dspreview.render import RenderPool, RenderPoolFull, convert_office_source, get_converted_path, get_converted_source
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
+
+
+class ConverterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.thumbnail_directory = TemporaryDirectory()
+
+    def tearDown(self):
+        self.thumbnail_directory.cleanup()
+
+    def test_disabled_pool_falls_back(self):
+        pool = ConverterPool(size=0)
+        self.assertFalse(pool.enabled)
+        self.assertIsNone(pool.convert('/tmp/raw.docx', '/tmp/raw.pdf'))
+        with self.assertRaises(ConverterUnavailable):
+            with pool.acquire():
+                pass
+
+    def test_server_recycled_after_max_jobs(self):
+        server = ConverterServer(max_jobs=2)
+        server.jobs = 1
+        self.assertFalse(server.should_recycle())
+        server.jobs = 2
+        self.assertTrue(server.should_recycle())
+
+    def test_server_recycled_above_max_memory(self):
+        server = ConverterServer(max_memory=100)
+        with patch.object(ConverterServer, 'get_memory', return_value=200):
+            self.assertTrue(server.should_recycle())
+
+    def test_unhealthy_server_is_restarted(self):
+        pool = ConverterPool(size=1)
+        with patch.object(ConverterPool, 'enabled', True), \
+             patch.object(ConverterServer, 'is_healthy', return_value=False), \
+             patch.object(ConverterServer, 'start') as start:
+            with pool.acquire() as server:
+                self.assertIs(server, pool.servers[0])
+        start.assert_called_once()
+        self.assertEqual(pool.idle_servers.qsize(), 1)
+
+    def test_failed_conversion_falls_back(self):
+        pool = ConverterPool(size=1)
+        with patch.object(ConverterPool, 'enabled', True), \
+             patch.object(ConverterServer, 'is_healthy', return_value=True), \
+             patch.object(ConverterServer, 'convert', side_effect=subprocess.CalledProcessError(1, 'unoconvert')), \
+             patch.object(ConverterServer, 'stop') as stop:
+            self.assertIsNone(pool.convert('/tmp/raw.docx', '/tmp/raw.pdf'))
+        stop.assert_called_once()
+
+    def test_timed_out_conversion_does_not_fall_back(self):
+        pool = ConverterPool(size=1)
+        with patch.object(ConverterPool, 'enabled', True), \
+             patch.object(ConverterServer, 'is_healthy', return_value=True), \
+             patch.object(ConverterServer, 'convert', side_effect=subprocess.TimeoutExpired('unoconvert', 10)), \
+             patch.object(ConverterServer, 'stop') as stop:
+            with self.assertRaises(ConverterTimeout):
+                pool.convert('/tmp/raw.docx', '/tmp/raw.pdf', timeout=10)
+        stop.assert_called_once()
+        self.assertEqual(pool.idle_servers.qsize(), 1)
+
+    def test_warm_conversions_wait_in_a_bounded_pool(self):
+        document = Document('test-index', 'warm-id')
+        document.source = {'path': '/docs/report.docx'}
+        conversion_pool = RenderPool(kind='thread', size=1, max_queue=1)
+        conversion_pool.pending = 2
+        with patch('dspreview.document.converter_pool') as converter_pool, \
+             patch('dspreview.document.conversion_pool', conversion_pool), \
+             patch('dspreview.document.convert_office_source') as convert:
+            converter_pool.enabled = True
+            with self.assertRaises(RenderPoolFull):
+                asyncio.run(document.convert_source())
+        convert.assert_not_called()
+
+    def test_office_source_converted_only_for_office_documents(self):
+        directory = self.thumbnail_directory.name
+        with patch('dspreview.render.converter_pool') as converter_pool:
+            converter_pool.enabled = True
+            self.assertIsNone(convert_office_source(directory, '/tmp/raw.jpg'))
+            converter_pool.convert.assert_not_called()
+            convert_office_source(directory, '/tmp/raw.docx', timeout=10)
+            converter_pool.convert.assert_called_once_with('/tmp/raw.docx', get_converted_path(directory, '/tmp/raw.docx'), timeout=10)
+            converter_pool.convert.return_value = None
+            self.assertIsNone(convert_office_source(directory, '/tmp/raw.odt'))
+
+    def test_converted_source_is_only_looked_up(self):
+        directory = self.thumbnail_directory.name
+        with patch('dspreview.render.converter_pool') as converter_pool:
+            self.assertEqual(get_converted_source(directory, '/tmp/raw.docx'), ('/tmp/raw.docx', ''))
+            open(get_converted_path(directory, '/tmp/raw.docx'), 'w').close()
+            self.assertEqual(get_converted_source(directory, '/tmp/raw.docx'), (get_converted_path(directory, '/tmp/raw.docx'), '.pdf'))
+            converter_pool.convert.assert_not_called()
@@ -0,0 +1,84 @@
+import asyncio
+import os
+import unittest
+
+from dspreview.flight import SingleFlight
+from tempfile import TemporaryDirectory
+
+
+class SingleFlightTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.lock_directory = TemporaryDirectory()
+        self.flights = SingleFlight(self.lock_directory.name)
+        self.calls = 0
+
+    async def asyncTearDown(self):
+        self.lock_directory.cleanup()
+
+    async def work(self):
+        self.calls += 1
+        await asyncio.sleep(0.05)
+        return self.calls
+
+    async def test_concurrent_calls_are_coalesced(self):
+        results = await asyncio.gather(*[self.flights.run('key', self.work) for _ in range(5)])
+        self.assertEqual(results, [1] * 5)
+        self.assertEqual(self.calls, 1)
+
+    async def test_different_keys_are_not_coalesced(self):
+        await asyncio.gather(self.flights.run('foo', self.work), self.flights.run('bar', self.work))
+        self.assertEqual(self.calls, 2)
+
+    async def test_sequential_calls_are_not_coalesced(self):
+        await self.flights.run('key', self.work)
+        await self.flights.run('key', self.work)
+        self.assertEqual(self.calls, 2)
+        self.assertEqual(self.flights.calls, {})
+
+    async def test_call_is_cancelled_without_waiters(self):
+        task = asyncio.ensure_future(self.flights.run('key', self.work))
+        await asyncio.sleep(0.01)
+        call = self.flights.calls['key']
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+        await asyncio.sleep(0)
+        self.assertTrue(call.cancelled())
+        self.assertEqual(self.flights.calls, {})
+        self.assertEqual(self.flights.waiters, {})
+
+    async def test_call_continues_with_other_waiters(self):
+        cancelled = asyncio.ensure_future(self.flights.run('key', self.work))
+        waiting = asyncio.ensure_future(self.flights.run('key', self.work))
+        await asyncio.sleep(0.01)
+        cancelled.cancel()
+        self.assertEqual(await waiting, 1)
+        self.assertEqual(self.calls, 1)
+
+    async def test_new_call_after_cancelled_call(self):
+        task = asyncio.ensure_future(self.flights.run('key', self.work))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+        self.assertEqual(await self.flights.run('key', self.work), 2)
+
+    async def test_lock_file_is_removed(self):
+        await self.flights.run('key', self.work)
+        self.assertEqual(os.listdir(self.lock_directory.name), [])
+
+    async def test_lock_is_shared_between_workers(self):
+        running = []
+
+        async def work():
+            running.append(1)
+            self.assertEqual(len(running), 1)
+            await asyncio.sleep(0.05)
+            running.pop()
+            self.calls += 1
+
+        other = SingleFlight(self.lock_directory.name, poll_interval=0.01)
+        await asyncio.gather(*[flights.run('key', work) for flights in (self.flights, other, self.flights, other)])
+        self.assertEqual(self.calls, 2)
+        self.assertEqual(os.listdir(self.lock_directory.name), [])
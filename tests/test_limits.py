@@ -0,0 +1,115 @@
+import os
+import time
+import unittest
+
+from dspreview.config import settings
+from dspreview.limits import get_converter_timeout, run_command, run_limited, ConverterKilled, ConverterTimeout
+from subprocess import CalledProcessError
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
+
+
+def sleep(seconds):
+    time.sleep(seconds)
+    return seconds
+
+
+def spawn_and_sleep(pid_path):
+    # A converter started by the conversion, in the same process group
+    os.system('sleep 30 & echo $! > %s; wait' % pid_path)
+
+
+def fail():
+    raise ValueError('foo')
+
+
+def exit():
+    os._exit(1)
+
+
+def get_process_group():
+    return os.getpgid(0)
+
+
+def is_alive(pid):
+    try:
+        with open('/proc/%s/stat' % pid) as file:
+            # Killed processes might not be reaped yet
+            return file.read().split(')')[-1].split()[0] != 'Z'
+    except FileNotFoundError:
+        return False
+
+
+class LimitsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.timeouts = settings.ds_converter_timeouts
+        self.default_timeout = settings.ds_converter_default_timeout
+        settings.ds_converter_timeouts = 'application/pdf=10,image/svg+xml=5'
+        settings.ds_converter_default_timeout = 20
+
+    def tearDown(self):
+        settings.ds_converter_timeouts = self.timeouts
+        settings.ds_converter_default_timeout = self.default_timeout
+
+    def test_converter_timeout_per_content_type(self):
+        self.assertEqual(get_converter_timeout('image/svg+xml'), 5)
+        self.assertEqual(get_converter_timeout('application/pdf'), 10)
+        self.assertEqual(get_converter_timeout('image/png'), 20)
+        self.assertEqual(get_converter_timeout(), 20)
+
+    def test_run_limited(self):
+        self.assertEqual(run_limited(10, sleep, 0), 0)
+
+    def test_run_limited_in_own_process_group(self):
+        self.assertNotEqual(run_limited(10, get_process_group), os.getpgid(0))
+
+    def test_run_limited_raises_errors(self):
+        with self.assertRaises(ValueError):
+            run_limited(10, fail)
+
+    def test_run_limited_timeout(self):
+        with self.assertRaises(ConverterTimeout):
+            run_limited(0.5, sleep, 10)
+
+    def test_run_limited_killed(self):
+        with self.assertRaises(ConverterKilled) as context:
+            run_limited(10, exit)
+        self.assertEqual(context.exception.args, (1,))
+
+    def test_run_limited_timeout_kills_process_group(self):
+        with TemporaryDirectory() as directory:
+            pid_path = os.path.join(directory, 'pid')
+            with self.assertRaises(ConverterTimeout):
+                run_limited(1, spawn_and_sleep, pid_path)
+            with open(pid_path) as file:
+                pid = int(file.read())
+        time.sleep(0.1)
+        self.assertFalse(is_alive(pid))
+
+    def test_run_command_timeout(self):
+        with self.assertRaises(ConverterTimeout):
+            run_command(['sleep', '10'], 0.5)
+
+    def test_run_command(self):
+        self.assertEqual(run_command(['true'], 10).returncode, 0)
+
+    def test_run_command_fails(self):
+        with self.assertRaises(CalledProcessError):
+            run_command(['false'], 10)
+
+    def test_run_command_killed(self):
+        with self.assertRaises(ConverterKilled):
+            run_command(['sh', '-c', 'kill -9 $$'], 10)
+
+    def test_run_command_cpu_limit(self):
+        with patch.object(settings, 'ds_converter_cpu_limit', 1):
+            with self.assertRaises(ConverterKilled):
+                run_command(['sh', '-c', 'while :; do :; done'], 10)
+
+    def test_run_command_in_own_process_group(self):
+        with TemporaryDirectory() as directory:
+            pgid_path = os.path.join(directory, 'pgid')
+            run_command(['sh', '-c', 'ps -o pgid= $$ > %s' % pgid_path], 10)
+            with open(pgid_path) as file:
+                self.assertNotEqual(int(file.read()), os.getpgid(0))
@@ -0,0 +1,75 @@
+import unittest
+
+from dspreview.config import settings
+from dspreview.preview import get_page_range, get_size_height, InvalidPageRange, InvalidSize
+
+
+class PreviewSizeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.buckets = settings.ds_thumbnail_size_buckets
+        self.step = settings.ds_thumbnail_size_step
+        self.max_height = settings.ds_thumbnail_max_height
+        settings.ds_thumbnail_size_buckets = '80,310,960'
+        settings.ds_thumbnail_size_step = 0
+        settings.ds_thumbnail_max_height = 1000
+
+    def tearDown(self):
+        settings.ds_thumbnail_size_buckets = self.buckets
+        settings.ds_thumbnail_size_step = self.step
+        settings.ds_thumbnail_max_height = self.max_height
+
+    def test_named_size(self):
+        self.assertEqual(get_size_height('sm'), 310)
+
+    def test_unknown_size(self):
+        self.assertEqual(get_size_height('foo'), 80)
+
+    def test_numeric_size_is_snapped_to_bucket(self):
+        self.assertEqual(get_size_height('301'), 310)
+        self.assertEqual(get_size_height('302'), 310)
+        self.assertEqual(get_size_height('310'), 310)
+
+    def test_numeric_size_above_last_bucket(self):
+        self.assertEqual(get_size_height('999'), 960)
+
+    def test_numeric_size_is_snapped_to_step(self):
+        settings.ds_thumbnail_size_buckets = ''
+        settings.ds_thumbnail_size_step = 100
+        self.assertEqual(get_size_height('301'), 400)
+
+    def test_numeric_size_above_max_height(self):
+        with self.assertRaises(InvalidSize):
+            get_size_height('1001')
+
+    def test_numeric_size_zero(self):
+        with self.assertRaises(InvalidSize):
+            get_size_height('0')
+
+
+class PageRangeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.max_pages = settings.ds_sprite_max_pages
+        settings.ds_sprite_max_pages = 10
+
+    def tearDown(self):
+        settings.ds_sprite_max_pages = self.max_pages
+
+    def test_page_range(self):
+        self.assertEqual(get_page_range('2', '5'), (2, 5))
+
+    def test_page_range_defaults_to_max_pages(self):
+        self.assertEqual(get_page_range('2'), (2, 11))
+
+    def test_page_range_too_long(self):
+        with self.assertRaises(InvalidPageRange):
+            get_page_range('0', '10')
+
+    def test_page_range_empty(self):
+        with self.assertRaises(InvalidPageRange):
+            get_page_range('5', '4')
+
+    def test_page_range_not_numeric(self):
+        with self.assertRaises(InvalidPageRange):
+            get_page_range('foo')
@@ -0,0 +1,129 @@
+import base64
+import io
+import json
+import os
+import unittest
+
+from dspreview.document import Document
+from dspreview.render import downscale_jpeg, get_cached_jpeg_preview, get_cached_page_nb, get_downscaled_preview_path, get_embedded_preview
+from dspreview.render import render_fast_jpeg_preview, render_page_nb, stitch_sprite
+from PIL import Image
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
+
+
+def resource_path(resource_name):
+    current_directory = os.path.dirname(os.path.realpath(__file__))
+    return os.path.join(current_directory, 'resources', resource_name)
+
+
+class RenderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.thumbnail_directory = TemporaryDirectory()
+
+    def tearDown(self):
+        self.thumbnail_directory.cleanup()
+
+    def test_downscale_jpeg(self):
+        target_path = os.path.join(self.thumbnail_directory.name, 'downscaled.jpeg')
+        downscale_jpeg(resource_path('dummy.jpg'), target_path, 80)
+        with Image.open(target_path) as image:
+            self.assertLessEqual(max(image.size), 80)
+            self.assertEqual(image.format, 'JPEG')
+
+    def test_downscaled_preview_path_depends_on_size_and_page(self):
+        params = dict(file_path='/tmp/raw.pdf', height=80, page=0)
+        paths = {
+            get_downscaled_preview_path(self.thumbnail_directory.name, params),
+            get_downscaled_preview_path(self.thumbnail_directory.name, {**params, 'height': 310}),
+            get_downscaled_preview_path(self.thumbnail_directory.name, {**params, 'page': 1}),
+        }
+        self.assertEqual(len(paths), 3)
+
+    def test_stitch_sprite(self):
+        image_paths = []
+        for n, size in enumerate([(60, 80), (40, 80), (50, 70)]):
+            image_path = os.path.join(self.thumbnail_directory.name, 'page-%s.jpg' % n)
+            Image.new('RGB', size).save(image_path)
+            image_paths.append(image_path)
+        sprite_path = os.path.join(self.thumbnail_directory.name, 'sprite.jpeg')
+        map_path = os.path.join(self.thumbnail_directory.name, 'sprite.json')
+        stitch_sprite(image_paths, 4, sprite_path, map_path, 2)
+        with open(map_path) as file:
+            sprite_map = json.load(file)
+        self.assertEqual((sprite_map['width'], sprite_map['height']), (100, 150))
+        self.assertEqual(sprite_map['pages'][1], dict(page=5, x=60, y=0, width=40, height=80))
+        self.assertEqual(sprite_map['pages'][2], dict(page=6, x=0, y=80, width=50, height=70))
+        with Image.open(sprite_path) as image:
+            self.assertEqual(image.size, (100, 150))
+
+    def create_jpeg(self, size, orientation=1):
+        path = os.path.join(self.thumbnail_directory.name, 'raw.jpg')
+        exif = Image.Exif()
+        exif[0x0112] = orientation
+        Image.new('RGB', size).save(path, exif=exif)
+        return path
+
+    def test_fast_jpeg_preview(self):
+        file_path = self.create_jpeg((800, 400))
+        params = dict(file_path=file_path, height=80, page=0)
+        path = render_fast_jpeg_preview(self.thumbnail_directory.name, params, 'image/jpeg')
+        with Image.open(path) as image:
+            self.assertEqual(image.size, (80, 40))
+
+    def test_fast_jpeg_preview_is_oriented(self):
+        file_path = self.create_jpeg((800, 400), orientation=6)
+        params = dict(file_path=file_path, height=80, page=0)
+        path = render_fast_jpeg_preview(self.thumbnail_directory.name, params, 'image/jpeg')
+        with Image.open(path) as image:
+            self.assertEqual(image.size, (40, 80))
+
+    def test_fast_jpeg_preview_skipped_for_large_sizes(self):
+        file_path = self.create_jpeg((800, 400))
+        params = dict(file_path=file_path, height=960, page=0)
+        self.assertIsNone(render_fast_jpeg_preview(self.thumbnail_directory.name, params, 'image/jpeg'))
+
+    def test_fast_jpeg_preview_skipped_for_other_types(self):
+        params = dict(file_path='/tmp/raw.pdf', height=80, page=0)
+        self.assertIsNone(render_fast_jpeg_preview(self.thumbnail_directory.name, params, 'application/pdf'))
+
+    def test_embedded_preview_is_the_smallest_large_enough(self):
+        def encode(size):
+            content = io.BytesIO()
+            Image.new('RGB', size).save(content, 'JPEG')
+            return 'base64:' + base64.b64encode(content.getvalue()).decode()
+        metadata = [{'Orientation': 8, 'JpgFromRaw': encode((1200, 800)),
+                     'PreviewImage': encode((320, 200)), 'ThumbnailImage': encode((160, 100))}]
+        stdout = json.dumps(metadata).encode()
+        with patch('dspreview.render.subprocess.run') as run:
+            run.return_value.stdout = stdout
+            content, orientation = get_embedded_preview('/tmp/raw.cr2', 310)
+        self.assertEqual(orientation, 8)
+        with Image.open(io.BytesIO(content)) as image:
+            self.assertEqual(image.size, (320, 200))
+
+    def test_embedded_preview_without_exiftool(self):
+        with patch('dspreview.render.subprocess.run', side_effect=FileNotFoundError):
+            self.assertEqual(get_embedded_preview('/tmp/raw.cr2', 310), (None, 1))
+
+    def test_cached_jpeg_preview(self):
+        file_path = self.create_jpeg((800, 400))
+        params = dict(file_path=file_path, height=80, page=0)
+        self.assertIsNone(get_cached_jpeg_preview(self.thumbnail_directory.name, params, 'image/jpeg'))
+        path = render_fast_jpeg_preview(self.thumbnail_directory.name, params, 'image/jpeg')
+        self.assertEqual(get_cached_jpeg_preview(self.thumbnail_directory.name, params, 'image/jpeg'), path)
+
+    def test_page_nb_is_cached(self):
+        with patch('dspreview.render.get_preview_manager') as get_preview_manager:
+            get_preview_manager.return_value.get_page_nb.return_value = 3
+            self.assertIsNone(get_cached_page_nb(self.thumbnail_directory.name, '/tmp/raw.pdf'))
+            self.assertEqual(render_page_nb(self.thumbnail_directory.name, '/tmp/raw.pdf'), 3)
+            self.assertEqual(render_page_nb(self.thumbnail_directory.name, '/tmp/raw.pdf'), 3)
+            self.assertEqual(get_cached_page_nb(self.thumbnail_directory.name, '/tmp/raw.pdf'), 3)
+        get_preview_manager.return_value.get_page_nb.assert_called_once()
+
+    def test_raw_extension_without_builders(self):
+        document = Document('my-index', 'id-for-raw')
+        document.source = {'contentType': 'image/x-canon-cr2', 'path': 'IMG_0001'}
+        self.assertEqual(document.target_ext, '.cr2')
@@ -1,7 +1,14 @@
 import json
+import os
 import respx
+import unittest
 
+from dspreview.config import settings
+from dspreview.spreadsheet import detect_encoding, get_spreadsheet_preview, get_spreadsheet_sheets, get_window, is_window_truncated, InvalidWindow
 from httpx import Response
+from subprocess import CalledProcessError
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
 from .test_abstract import auth_headers, create_file_ondisk_from_resource
 from .test_abstract import AbstractTest
 
@@ -13,6 +20,12 @@ class SpreadsheetTest(AbstractTest):
         "contentLength": 123
     }
 
+    _csv_source = {
+        "contentType": "text/csv",
+        "path": "dummy.csv",
+        "contentLength": 123
+    }
+
     @respx.mock
     def test_ods_json(self):
         mocked_url = self.datashare_url('/api/index/search/my-index/_doc/dummy-ods')
@@ -31,3 +44,193 @@ class SpreadsheetTest(AbstractTest):
         self.assertEqual(response_body['content_type'], 'application/vnd.oasis.opendocument.spreadsheet')
         self.assertEqual(response_body['pages'], 2)
         self.assertEqual(response_body['previewable'], True)
+
+    @respx.mock
+    def test_csv_json_window(self):
+        mocked_url = self.datashare_url('/api/index/search/my-index/_doc/dummy-csv')
+        respx.get(mocked_url).mock(return_value=Response(200, json={ "_source": self._csv_source }))
+        create_file_ondisk_from_resource('dummy.csv', '/tmp/documents/my-index/dummy-csv/raw.csv')
+
+        response = self.client.get('/api/v1/thumbnail/my-index/dummy-csv.json?include-content=1&offset=1&limit=1', headers=auth_headers())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['content'], {'main': [['couscous', 'Morocco']]})
+
+    @respx.mock
+    def test_csv_json_is_truncated(self):
+        mocked_url = self.datashare_url('/api/index/search/my-index/_doc/dummy-csv')
+        respx.get(mocked_url).mock(return_value=Response(200, json={ "_source": self._csv_source }))
+        create_file_ondisk_from_resource('dummy.csv', '/tmp/documents/my-index/dummy-csv/raw.csv')
+
+        with patch.object(settings, 'ds_spreadsheet_max_rows', 2):
+            response = self.client.get('/api/v1/thumbnail/my-index/dummy-csv.json?include-content=1', headers=auth_headers())
+            streamed = self.client.get('/api/v1/thumbnail/my-index/dummy-csv.json?include-content=1&stream=1', headers=auth_headers())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['content']['main']), 2)
+        self.assertTrue(response.json()['truncated'])
+        self.assertEqual(streamed.json()['content'], response.json()['content'])
+        self.assertTrue(streamed.json()['truncated'])
+        response = self.client.get('/api/v1/thumbnail/my-index/dummy-csv.json?include-content=1', headers=auth_headers())
+        self.assertEqual(len(response.json()['content']['main']), 4)
+        self.assertFalse(response.json()['truncated'])
+
+    @respx.mock
+    def test_csv_json_sheets(self):
+        mocked_url = self.datashare_url('/api/index/search/my-index/_doc/dummy-csv')
+        respx.get(mocked_url).mock(return_value=Response(200, json={ "_source": self._csv_source }))
+        create_file_ondisk_from_resource('dummy.csv', '/tmp/documents/my-index/dummy-csv/raw.csv')
+
+        response = self.client.get('/api/v1/thumbnail/my-index/dummy-csv.json?include-content=sheets', headers=auth_headers())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['content'], [{'name': 'main', 'rows': 4, 'columns': 2}])
+
+    @respx.mock
+    def test_csv_json_stream(self):
+        mocked_url = self.datashare_url('/api/index/search/my-index/_doc/dummy-csv')
+        respx.get(mocked_url).mock(return_value=Response(200, json={ "_source": self._csv_source }))
+        create_file_ondisk_from_resource('dummy.csv', '/tmp/documents/my-index/dummy-csv/raw.csv')
+
+        response = self.client.get('/api/v1/thumbnail/my-index/dummy-csv.json?include-content=1&stream=1&limit=2',
+                                   headers={**auth_headers(), 'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(response.json()['content'], {'main': [['name', 'country'], ['couscous', 'Morocco']]})
+        self.assertEqual(response.json()['pages'], 1)
+
+    @respx.mock
+    def test_csv_ndjson(self):
+        mocked_url = self.datashare_url('/api/index/search/my-index/_doc/dummy-csv')
+        respx.get(mocked_url).mock(return_value=Response(200, json={ "_source": self._csv_source }))
+        create_file_ondisk_from_resource('dummy.csv', '/tmp/documents/my-index/dummy-csv/raw.csv')
+
+        response = self.client.get('/api/v1/thumbnail/my-index/dummy-csv.ndjson?offset=3',
+                                   headers={**auth_headers(), 'Accept-Encoding': 'identity'})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertEqual(response.headers['Content-Type'], 'application/x-ndjson')
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        self.assertEqual(lines, [{'sheet': 'main', 'rows': 4, 'columns': 2}, ['paella', 'Spain']])
+
+    @respx.mock
+    def test_csv_json_invalid_window(self):
+        mocked_url = self.datashare_url('/api/index/search/my-index/_doc/dummy-csv')
+        respx.get(mocked_url).mock(return_value=Response(200, json={ "_source": self._csv_source }))
+        create_file_ondisk_from_resource('dummy.csv', '/tmp/documents/my-index/dummy-csv/raw.csv')
+
+        response = self.client.get('/api/v1/thumbnail/my-index/dummy-csv.json?include-content=1&limit=foo', headers=auth_headers())
+        self.assertEqual(response.status_code, 400)
+
+
+class DelimitedSpreadsheetTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, name, content):
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'wb') as file:
+            file.write(content)
+        return path
+
+    def test_conversion_timeout_depends_on_content_type(self):
+        path = self.write('raw.ods', b'')
+        content_type = 'application/vnd.oasis.opendocument.spreadsheet'
+        with patch.object(settings, 'ds_converter_timeouts', '%s=42' % content_type), \
+             patch('dspreview.spreadsheet.run_command') as run_command:
+            get_spreadsheet_sheets(path, content_type=content_type)
+        self.assertEqual(run_command.call_args.args[1], 42)
+
+    def test_csv_is_read_without_conversion(self):
+        path = self.write('raw.csv', b'name,age\nfoo,42\n"bar, baz",7\n')
+        with patch('dspreview.spreadsheet.convert_spreadsheet_to_csv') as convert:
+            preview = get_spreadsheet_preview(path)
+        convert.assert_not_called()
+        self.assertEqual(preview, {'main': [['name', 'age'], ['foo', '42'], ['bar, baz', '7']]})
+
+    def test_tsv_dialect(self):
+        path = self.write('raw.tsv', b'name\tage\nfoo\t42\n')
+        self.assertEqual(get_spreadsheet_preview(path), {'main': [['name', 'age'], ['foo', '42']]})
+
+    def test_semicolon_dialect(self):
+        path = self.write('raw.csv', b'name;age\nfoo;42\nbar;7\n')
+        self.assertEqual(get_spreadsheet_preview(path)['main'][1], ['foo', '42'])
+
+    def test_latin1_encoding(self):
+        path = self.write('raw.csv', 'name,city\nfoo,Orléans\n'.encode('latin-1'))
+        self.assertEqual(get_spreadsheet_preview(path)['main'][1], ['foo', 'Orléans'])
+
+    def test_utf16_encoding_with_bom(self):
+        path = self.write('raw.csv', 'name,city\nfoo,Orléans\n'.encode('utf-16'))
+        self.assertEqual(get_spreadsheet_preview(path)['main'], [['name', 'city'], ['foo', 'Orléans']])
+
+    def test_utf8_encoding_with_bom(self):
+        path = self.write('raw.csv', 'name,city\nfoo,Orléans\n'.encode('utf-8-sig'))
+        self.assertEqual(get_spreadsheet_preview(path)['main'][0], ['name', 'city'])
+
+    def test_detect_encoding_with_truncated_character(self):
+        self.assertEqual(detect_encoding('Orléans'.encode('utf-8')[:4]), 'utf-8')
+
+    def test_window(self):
+        path = self.write('raw.csv', b'a,b,c\n1,2,3\n4,5,6\n7,8,9\n')
+        preview = get_spreadsheet_preview(path, offset=1, limit=2, column_offset=1, column_limit=1)
+        self.assertEqual(preview, {'main': [['2'], ['5']]})
+
+    def test_window_of_unknown_sheet(self):
+        path = self.write('raw.csv', b'a,b,c\n1,2,3\n')
+        self.assertEqual(get_spreadsheet_preview(path, sheet='foo'), {})
+
+    def test_sheets(self):
+        path = self.write('raw.csv', b'a,b\n1,2,3\n4\n')
+        self.assertEqual(get_spreadsheet_sheets(path), [{'name': 'main', 'rows': 3, 'columns': 3}])
+
+    def test_get_window_is_capped(self):
+        max_rows = settings.ds_spreadsheet_max_rows
+        settings.ds_spreadsheet_max_rows = 100
+        try:
+            self.assertEqual(get_window()['limit'], 100)
+            self.assertEqual(get_window(limit='1000')['limit'], 100)
+            self.assertEqual(get_window(limit='10')['limit'], 10)
+        finally:
+            settings.ds_spreadsheet_max_rows = max_rows
+
+    def test_window_is_truncated(self):
+        sheets = [{'name': 'foo', 'rows': 10, 'columns': 2}, {'name': 'bar', 'rows': 3, 'columns': 2}]
+        self.assertTrue(is_window_truncated(sheets, dict(sheet=None, offset=0, limit=5)))
+        self.assertFalse(is_window_truncated(sheets, dict(sheet='bar', offset=0, limit=5)))
+        self.assertFalse(is_window_truncated(sheets, dict(sheet=None, offset=5, limit=5)))
+        self.assertFalse(is_window_truncated(sheets, dict(sheet=None, offset=0, limit=None)))
+
+    def test_get_window_is_invalid(self):
+        with self.assertRaises(InvalidWindow):
+            get_window(offset='-1')
+        with self.assertRaises(InvalidWindow):
+            get_window(limit='foo')
+
+    def test_cached_window(self):
+        path = self.write('raw.csv', 'a,b,c\n1,"2\n2",3\n4,5,6\né,8,9\n'.encode('latin-1'))
+        cache_directory = os.path.join(self.directory.name, 'thumbnails')
+        preview = get_spreadsheet_preview(path, offset=1, limit=2, column_offset=1, cache_directory=cache_directory)
+        self.assertEqual(preview, {'main': [['2\n2', '3'], ['5', '6']]})
+        preview = get_spreadsheet_preview(path, offset=3, cache_directory=cache_directory)
+        self.assertEqual(preview, {'main': [['é', '8', '9']]})
+        preview = get_spreadsheet_preview(path, offset=10, cache_directory=cache_directory)
+        self.assertEqual(preview, {'main': []})
+
+    def test_failed_conversion_is_not_cached(self):
+        path = self.write('raw.ods', b'')
+        cache_directory = os.path.join(self.directory.name, 'thumbnails')
+        with patch('dspreview.spreadsheet.run_command', side_effect=CalledProcessError(1, 'ssconvert')):
+            with self.assertRaises(CalledProcessError):
+                get_spreadsheet_sheets(path, cache_directory)
+        self.assertEqual(os.listdir(cache_directory), [])
+
+    def test_cached_sheets_skip_conversion(self):
+        path = self.write('raw.csv', b'a,b\n1,2,3\n4\n')
+        cache_directory = os.path.join(self.directory.name, 'thumbnails')
+        self.assertEqual(get_spreadsheet_sheets(path, cache_directory), [{'name': 'main', 'rows': 3, 'columns': 3}])
+        with patch('dspreview.spreadsheet.iter_sheets') as iter_sheets:
+            preview = get_spreadsheet_preview(path, cache_directory=cache_directory)
+        iter_sheets.assert_not_called()
+        self.assertEqual(preview, {'main': [['a', 'b'], ['1', '2', '3'], ['4']]})
@@ -1,9 +1,30 @@
+import os
 import respx
+import time
 
-from httpx import Response
+from dspreview.cache import DOCUMENTS_PATH, THUMBNAILS_PATH, cache_index, get_cache_directory, get_directory_size
+from dspreview.config import settings
+from dspreview.document import Document, failure_cache
+from dspreview.limits import ConverterTimeout
+from dspreview.render import render_pool
+from dspreview.utils import get_file_etag
+from httpx import AsyncByteStream, ByteStream, ConnectError, ReadError, ReadTimeout, Response
+from shutil import rmtree
+from subprocess import CalledProcessError
+from tempfile import mkstemp
+from unittest.mock import AsyncMock, patch
 from .test_abstract import auth_headers, create_file_ondisk_from_resource
 from .test_abstract import AbstractTest
 
+
+class InterruptedStream(AsyncByteStream):
+    """A response body failing after its first chunk."""
+
+    async def __aiter__(self):
+        yield b'x' * 1024
+        raise ReadError('Connection reset')
+
+
 class ThumbnailTest(AbstractTest):
 
     _source = {
@@ -37,6 +58,38 @@ class ThumbnailTest(AbstractTest):
         self.assertTrue(response.json().get("pages"), 1)
         self.assertTrue(response.json().get("content_type"), "image/jpeg")
 
+    @respx.mock
+    def test_info_json_meta_is_not_shared_between_sessions(self):
+        mocked_url = self.document_url('my-index', 'id-for-dummy-jpg')
+        route = respx.get(mocked_url).mock(side_effect=[Response(200, json={ "_source": self._source }), Response(401)])
+        create_file_ondisk_from_resource('dummy.jpg', '/tmp/documents/my-index/id-for-dummy-jpg/raw.jpg')
+
+        response = self.client.get('/api/v1/thumbnail/my-index/id-for-dummy-jpg.json', headers={'Cookie': 'other_session=alice'})
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get('/api/v1/thumbnail/my-index/id-for-dummy-jpg.json', headers={'Cookie': 'other_session=bob'})
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(route.call_count, 2)
+
+    @respx.mock
+    def test_info_json_meta_is_cached(self):
+        mocked_url = self.document_url('my-index', 'id-for-dummy-jpg')
+        route = respx.get(mocked_url).mock(return_value=Response(200, json={ "_source": self._source }))
+        create_file_ondisk_from_resource('dummy.jpg', '/tmp/documents/my-index/id-for-dummy-jpg/raw.jpg')
+
+        self.client.get('/api/v1/thumbnail/my-index/id-for-dummy-jpg.json', headers=auth_headers())
+        response = self.client.get('/api/v1/thumbnail/my-index/id-for-dummy-jpg.json', headers=auth_headers())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(route.call_count, 1)
+
+    @respx.mock
+    def test_thumbnail_unauthorized_is_cached(self):
+        mocked_url = self.document_url('my-index', 'id-unauthorized')
+        route = respx.get(mocked_url).mock(return_value=Response(401))
+        self.client.get('/api/v1/thumbnail/my-index/id-unauthorized', headers=auth_headers())
+        response = self.client.get('/api/v1/thumbnail/my-index/id-unauthorized', headers=auth_headers())
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(route.call_count, 1)
+
     @respx.mock
     def test_info_with_routing_json(self):
         mocked_root_url = self.document_url('my-index', 'rooting-id')
@@ -98,3 +151,332 @@ class ThumbnailTest(AbstractTest):
         respx.get(mocked_info_url).mock(return_value=Response(500, json={ "error": None }))
         response = self.client.get('/api/v1/thumbnail/my-index/id-for-dummy-jpg', headers=auth_headers())
         self.assertEqual(response.status_code, 415)
+
+
+    @respx.mock
+    def test_thumbnail_backend_error_is_not_cached(self):
+        failure_cache.delete('my-index', 'id-failing-src')
+        mocked_info_url = self.document_url('my-index', 'id-failing-src')
+        respx.get(mocked_info_url).mock(return_value=Response(200, json={ "_source": self._source }))
+        mocked_download_url = self.datashare_url('/api/my-index/documents/src/id-failing-src')
+        route = respx.get(mocked_download_url).mock(return_value=Response(500))
+        self.client.get('/api/v1/thumbnail/my-index/id-failing-src', headers=auth_headers())
+        response = self.client.get('/api/v1/thumbnail/my-index/id-failing-src', headers=auth_headers())
+        self.assertEqual(response.status_code, 415)
+        self.assertEqual(route.call_count, 2)
+        self.assertIsNone(failure_cache.get('my-index', 'id-failing-src'))
+
+    @respx.mock
+    def test_thumbnail_backend_timeout(self):
+        failure_cache.delete('my-index', 'id-timeout-meta')
+        mocked_url = self.document_url('my-index', 'id-timeout-meta')
+        route = respx.get(mocked_url).mock(side_effect=ReadTimeout('Read timed out'))
+        self.client.get('/api/v1/thumbnail/my-index/id-timeout-meta', headers=auth_headers())
+        response = self.client.get('/api/v1/thumbnail/my-index/id-timeout-meta', headers=auth_headers())
+        self.assertEqual(response.status_code, 504)
+        self.assertEqual(route.call_count, 2)
+        self.assertIsNone(failure_cache.get('my-index', 'id-timeout-meta'))
+
+    def mock_download(self, id, **kwargs):
+        respx.get(self.document_url('my-index', id)).mock(return_value=Response(200, json={ "_source": self._source }))
+        route = respx.get(self.datashare_url('/api/my-index/documents/src/%s' % id)).mock(return_value=Response(200, **kwargs))
+        target_directory = get_cache_directory(DOCUMENTS_PATH, 'my-index', id, int(settings.ds_cache_shard_depth))
+        rmtree(target_directory, ignore_errors=True)
+        failure_cache.delete('my-index', id)
+        return route, target_directory
+
+    @respx.mock
+    def test_download_too_big_content_length(self):
+        route, target_directory = self.mock_download('id-too-big-length', content=b'x' * 2048)
+        with patch.object(settings, 'ds_document_max_size', 1024), patch('dspreview.document.mkstemp', wraps=mkstemp) as temporary_file:
+            response = self.client.get('/api/v1/thumbnail/my-index/id-too-big-length', headers=auth_headers())
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(route.call_count, 1)
+        self.assertEqual(temporary_file.call_count, 0)
+        self.assertFalse(os.path.exists(target_directory))
+
+    @respx.mock
+    def test_download_too_big_mid_stream(self):
+        # Without Content-Length, the size is only known while downloading
+        _, target_directory = self.mock_download('id-too-big-stream', stream=ByteStream(b'x' * 200 * 1024))
+        with patch.object(settings, 'ds_document_max_size', 100 * 1024), patch('dspreview.document.mkstemp', wraps=mkstemp) as temporary_file:
+            response = self.client.get('/api/v1/thumbnail/my-index/id-too-big-stream', headers=auth_headers())
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(temporary_file.call_count, 1)
+        self.assertFalse(os.path.exists(target_directory))
+        self.assertEqual(failure_cache.get('my-index', 'id-too-big-stream'), 'too_big')
+
+    @respx.mock
+    def test_download_interrupted_leaves_no_partial_file(self):
+        _, target_directory = self.mock_download('id-interrupted', stream=InterruptedStream())
+        response = self.client.get('/api/v1/thumbnail/my-index/id-interrupted', headers=auth_headers())
+        self.assertEqual(response.status_code, 502)
+        self.assertEqual(os.listdir(target_directory), [])
+        self.assertIsNotNone(cache_index.get(target_directory))
+
+    @respx.mock
+    def test_thumbnail_backend_unreachable(self):
+        failure_cache.delete('my-index', 'id-unreachable-src')
+        mocked_info_url = self.document_url('my-index', 'id-unreachable-src')
+        respx.get(mocked_info_url).mock(return_value=Response(200, json={ "_source": self._source }))
+        mocked_download_url = self.datashare_url('/api/my-index/documents/src/id-unreachable-src')
+        respx.get(mocked_download_url).mock(side_effect=ConnectError('Connection refused'))
+        response = self.client.get('/api/v1/thumbnail/my-index/id-unreachable-src', headers=auth_headers())
+        self.assertEqual(response.status_code, 502)
+        self.assertIsNone(failure_cache.get('my-index', 'id-unreachable-src'))
+
+    @respx.mock
+    def test_thumbnail_info_backend_timeout(self):
+        mocked_url = self.document_url('my-index', 'id-timeout-info')
+        respx.get(mocked_url).mock(side_effect=ReadTimeout('Read timed out'))
+        response = self.client.get('/api/v1/thumbnail/my-index/id-timeout-info.json', headers=auth_headers())
+        self.assertEqual(response.status_code, 504)
+
+    @respx.mock
+    def test_thumbnail_failure_is_cached(self):
+        failure_cache.delete('my-index', 'id-failing-conversion')
+        mocked_url = self.document_url('my-index', 'id-failing-conversion')
+        respx.get(mocked_url).mock(return_value=Response(200, json={ "_source": self._source }))
+        create_file_ondisk_from_resource('dummy.jpg', '/tmp/documents/my-index/id-failing-conversion/raw.jpg')
+        with patch('dspreview.document.run_limited', side_effect=CalledProcessError(1, 'convert')) as run_limited:
+            self.client.get('/api/v1/thumbnail/my-index/id-failing-conversion?size=xl', headers=auth_headers())
+            response = self.client.get('/api/v1/thumbnail/my-index/id-failing-conversion?size=xl', headers=auth_headers())
+        self.assertEqual(response.status_code, 415)
+        self.assertEqual(run_limited.call_count, 1)
+        self.assertEqual(failure_cache.get('my-index', 'id-failing-conversion'), 'conversion_failed')
+        failure_cache.delete('my-index', 'id-failing-conversion')
+
+    @respx.mock
+    def test_thumbnail_timeout_is_cached(self):
+        failure_cache.delete('my-index', 'id-timeout')
+        mocked_url = self.document_url('my-index', 'id-timeout')
+        respx.get(mocked_url).mock(return_value=Response(200, json={ "_source": self._source }))
+        create_file_ondisk_from_resource('dummy.jpg', '/tmp/documents/my-index/id-timeout/raw.jpg')
+        timeouts = render_pool.timeouts
+        with patch('dspreview.document.run_limited', side_effect=ConverterTimeout(10)):
+            response = self.client.get('/api/v1/thumbnail/my-index/id-timeout?size=xl', headers=auth_headers())
+        self.assertEqual(response.status_code, 415)
+        self.assertEqual(failure_cache.get('my-index', 'id-timeout'), 'timeout')
+        self.assertEqual(render_pool.timeouts, timeouts + 1)
+        failure_cache.delete('my-index', 'id-timeout')
+
+    @respx.mock
+    def test_thumbnail_is_cancelled_when_client_disconnects(self):
+        mocked_url = self.document_url('my-index', 'id-disconnect')
+        respx.get(mocked_url).mock(return_value=Response(200, json={ "_source": self._source }))
+        create_file_ondisk_from_resource('dummy.jpg', '/tmp/documents/my-index/id-disconnect/raw.jpg')
+        cancelled = render_pool.cancelled
+        with patch('dspreview.document.run_limited', side_effect=lambda *args: time.sleep(0.5)), \
+             patch('starlette.requests.Request.is_disconnected', new_callable=AsyncMock, return_value=True):
+            response = self.client.get('/api/v1/thumbnail/my-index/id-disconnect?size=xl', headers=auth_headers())
+        self.assertEqual(response.status_code, 499)
+        self.assertEqual(render_pool.cancelled, cancelled + 1)
+        self.assertIsNone(failure_cache.get('my-index', 'id-disconnect'))
+
+    @respx.mock
+    def test_thumbnail_is_served_from_memory(self):
+        mocked_url = self.document_url('my-index', 'id-for-dummy-jpg')
+        respx.get(mocked_url).mock(return_value=Response(200, json={ "_source": self._source }))
+        create_file_ondisk_from_resource('dummy.jpg', '/tmp/documents/my-index/id-for-dummy-jpg/raw.jpg')
+
+        first = self.client.get('/api/v1/thumbnail/my-index/id-for-dummy-jpg', headers=auth_headers())
+        hits = self.client.get('/api/v1/status').json()['thumbnail_cache']['hits']
+        second = self.client.get('/api/v1/thumbnail/my-index/id-for-dummy-jpg', headers=auth_headers())
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.headers['Content-Type'], 'image/jpeg')
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(self.client.get('/api/v1/status').json()['thumbnail_cache']['hits'], hits + 1)
+
+    @respx.mock
+    def test_thumbnail_caching_headers(self):
+        mocked_url = self.document_url('my-index', 'id-for-dummy-jpg')
+        respx.get(mocked_url).mock(return_value=Response(200, json={ "_source": self._source }))
+        create_file_ondisk_from_resource('dummy.jpg', '/tmp/documents/my-index/id-for-dummy-jpg/raw.jpg')
+
+        response = self.client.get('/api/v1/thumbnail/my-index/id-for-dummy-jpg', headers=auth_headers())
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers['Cache-Control'].startswith('private, max-age='))
+        self.assertTrue(response.headers['ETag'].startswith('"'))
+
+    @respx.mock
+    def test_thumbnail_not_modified(self):
+        mocked_url = self.document_url('my-index', 'id-for-dummy-jpg')
+        respx.get(mocked_url).mock(return_value=Response(200, json={ "_source": self._source }))
+        create_file_ondisk_from_resource('dummy.jpg', '/tmp/documents/my-index/id-for-dummy-jpg/raw.jpg')
+
+        etag = self.client.get('/api/v1/thumbnail/my-index/id-for-dummy-jpg', headers=auth_headers()).headers['ETag']
+        response = self.client.get('/api/v1/thumbnail/my-index/id-for-dummy-jpg', headers={**auth_headers(), 'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+    def test_file_etag_is_derived_from_stat(self):
+        _, path = mkstemp()
+        with open(path, 'wb') as file:
+            file.write(b'foo')
+        os.utime(path, ns=(1_000_000_000, 1_000_000_000))
+        with patch('builtins.open') as open_file:
+            etag = get_file_etag(path)
+        open_file.assert_not_called()
+        self.assertEqual(etag, '"3b9aca00-3"')
+        with open(path, 'wb') as file:
+            file.write(b'foobar')
+        self.assertNotEqual(get_file_etag(path), etag)
+        os.remove(path)
+
+    @respx.mock
+    def test_thumbnail_access_is_recorded_without_rendering(self):
+        mocked_url = self.document_url('my-index', 'id-for-dummy-jpg')
+        respx.get(mocked_url).mock(return_value=Response(200, json={ "_source": self._source }))
+        create_file_ondisk_from_resource('dummy.jpg', '/tmp/documents/my-index/id-for-dummy-jpg/raw.jpg')
+        thumbnail_directory = get_cache_directory(THUMBNAILS_PATH, 'my-index', 'id-for-dummy-jpg', int(settings.ds_cache_shard_depth))
+
+        etag = self.client.get('/api/v1/thumbnail/my-index/id-for-dummy-jpg', headers=auth_headers()).headers['ETag']
+        with patch.object(cache_index, 'touch_later') as touch_later:
+            self.client.get('/api/v1/thumbnail/my-index/id-for-dummy-jpg', headers=auth_headers())
+            self.client.get('/api/v1/thumbnail/my-index/id-for-dummy-jpg', headers={**auth_headers(), 'If-None-Match': etag})
+        self.assertEqual(touch_later.call_count, 2)
+        for call in touch_later.call_args_list:
+            self.assertIn(thumbnail_directory, call.args)
+
+    @respx.mock
+    def test_thumbnail_not_modified_requires_authorization(self):
+        mocked_url = self.document_url('my-index', 'id-for-dummy-jpg')
+        route = respx.get(mocked_url).mock(return_value=Response(200, json={ "_source": self._source }))
+        create_file_ondisk_from_resource('dummy.jpg', '/tmp/documents/my-index/id-for-dummy-jpg/raw.jpg')
+
+        etag = self.client.get('/api/v1/thumbnail/my-index/id-for-dummy-jpg', headers=auth_headers()).headers['ETag']
+        route.mock(return_value=Response(401))
+        response = self.client.get('/api/v1/thumbnail/my-index/id-for-dummy-jpg', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 401)
+
+    @respx.mock
+    def test_batch_info(self):
+        respx.post(self.datashare_url('/api/index/search/my-index/_search')).mock(return_value=Response(401))
+        respx.get(self.document_url('my-index', 'id-for-dummy-jpg')).mock(return_value=Response(200, json={ "_source": self._source }))
+        respx.get(self.document_url('my-index', 'id-forbidden')).mock(return_value=Response(403))
+        create_file_ondisk_from_resource('dummy.jpg', '/tmp/documents/my-index/id-for-dummy-jpg/raw.jpg')
+
+        references = [{'index': 'my-index', 'id': 'id-for-dummy-jpg'}, {'index': 'my-index', 'id': 'id-forbidden'}]
+        response = self.client.post('/api/v1/thumbnails/info', json=references, headers=auth_headers())
+        self.assertEqual(response.status_code, 200)
+        first, second = response.json()
+        self.assertEqual(first['id'], 'id-for-dummy-jpg')
+        self.assertTrue(first['previewable'])
+        self.assertEqual(first['pages'], 1)
+        self.assertEqual(second['id'], 'id-forbidden')
+        self.assertEqual(second['error']['status'], 401)
+
+    @respx.mock
+    def test_batch_info_reports_unexpected_errors(self):
+        respx.post(self.datashare_url('/api/index/search/my-index/_search')).mock(return_value=Response(401))
+        respx.get(self.document_url('my-index', 'id-for-dummy-jpg')).mock(return_value=Response(200, json={ "_source": self._source }))
+        respx.get(self.document_url('my-index', 'id-broken')).mock(return_value=Response(200, json={ "_source": self._source }))
+        create_file_ondisk_from_resource('dummy.jpg', '/tmp/documents/my-index/id-for-dummy-jpg/raw.jpg')
+        create_file_ondisk_from_resource('dummy.jpg', '/tmp/documents/my-index/id-broken/raw.jpg')
+
+        async def render_page_nb(document):
+            if document.id == 'id-broken':
+                raise OSError('No space left on device')
+            return 1
+
+        references = [{'index': 'my-index', 'id': 'id-for-dummy-jpg'}, {'index': 'my-index', 'id': 'id-broken'}]
+        with patch.object(Document, 'render_page_nb', render_page_nb):
+            response = self.client.post('/api/v1/thumbnails/info', json=references, headers=auth_headers())
+        self.assertEqual(response.status_code, 200)
+        first, second = response.json()
+        self.assertTrue(first['previewable'])
+        self.assertEqual(second['error']['status'], 500)
+
+    @respx.mock
+    def test_batch_info_fetches_metadata_in_bulk(self):
+        hits = [{ "_id": "id-for-dummy-jpg", "_source": self._source }]
+        search = respx.post(self.datashare_url('/api/index/search/my-index/_search')).mock(return_value=Response(200, json={ "hits": { "hits": hits } }))
+        meta = respx.get(self.document_url('my-index', 'id-for-dummy-jpg')).mock(return_value=Response(200, json={ "_source": self._source }))
+        create_file_ondisk_from_resource('dummy.jpg', '/tmp/documents/my-index/id-for-dummy-jpg/raw.jpg')
+
+        references = [{'index': 'my-index', 'id': 'id-for-dummy-jpg'}]
+        response = self.client.post('/api/v1/thumbnails/info', json=references, headers=auth_headers())
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()[0]['previewable'])
+        self.assertEqual(search.call_count, 1)
+        self.assertEqual(meta.call_count, 0)
+
+    def test_batch_info_too_many_documents(self):
+        references = [{'index': 'my-index', 'id': 'id-%s' % n} for n in range(101)]
+        response = self.client.post('/api/v1/thumbnails/info', json=references, headers=auth_headers())
+        self.assertEqual(response.status_code, 413)
+
+    @respx.mock
+    def test_sprite(self):
+        mocked_url = self.document_url('my-index', 'id-for-sprite-jpg')
+        respx.get(mocked_url).mock(return_value=Response(200, json={ "_source": self._source }))
+        create_file_ondisk_from_resource('dummy.jpg', '/tmp/documents/my-index/id-for-sprite-jpg/raw.jpg')
+        rmtree(get_cache_directory(THUMBNAILS_PATH, 'my-index', 'id-for-sprite-jpg', settings.ds_cache_shard_depth), ignore_errors=True)
+
+        response = self.client.get('/api/v1/sprite/my-index/id-for-sprite-jpg.json?from=0&to=9', headers=auth_headers())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['pages']), 1)
+        self.assertEqual(response.json()['pages'][0]['page'], 0)
+        response = self.client.get('/api/v1/sprite/my-index/id-for-sprite-jpg?from=0&to=9', headers=auth_headers())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['Content-Type'], 'image/jpeg')
+        self.assertIsNone(failure_cache.get('my-index', 'id-for-sprite-jpg'))
+
+    @respx.mock
+    def test_sprite_invalid_page_range(self):
+        mocked_url = self.document_url('my-index', 'id-for-dummy-jpg')
+        respx.get(mocked_url).mock(return_value=Response(200, json={ "_source": self._source }))
+        create_file_ondisk_from_resource('dummy.jpg', '/tmp/documents/my-index/id-for-dummy-jpg/raw.jpg')
+
+        response = self.client.get('/api/v1/sprite/my-index/id-for-dummy-jpg?from=5&to=9', headers=auth_headers())
+        self.assertEqual(response.status_code, 400)
+
+    @respx.mock
+    def test_tiles(self):
+        mocked_url = self.document_url('my-index', 'id-for-dummy-jpg')
+        respx.get(mocked_url).mock(return_value=Response(200, json={ "_source": self._source }))
+        create_file_ondisk_from_resource('dummy.jpg', '/tmp/documents/my-index/id-for-dummy-jpg/raw.jpg')
+
+        response = self.client.get('/api/v1/tiles/my-index/id-for-dummy-jpg.dzi', headers=auth_headers())
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('<Size Width="1" Height="1"/>', response.text)
+        response = self.client.get('/api/v1/tiles/my-index/id-for-dummy-jpg_files/0/0_0.jpg', headers=auth_headers())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['Content-Type'], 'image/jpeg')
+        response = self.client.get('/api/v1/tiles/my-index/id-for-dummy-jpg_files/0/1_0.jpg', headers=auth_headers())
+        self.assertEqual(response.status_code, 404)
+
+    @respx.mock
+    def test_tiles_are_recorded(self):
+        mocked_url = self.document_url('my-index', 'id-for-dummy-jpg')
+        respx.get(mocked_url).mock(return_value=Response(200, json={ "_source": self._source }))
+        create_file_ondisk_from_resource('dummy.jpg', '/tmp/documents/my-index/id-for-dummy-jpg/raw.jpg')
+        thumbnail_directory = get_cache_directory(THUMBNAILS_PATH, 'my-index', 'id-for-dummy-jpg', int(settings.ds_cache_shard_depth))
+
+        rmtree(thumbnail_directory, ignore_errors=True)
+
+        response = self.client.get('/api/v1/tiles/my-index/id-for-dummy-jpg_files/0/0_0.jpg', headers=auth_headers())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(cache_index.get(thumbnail_directory)['size'], get_directory_size(thumbnail_directory))
+        # Rendered again from the cached raster, only adding the tile's size
+        size = cache_index.get(thumbnail_directory)['size']
+        tile_paths = [os.path.join(root, name) for root, _, names in os.walk(thumbnail_directory) for name in names if name == '0_0.jpg']
+        os.remove(tile_paths[0])
+        response = self.client.get('/api/v1/tiles/my-index/id-for-dummy-jpg_files/0/0_0.jpg', headers=auth_headers())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(cache_index.get(thumbnail_directory)['size'], size + os.path.getsize(tile_paths[0]))
+
+    @respx.mock
+    def test_cached_tiles_are_not_rendered(self):
+        mocked_url = self.document_url('my-index', 'id-for-dummy-jpg')
+        respx.get(mocked_url).mock(return_value=Response(200, json={ "_source": self._source }))
+        create_file_ondisk_from_resource('dummy.jpg', '/tmp/documents/my-index/id-for-dummy-jpg/raw.jpg')
+
+        self.client.get('/api/v1/tiles/my-index/id-for-dummy-jpg_files/0/0_0.jpg', headers=auth_headers())
+        with patch.object(render_pool, 'run') as run:
+            descriptor = self.client.get('/api/v1/tiles/my-index/id-for-dummy-jpg.dzi', headers=auth_headers())
+            tile = self.client.get('/api/v1/tiles/my-index/id-for-dummy-jpg_files/0/0_0.jpg', headers=auth_headers())
+        self.assertEqual(descriptor.status_code, 200)
+        self.assertIn('<Size Width="1" Height="1"/>', descriptor.text)
+        self.assertEqual(tile.status_code, 200)
+        self.assertEqual(run.call_count, 0)
@@ -0,0 +1,59 @@
+import os
+import unittest
+
+from dspreview.tiles import get_dzi_descriptor, get_level_size, get_max_level, get_tile_box, get_tiles_directory, render_tile, InvalidTile
+from PIL import Image
+from tempfile import TemporaryDirectory
+
+
+class TilesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.thumbnail_directory = TemporaryDirectory()
+        self.params = dict(file_path='/tmp/raw.pdf', page=0)
+
+    def tearDown(self):
+        self.thumbnail_directory.cleanup()
+
+    def create_source(self, width, height):
+        tiles_directory = get_tiles_directory(self.thumbnail_directory.name, self.params)
+        os.makedirs(tiles_directory)
+        Image.new('RGB', (width, height), 'red').save(os.path.join(tiles_directory, 'source.jpg'))
+
+    def test_max_level(self):
+        self.assertEqual(get_max_level(1, 1), 0)
+        self.assertEqual(get_max_level(1000, 600), 10)
+        self.assertEqual(get_max_level(1024, 600), 10)
+
+    def test_level_size(self):
+        self.assertEqual(get_level_size(1000, 600, 10), (1000, 600))
+        self.assertEqual(get_level_size(1000, 600, 9), (500, 300))
+        self.assertEqual(get_level_size(1000, 600, 0), (1, 1))
+
+    def test_tile_box_with_overlap(self):
+        self.assertEqual(get_tile_box(1000, 600, 10, 0, 0), (0, 0, 255, 255))
+        self.assertEqual(get_tile_box(1000, 600, 10, 1, 2), (253, 507, 509, 600))
+        self.assertEqual(get_tile_box(1000, 600, 10, 3, 0), (761, 0, 1000, 255))
+
+    def test_tile_box_outside_of_pyramid(self):
+        with self.assertRaises(InvalidTile):
+            get_tile_box(1000, 600, 10, 4, 0)
+        with self.assertRaises(InvalidTile):
+            get_tile_box(1000, 600, 11, 0, 0)
+
+    def test_dzi_descriptor(self):
+        descriptor = get_dzi_descriptor(1000, 600)
+        self.assertIn('TileSize="254"', descriptor)
+        self.assertIn('<Size Width="1000" Height="600"/>', descriptor)
+
+    def test_render_tile(self):
+        self.create_source(1000, 600)
+        tile_path = render_tile(self.thumbnail_directory.name, self.params, 9, 1, 1)
+        with Image.open(tile_path) as image:
+            self.assertEqual(image.size, (247, 47))
+
+    def test_render_tile_from_reduced_source(self):
+        self.create_source(1000, 600)
+        tile_path = render_tile(self.thumbnail_directory.name, self.params, 7, 0, 0)
+        with Image.open(tile_path) as image:
+            self.assertEqual(image.size, (125, 75))
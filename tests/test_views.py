@@ -1,3 +1,7 @@
+import time
+
+from dspreview.main import app
+from fastapi.testclient import TestClient
 from .test_abstract import AbstractTest
 
 class ViewsTest(AbstractTest):
@@ -5,3 +9,19 @@ class ViewsTest(AbstractTest):
     def test_home_page(self):
         response = self.client.get('/')
         self.assertIn('Datashare preview', response.text)
+
+    def test_status(self):
+        response = self.client.get('/api/v1/status')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['render_pool']['active'], 0)
+        self.assertEqual(response.json()['render_pool']['queued'], 0)
+
+    def test_ready(self):
+        with TestClient(app) as client:
+            for _ in range(100):
+                response = client.get('/api/v1/ready')
+                if response.status_code == 200:
+                    break
+                time.sleep(0.01)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json(), {'ready': True})